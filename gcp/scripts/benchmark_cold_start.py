@@ -0,0 +1,99 @@
+"""
+Mide el tiempo de importación de los módulos de la función, que domina el
+arranque en frío, y lo desglosa por paquete con `python -X importtime`.
+
+Cada medición se hace en un proceso nuevo para que ningún módulo esté ya
+importado. Para cada módulo se muestra la mediana del tiempo total de
+importación y los paquetes con mayor tiempo propio acumulado.
+
+Uso:
+    python scripts/benchmark_cold_start.py
+    python scripts/benchmark_cold_start.py --modules main,content_processor --runs 5
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, Tuple
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# Módulos del proyecto medidos por defecto: el punto de entrada y los que se importan
+# de forma diferida en el primer evento
+DEFAULT_MODULES = "main,document_handlers,vector_search,content_processor"
+
+# Línea de -X importtime: "import time: <propio> | <acumulado> | <paquete>"
+IMPORTTIME_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+\d+\s+\|\s+(\S+)")
+
+
+def measure_import(module: str) -> Tuple[float, Dict[str, int]]:
+    """
+    Importa un módulo en un proceso nuevo con -X importtime.
+
+    Args:
+        module: Nombre del módulo a importar
+
+    Returns:
+        Tupla (tiempo total en segundos, {paquete de primer nivel: tiempo propio en µs})
+    """
+    # El cliente de OpenAI se crea al importar ai_service y exige una clave,
+    # aunque no se haga ninguna solicitud
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ""
+        raise RuntimeError(f"No se pudo importar {module}: {error}")
+
+    total_us = 0
+    self_by_package: Dict[str, int] = defaultdict(int)
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if not match:
+            continue
+        self_us, name = match.groups()
+        self_by_package[name.split(".")[0]] += int(self_us)
+        # La suma de los tiempos propios es el tiempo total de importación
+        total_us += int(self_us)
+    return total_us / 1e6, self_by_package
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--modules", default=DEFAULT_MODULES, help="Módulos a medir, separados por coma"
+    )
+    parser.add_argument("--runs", type=int, default=3, help="Procesos por módulo")
+    parser.add_argument("--top", type=int, default=10, help="Paquetes a mostrar por módulo")
+    args = parser.parse_args()
+
+    for module_name in args.modules.split(","):
+        totals = []
+        packages: Dict[str, list] = defaultdict(list)
+        try:
+            for _ in range(args.runs):
+                total, by_package = measure_import(module_name)
+                totals.append(total)
+                for package, self_us in by_package.items():
+                    packages[package].append(self_us)
+        except RuntimeError as e:
+            print(e)
+            continue
+
+        print(f"{module_name}: {statistics.median(totals) * 1000:.0f} ms (mediana de {len(totals)})")
+        ranking = sorted(
+            ((statistics.median(values), package) for package, values in packages.items()),
+            reverse=True,
+        )
+        for self_us, package in ranking[: args.top]:
+            print(f"    {package:<30} {self_us / 1000:8.1f} ms")
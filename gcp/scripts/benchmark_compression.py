@@ -0,0 +1,100 @@
+"""
+Mide la razón de compresión y la latencia de codificación/decodificación del
+códec de database_service sobre un corpus de páginas.
+
+El corpus se toma de los hashes pages:* de Redis (REDIS_URL) o, con --dir,
+de los archivos .txt de un directorio (un archivo por página).
+
+Uso:
+    REDIS_URL=redis://... python scripts/benchmark_compression.py --sample 2000
+    python scripts/benchmark_compression.py --dir /ruta/a/paginas
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import config
+import database_service
+
+
+def load_pages_from_redis(sample: int) -> List[str]:
+    """Lee hasta `sample` páginas de los hashes pages:* de Redis."""
+    client = config.get_redis_client()
+    pages = []
+    for key in client.scan_iter(match="pages:*", count=100):
+        for value in client.hvals(key):
+            pages.append(database_service.decode_value(value))
+            if len(pages) >= sample:
+                return pages
+    return pages
+
+
+def load_pages_from_dir(directory: str, sample: int) -> List[str]:
+    """Lee hasta `sample` archivos .txt de un directorio."""
+    pages = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".txt"):
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                pages.append(f.read())
+            if len(pages) >= sample:
+                break
+    return pages
+
+
+def run_benchmark(pages: List[str], level: int) -> None:
+    """Codifica y decodifica el corpus con un nivel de compresión e imprime los resultados."""
+    config.COMPRESSION_ENABLED = True
+    config.COMPRESSION_LEVEL = level
+
+    raw_bytes = sum(len(page.encode("utf-8")) for page in pages)
+
+    start = time.perf_counter()
+    encoded = [database_service.encode_value(page) for page in pages]
+    encode_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for value in encoded:
+        database_service.decode_value(value)
+    decode_seconds = time.perf_counter() - start
+
+    stored_bytes = sum(len(value) for value in encoded)
+    compressed_count = sum(
+        1 for value in encoded if database_service.is_compressed_value(value)
+    )
+    print(
+        f"nivel {level}: razón {raw_bytes / stored_bytes:.2f}x "
+        f"({raw_bytes / 1024:.0f} KiB -> {stored_bytes / 1024:.0f} KiB), "
+        f"comprimidas {compressed_count}/{len(pages)}, "
+        f"codificación {encode_seconds / len(pages) * 1e6:.1f} µs/página, "
+        f"decodificación {decode_seconds / len(pages) * 1e6:.1f} µs/página"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dir", help="Directorio con páginas en archivos .txt")
+    parser.add_argument("--sample", type=int, default=1000, help="Máximo de páginas")
+    parser.add_argument(
+        "--levels", default="1,6,9", help="Niveles de zlib a evaluar, separados por coma"
+    )
+    args = parser.parse_args()
+
+    if args.dir:
+        corpus = load_pages_from_dir(args.dir, args.sample)
+    else:
+        corpus = load_pages_from_redis(args.sample)
+
+    if not corpus:
+        sys.exit("No se encontraron páginas para el benchmark")
+
+    print(
+        f"Corpus: {len(corpus)} páginas, umbral de compresión "
+        f"{config.COMPRESSION_MIN_BYTES} bytes"
+    )
+    for compression_level in args.levels.split(","):
+        run_benchmark(corpus, int(compression_level))
@@ -0,0 +1,26 @@
+"""
+Migra las entradas del índice vectorial con claves aleatorias (docs:{uuid})
+al formato determinista docs:{filename}:{page}.
+
+Uso:
+    REDIS_URL=redis://... INDEX_ID=mi_indice python scripts/migrate_vector_keys.py
+"""
+
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import config
+from vector_search import migrate_vector_keys
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    config.initialize_services()
+    try:
+        stats = migrate_vector_keys(config.INDEX_ID)
+        print(f"Migración completada: {stats}")
+    finally:
+        config.close_services()
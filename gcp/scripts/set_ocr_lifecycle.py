@@ -0,0 +1,47 @@
+"""
+Configura en OUTPUT_BUCKET la regla de ciclo de vida que elimina los resultados
+temporales de Document AI (prefijo ocr/) tras OCR_OUTPUT_RETENTION_DAYS días.
+Cubre los shards que no se eliminaron al terminar el procesamiento (p. ej. por
+una ejecución interrumpida). Las demás reglas del bucket se conservan.
+
+Uso:
+    OUTPUT_BUCKET=mi_bucket python scripts/set_ocr_lifecycle.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from google.cloud import storage
+
+import config
+
+OCR_PREFIX = "ocr/"
+
+
+if __name__ == "__main__":
+    if not config.OUTPUT_BUCKET:
+        sys.exit("OUTPUT_BUCKET no está definido")
+
+    bucket = storage.Client().get_bucket(config.OUTPUT_BUCKET)
+
+    # Reemplazar una regla anterior del prefijo en lugar de duplicarla
+    rules = [
+        rule
+        for rule in bucket.lifecycle_rules
+        if not (
+            rule.get("action", {}).get("type") == "Delete"
+            and rule.get("condition", {}).get("matchesPrefix") == [OCR_PREFIX]
+        )
+    ]
+    bucket.lifecycle_rules = rules
+    bucket.add_lifecycle_delete_rule(
+        age=config.OCR_OUTPUT_RETENTION_DAYS, matches_prefix=[OCR_PREFIX]
+    )
+    bucket.patch()
+
+    print(
+        f"Regla de ciclo de vida configurada en gs://{config.OUTPUT_BUCKET}/{OCR_PREFIX}: "
+        f"eliminar tras {config.OCR_OUTPUT_RETENTION_DAYS} días"
+    )
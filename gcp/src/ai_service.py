@@ -1,13 +1,60 @@
 import json
 import logging
-from typing import List, Dict, Any
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Tuple
 from openai import OpenAI  # Updated import
-from config import OPENAI_API_KEY, OPENAI_MODEL
+from pydantic import BaseModel, ValidationError
+from config import (
+    OPENAI_API_KEY,
+    OPENAI_MODEL,
+    EMBEDDING_MODEL,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_BATCH_MAX_INPUTS,
+    EMBEDDING_BATCH_MAX_TOKENS,
+    EMBEDDING_INPUT_MAX_TOKENS,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_CACHE_ENABLED,
+    OPENAI_ASYNC,
+    LLM_CHUNK_MAX_TOKENS,
+    LLM_MAP_MAX_CONCURRENCY,
+)
+import ai_service_async
+from config import get_redis_client
+from embedding_cache import get_cached_embeddings, save_embeddings
+from token_estimator import estimate_tokens, split_by_tokens, token_prefix_length
 
 # Initialize OpenAI client
 client = OpenAI(api_key=OPENAI_API_KEY)  # Updated initialization
 
 
+class DocumentAnalysis(BaseModel):
+    """Respuesta estructurada del análisis combinado de un documento."""
+
+    topics: List[str]
+    questions: List[str]
+
+
+# Esquema de salida estructurada equivalente a DocumentAnalysis
+ANALYSIS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "document_analysis",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "topics": {"type": "array", "items": {"type": "string"}},
+                "questions": {"type": "array", "items": {"type": "string"}},
+            },
+            "required": ["topics", "questions"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
 def extract_topics(text: str) -> List[str]:
     """
     Extrae los tópicos principales del texto usando OpenAI.
@@ -27,12 +74,8 @@ def extract_topics(text: str) -> List[str]:
     {text}
     """
 
-    # Llamada a OpenAI para extraer tópicos - actualizada a la nueva API
-    response = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=[{"role": "user", "content": prompt}]
-    )
-    content = response.choices[0].message.content
+    # Llamada a OpenAI para extraer tópicos
+    content = _complete(prompt)
     return _parse_json_response(content, "tópicos")
 
 
@@ -63,13 +106,310 @@ def generate_questions(text: str, topics: List[str]) -> List[str]:
     {text}
     """
 
-    # Llamada a OpenAI para generar preguntas - actualizada a la nueva API
+    # Llamada a OpenAI para generar preguntas
+    content = _complete(prompt)
+    return _parse_json_response(content, "preguntas")
+
+
+def split_into_chunks(pages: List[str], max_tokens: int) -> List[str]:
+    """
+    Agrupa páginas consecutivas en fragmentos de texto de hasta max_tokens tokens estimados.
+    Las páginas que superan el límite por sí solas se dividen en partes que lo respetan.
+
+    Args:
+        pages: Lista de textos de páginas
+        max_tokens: Máximo de tokens estimados por fragmento
+
+    Returns:
+        Lista de fragmentos de texto
+    """
+    chunks = []
+    current_pages = []
+    current_tokens = 0
+
+    for page in pages:
+        # Dividir las páginas demasiado largas en partes que respeten el límite
+        parts = split_by_tokens(page, max_tokens)
+        for part in parts:
+            part_tokens = estimate_tokens(part)
+            if current_pages and current_tokens + part_tokens > max_tokens:
+                chunks.append("\n\n".join(current_pages))
+                current_pages = []
+                current_tokens = 0
+            current_pages.append(part)
+            current_tokens += part_tokens
+
+    if current_pages:
+        chunks.append("\n\n".join(current_pages))
+
+    return chunks
+
+
+def _map_chunks(function, chunks: List[str], *args) -> List[List[str]]:
+    """
+    Aplica una función de extracción a cada fragmento en paralelo.
+
+    Args:
+        function: Función que recibe un fragmento (y args) y devuelve una lista
+        chunks: Fragmentos de texto
+        *args: Argumentos adicionales para la función
+
+    Returns:
+        Resultados de cada fragmento, en el mismo orden
+    """
+    with ThreadPoolExecutor(
+        max_workers=min(LLM_MAP_MAX_CONCURRENCY, len(chunks))
+    ) as executor:
+        return list(executor.map(lambda chunk: function(chunk, *args), chunks))
+
+
+def _unique(items: List[str]) -> List[str]:
+    """Elimina duplicados (sin distinguir mayúsculas ni espacios) conservando el orden."""
+    seen = set()
+    unique_items = []
+    for item in items:
+        normalized = " ".join(str(item).lower().split())
+        if normalized and normalized not in seen:
+            seen.add(normalized)
+            unique_items.append(item)
+    return unique_items
+
+
+def extract_document_topics(pages: List[str]) -> List[str]:
+    """
+    Extrae los tópicos de un documento.
+    Si el documento supera LLM_CHUNK_MAX_TOKENS, se extraen tópicos candidatos de
+    cada fragmento en paralelo (map) y se consolidan en una llamada final (reduce).
+
+    Args:
+        pages: Lista de textos de páginas
+
+    Returns:
+        Una lista de tópicos identificados
+    """
+    chunks = split_into_chunks(pages, LLM_CHUNK_MAX_TOKENS)
+    if len(chunks) <= 1:
+        return extract_topics("\n\n".join(pages))
+
+    logging.info(f"Extrayendo tópicos en {len(chunks)} fragmentos")
+    return reduce_topics(_map_chunks(extract_topics, chunks))
+
+
+def reduce_topics(results: List[List[str]]) -> List[str]:
+    """
+    Consolida en una llamada final los tópicos candidatos obtenidos de cada
+    fragmento de un documento.
+
+    Args:
+        results: Resultados de extract_topics de cada fragmento, en orden
+
+    Returns:
+        Una lista de tópicos identificados
+    """
+    if len(results) == 1:
+        return results[0]
+
+    candidates = _unique([topic for topics in results for topic in topics])
+
+    prompt = f"""
+    Los siguientes tópicos fueron extraídos de distintas partes de un mismo documento.
+    Unifica los tópicos repetidos o equivalentes y conserva los principales.
+    Devuelve únicamente los tópicos en formato JSON como una lista de strings.
+
+    Tópicos candidatos:
+    {json.dumps(candidates, ensure_ascii=False)}
+    """
+    topics = _parse_json_response(_complete(prompt), "tópicos")
+    return topics or candidates
+
+
+def generate_document_questions(pages: List[str], topics: List[str]) -> List[str]:
+    """
+    Genera las preguntas frecuentes de un documento.
+    Si el documento supera LLM_CHUNK_MAX_TOKENS, se generan preguntas candidatas
+    de cada fragmento en paralelo (map) y se seleccionan en una llamada final (reduce).
+
+    Args:
+        pages: Lista de textos de páginas
+        topics: Los tópicos identificados previamente
+
+    Returns:
+        Una lista de preguntas generadas
+    """
+    chunks = split_into_chunks(pages, LLM_CHUNK_MAX_TOKENS)
+    if len(chunks) <= 1:
+        return generate_questions("\n\n".join(pages), topics)
+
+    logging.info(f"Generando preguntas en {len(chunks)} fragmentos")
+    return reduce_questions(_map_chunks(generate_questions, chunks, topics), topics)
+
+
+def reduce_questions(results: List[List[str]], topics: List[str]) -> List[str]:
+    """
+    Selecciona en una llamada final las preguntas más representativas entre las
+    candidatas generadas para cada fragmento de un documento.
+
+    Args:
+        results: Resultados de generate_questions de cada fragmento, en orden
+        topics: Los tópicos identificados previamente
+
+    Returns:
+        Una lista de preguntas generadas
+    """
+    if len(results) == 1:
+        return results[0]
+
+    candidates = _unique([question for questions in results for question in questions])
+
+    prompt = f"""
+    Las siguientes preguntas frecuentes fueron generadas a partir de distintas partes
+    de un mismo documento, cuyos tópicos son: {", ".join(topics)}.
+    Elimina las preguntas repetidas o equivalentes y selecciona las 5 más representativas
+    del documento completo.
+    Devuelve únicamente las preguntas en formato JSON como una lista de strings.
+
+    Preguntas candidatas:
+    {json.dumps(candidates, ensure_ascii=False)}
+    """
+    questions = _parse_json_response(_complete(prompt), "preguntas")
+    return questions or candidates[:5]
+
+
+def analyze_text(text: str) -> Tuple[List[str], List[str]]:
+    """
+    Extrae tópicos y genera preguntas de un texto en una única llamada a OpenAI,
+    con una respuesta estructurada validada contra DocumentAnalysis.
+
+    Args:
+        text: El texto del documento a analizar
+
+    Returns:
+        Tupla con la lista de tópicos y la lista de preguntas
+    """
+    prompt = f"""
+    Analiza el siguiente texto y:
+    1. Extrae los tópicos o categorías principales.
+    Por ejemplo: ["Solicitud de anulación", "Actualización de datos"]
+    2. Basándote en el texto y sus tópicos, genera una lista de 5 preguntas frecuentes
+    que podrían hacer los usuarios sobre este contenido. Tener en cuenta que las
+    preguntas puedan ser respondidas con el texto proporcionado.
+    Por ejemplo: ["¿Puedo anular una transacción desde la gestión externa?",
+    "¿Qué hago si ya realicé 5 anulaciones?"]
+
+    Texto a analizar:
+    {text}
+    """
+
+    content = _complete(prompt, response_format=ANALYSIS_RESPONSE_FORMAT)
+    return _parse_analysis_response(content)
+
+
+def analyze_document(pages: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Extrae tópicos y preguntas de un documento con llamadas combinadas.
+    Si el documento supera LLM_CHUNK_MAX_TOKENS, se analiza cada fragmento en
+    paralelo (map) y los candidatos se consolidan en una llamada final (reduce).
+
+    Args:
+        pages: Lista de textos de páginas
+
+    Returns:
+        Tupla con la lista de tópicos y la lista de preguntas
+    """
+    chunks = split_into_chunks(pages, LLM_CHUNK_MAX_TOKENS)
+    if len(chunks) <= 1:
+        return analyze_text("\n\n".join(pages))
+
+    logging.info(f"Analizando documento en {len(chunks)} fragmentos")
+    return reduce_analysis(_map_chunks(analyze_text, chunks))
+
+
+def reduce_analysis(
+    results: List[Tuple[List[str], List[str]]]
+) -> Tuple[List[str], List[str]]:
+    """
+    Consolida en una llamada final los tópicos y preguntas candidatos obtenidos
+    del análisis de cada fragmento de un documento.
+
+    Args:
+        results: Resultados de analyze_text de cada fragmento, en orden
+
+    Returns:
+        Tupla con la lista de tópicos y la lista de preguntas
+    """
+    if len(results) == 1:
+        return results[0]
+
+    candidate_topics = _unique([topic for topics, _ in results for topic in topics])
+    candidate_questions = _unique(
+        [question for _, questions in results for question in questions]
+    )
+
+    prompt = f"""
+    Los siguientes tópicos y preguntas frecuentes fueron extraídos de distintas
+    partes de un mismo documento.
+    1. Unifica los tópicos repetidos o equivalentes y conserva los principales.
+    2. Elimina las preguntas repetidas o equivalentes y selecciona las 5 más
+    representativas del documento completo.
+
+    Tópicos candidatos:
+    {json.dumps(candidate_topics, ensure_ascii=False)}
+
+    Preguntas candidatas:
+    {json.dumps(candidate_questions, ensure_ascii=False)}
+    """
+    topics, questions = _parse_analysis_response(
+        _complete(prompt, response_format=ANALYSIS_RESPONSE_FORMAT)
+    )
+    return topics or candidate_topics, questions or candidate_questions[:5]
+
+
+def _parse_analysis_response(response_text: str) -> Tuple[List[str], List[str]]:
+    """
+    Valida la respuesta estructurada del análisis combinado.
+
+    Args:
+        response_text: El texto JSON de la respuesta
+
+    Returns:
+        Tupla con la lista de tópicos y la lista de preguntas (vacías si no es válida)
+    """
+    try:
+        analysis = DocumentAnalysis.model_validate_json(response_text or "")
+    except ValidationError as e:
+        logging.error(f"Respuesta de análisis inválida: {e}")
+        logging.error(f"Respuesta de OpenAI: {response_text}")
+        return [], []
+    return analysis.topics, analysis.questions
+
+
+def _complete(prompt: str, response_format: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Solicita a OpenAI una respuesta de chat para un prompt.
+    Con OPENAI_ASYNC se usa el cliente asíncrono compartido, con limitación
+    de tasa y reintentos.
+
+    Args:
+        prompt: Prompt del usuario
+        response_format: Formato de respuesta estructurada, si se requiere
+
+    Returns:
+        Contenido de la respuesta
+    """
+    if OPENAI_ASYNC:
+        return ai_service_async.run(
+            ai_service_async.complete(
+                prompt, estimate_tokens(prompt), response_format=response_format
+            )
+        )
+
+    extra_args = {"response_format": response_format} if response_format else {}
     response = client.chat.completions.create(
         model=OPENAI_MODEL,
-        messages=[{"role": "user", "content": prompt}]
+        messages=[{"role": "user", "content": prompt}],
+        **extra_args,
     )
-    content = response.choices[0].message.content
-    return _parse_json_response(content, "preguntas")
+    return response.choices[0].message.content
 
 
 def _parse_json_response(response_text: str, item_type: str) -> List[str]:
@@ -100,35 +440,213 @@ def _parse_json_response(response_text: str, item_type: str) -> List[str]:
         return []
 
 
-def create_embeddings(pages: List[str]) -> List[Any]:
+def _truncate_embedding_input(text: str) -> str:
+    """
+    Recorta un texto que supera EMBEDDING_INPUT_MAX_TOKENS tokens estimados, ya
+    que la API de embeddings rechaza las entradas que exceden el límite del modelo.
+
+    Args:
+        text: Texto a enviar a embeddings
+
+    Returns:
+        El texto, recortado si supera el límite
+    """
+    length = token_prefix_length(text, EMBEDDING_INPUT_MAX_TOKENS)
+    if length < len(text):
+        logging.warning(
+            f"Texto de {len(text)} caracteres recortado a {length} para no superar "
+            f"{EMBEDDING_INPUT_MAX_TOKENS} tokens estimados por entrada de embeddings"
+        )
+    return text[:length]
+
+
+def _build_embedding_batches(pages: List[str]) -> List[List[int]]:
+    """
+    Agrupa los índices de las páginas en lotes que respetan los límites por solicitud.
+
+    Args:
+        pages: Lista de textos de páginas
+
+    Returns:
+        Lista de lotes, cada uno con los índices de las páginas que contiene
+    """
+    batches = []
+    current_batch = []
+    current_tokens = 0
+
+    for page_index, page in enumerate(pages):
+        # La API rechaza entradas vacías, esas páginas no se envían
+        if not page.strip():
+            continue
+
+        page_tokens = estimate_tokens(page)
+        if current_batch and (
+            len(current_batch) >= EMBEDDING_BATCH_MAX_INPUTS
+            or current_tokens + page_tokens > EMBEDDING_BATCH_MAX_TOKENS
+        ):
+            batches.append(current_batch)
+            current_batch = []
+            current_tokens = 0
+
+        current_batch.append(page_index)
+        current_tokens += page_tokens
+
+    if current_batch:
+        batches.append(current_batch)
+
+    return batches
+
+
+def _embed_batch(
+    batch_number: int,
+    texts: List[str],
+    cancel_event: Optional[threading.Event] = None,
+) -> List[Any]:
+    """
+    Solicita los embeddings de un lote de textos en una única llamada a OpenAI.
+    Si el lote falla, se reintenta página por página para aislar la entrada inválida;
+    si una página falla por sí sola, se propaga el error para que el evento se
+    reintente, en lugar de devolver un vector vacío que la dejaría sin indexar.
+
+    Args:
+        batch_number: Número del lote (para logging)
+        texts: Textos del lote
+        cancel_event: Evento que, si está activo, cancela el lote antes de enviarlo
+
+    Returns:
+        Lista de embeddings en el mismo orden que los textos
+
+    Raises:
+        Exception: Error de OpenAI de la primera página que no se pudo procesar
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise CancelledError(f"Lote de embeddings {batch_number} cancelado")
+
+    start_time = time.perf_counter()
+    try:
+        response = client.embeddings.create(
+            model=EMBEDDING_MODEL, input=texts, dimensions=EMBEDDING_DIMENSIONS
+        )
+    except Exception as e:
+        logging.error(f"Error al generar embeddings del lote {batch_number}: {e}")
+        if len(texts) == 1:
+            raise
+        return [
+            embedding
+            for text in texts
+            for embedding in _embed_batch(batch_number, [text], cancel_event)
+        ]
+
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+    logging.info(
+        f"Lote de embeddings {batch_number}: {len(texts)} páginas, "
+        f"~{sum(estimate_tokens(text) for text in texts)} tokens estimados, "
+        f"{response.usage.total_tokens} tokens reales, {elapsed_ms:.0f} ms"
+    )
+
+    # La API no garantiza el orden de los resultados, se ordenan por índice
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+def _generate_embeddings(
+    pages: List[str], cancel_event: Optional[threading.Event] = None
+) -> List[Any]:
+    """
+    Genera con OpenAI los embeddings de una lista de páginas.
+    Las páginas que superan EMBEDDING_INPUT_MAX_TOKENS se recortan, se agrupan en
+    lotes según los límites de entradas y tokens por solicitud, y se procesan
+    hasta EMBEDDING_MAX_CONCURRENCY lotes a la vez.
+
+    Args:
+        pages: Lista de textos de páginas
+        cancel_event: Evento que, si está activo, cancela los lotes pendientes
+
+    Returns:
+        Lista de embeddings, en el mismo orden que las páginas
+    """
+    pages = [_truncate_embedding_input(page) for page in pages]
+    batches = _build_embedding_batches(pages)
+    # Las páginas sin texto conservan un vector vacío
+    result_embeddings: List[Any] = [[0.0] * EMBEDDING_DIMENSIONS for _ in pages]
+    if not batches:
+        return result_embeddings
+
+    if OPENAI_ASYNC:
+        batch_texts = [[pages[i] for i in batch] for batch in batches]
+        batch_embeddings = ai_service_async.run(
+            ai_service_async.embed_batches(
+                batch_texts,
+                [sum(estimate_tokens(text) for text in texts) for texts in batch_texts],
+            ),
+            cancel_event,
+        )
+        for batch, embeddings in zip(batches, batch_embeddings):
+            for page_index, embedding in zip(batch, embeddings):
+                result_embeddings[page_index] = embedding
+        logging.info(
+            f"Embeddings generados para {len(pages)} páginas en {len(batches)} lotes"
+        )
+        return result_embeddings
+
+    with ThreadPoolExecutor(
+        max_workers=min(EMBEDDING_MAX_CONCURRENCY, len(batches))
+    ) as executor:
+        futures = {
+            executor.submit(
+                _embed_batch, batch_number, [pages[i] for i in batch], cancel_event
+            ): batch
+            for batch_number, batch in enumerate(batches)
+        }
+        for future in as_completed(futures):
+            for page_index, embedding in zip(futures[future], future.result()):
+                result_embeddings[page_index] = embedding
+
+    logging.info(
+        f"Embeddings generados para {len(pages)} páginas en {len(batches)} lotes"
+    )
+    return result_embeddings
+
+
+def create_embeddings(
+    pages: List[str], cancel_event: Optional[threading.Event] = None
+) -> List[Any]:
     """
     Crea embeddings para cada página del documento usando OpenAI.
+    Si la caché está habilitada, solo se generan los embeddings de las páginas
+    cuyo texto no se encuentra en la caché de Redis.
 
     Args:
         pages: Lista de textos de páginas
+        cancel_event: Evento que, si está activo, cancela los lotes pendientes
 
     Returns:
-        Lista de embeddings
+        Lista de embeddings, en el mismo orden que las páginas
     """
-    result_embeddings = []
+    if not EMBEDDING_CACHE_ENABLED:
+        return _generate_embeddings(pages, cancel_event)
 
-    # Procesar páginas individualmente para evitar límites de token
-    for page in pages:
-        try:
-            # Actualizada a la nueva API
-            response = client.embeddings.create(
-                model="text-embedding-3-small",
-                input=page
-            )
-            # En la nueva API, el embedding se accede de manera diferente
-            embedding_vector = response.data[0].embedding
-            result_embeddings.append(embedding_vector)
-        except Exception as e:
-            logging.error(f"Error al generar embedding con OpenAI: {e}")
-            # Devolver un vector vacío en caso de error
-            result_embeddings.append(
-                [0.0] * 1536
-            )  # Dimension for OpenAI text-embedding-3-small embeddings
+    try:
+        redis_client = get_redis_client()
+        result_embeddings = get_cached_embeddings(redis_client, pages)
+    except Exception as e:
+        logging.warning(f"Caché de embeddings no disponible: {e}")
+        return _generate_embeddings(pages, cancel_event)
+
+    missing_indexes = [
+        i for i, embedding in enumerate(result_embeddings) if embedding is None
+    ]
+    if not missing_indexes:
+        return result_embeddings
+
+    missing_pages = [pages[i] for i in missing_indexes]
+    new_embeddings = _generate_embeddings(missing_pages, cancel_event)
+    for page_index, embedding in zip(missing_indexes, new_embeddings):
+        result_embeddings[page_index] = embedding
+
+    try:
+        save_embeddings(redis_client, missing_pages, new_embeddings)
+    except Exception as e:
+        logging.warning(f"No se pudieron guardar embeddings en caché: {e}")
 
     return result_embeddings
 
@@ -0,0 +1,326 @@
+"""
+Módulo con la variante asíncrona de los servicios de IA.
+Usa un único cliente AsyncOpenAI que vive en un event loop propio del proceso,
+compartido por todos los eventos, con un semáforo de concurrencia, reintentos que
+respetan Retry-After y un limitador que se ajusta con las cabeceras de rate limit.
+"""
+
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    AsyncOpenAI,
+    RateLimitError,
+)
+
+import config
+
+# Intervalo con el que se comprueba el evento de cancelación mientras se espera
+CANCEL_POLL_SECONDS = 0.2
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+# Estado ligado al event loop; se crea en el primer uso desde el propio loop
+_client: Optional[AsyncOpenAI] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_limiter: Optional["AdaptiveRateLimiter"] = None
+
+
+def _parse_reset(value: Optional[str]) -> Optional[float]:
+    """
+    Convierte una duración de las cabeceras de OpenAI ("1s", "6m0s", "20ms") a segundos.
+
+    Args:
+        value: Valor de la cabecera
+
+    Returns:
+        Duración en segundos o None si no se pudo interpretar
+    """
+    if not value:
+        return None
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+class AdaptiveRateLimiter:
+    """
+    Limitador basado en las cabeceras x-ratelimit-* de las respuestas de OpenAI.
+    Antes de cada solicitud espera si la cuota restante de solicitudes o tokens
+    no alcanza hasta que se reinicie, y se pausa por completo tras un 429.
+    """
+
+    def __init__(self):
+        self.remaining_requests: Optional[int] = None
+        self.remaining_tokens: Optional[int] = None
+        self.requests_reset_at = 0.0
+        self.tokens_reset_at = 0.0
+        self.paused_until = 0.0
+
+    async def acquire(self, estimated_tokens: int) -> None:
+        """
+        Espera hasta que haya cuota para una solicitud y la reserva.
+
+        Args:
+            estimated_tokens: Tokens estimados de la solicitud
+        """
+        while True:
+            now = time.monotonic()
+            if now >= self.requests_reset_at:
+                self.remaining_requests = None
+            if now >= self.tokens_reset_at:
+                self.remaining_tokens = None
+
+            wait = self.paused_until - now
+            if self.remaining_requests is not None and self.remaining_requests <= 0:
+                wait = max(wait, self.requests_reset_at - now)
+            if (
+                self.remaining_tokens is not None
+                and self.remaining_tokens < estimated_tokens
+            ):
+                wait = max(wait, self.tokens_reset_at - now)
+
+            if wait <= 0:
+                break
+            logging.debug(f"Limitador de OpenAI: esperando {wait:.2f} s")
+            await asyncio.sleep(wait)
+
+        if self.remaining_requests is not None:
+            self.remaining_requests -= 1
+        if self.remaining_tokens is not None:
+            self.remaining_tokens -= estimated_tokens
+
+    def update(self, headers: Any) -> None:
+        """
+        Actualiza la cuota restante con las cabeceras de una respuesta.
+
+        Args:
+            headers: Cabeceras HTTP de la respuesta
+        """
+        now = time.monotonic()
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        requests_reset = _parse_reset(headers.get("x-ratelimit-reset-requests"))
+        if remaining_requests is not None and requests_reset is not None:
+            self.remaining_requests = int(remaining_requests)
+            self.requests_reset_at = now + requests_reset
+
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        tokens_reset = _parse_reset(headers.get("x-ratelimit-reset-tokens"))
+        if remaining_tokens is not None and tokens_reset is not None:
+            self.remaining_tokens = int(remaining_tokens)
+            self.tokens_reset_at = now + tokens_reset
+
+    def pause(self, seconds: float) -> None:
+        """
+        Detiene todas las solicitudes durante un tiempo (p. ej. tras un 429).
+
+        Args:
+            seconds: Segundos de pausa
+        """
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Obtiene el event loop del proceso, iniciándolo en un hilo daemon en el primer uso.
+
+    Returns:
+        Event loop compartido
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="openai-async", daemon=True
+            ).start()
+        return _loop
+
+
+def _get_state():
+    """Crea el cliente, el semáforo y el limitador dentro del event loop compartido."""
+    global _client, _semaphore, _limiter
+    if _client is None:
+        _client = AsyncOpenAI(api_key=config.OPENAI_API_KEY, max_retries=0)
+        _semaphore = asyncio.Semaphore(config.OPENAI_MAX_CONCURRENCY)
+        _limiter = AdaptiveRateLimiter()
+    return _client, _semaphore, _limiter
+
+
+def run(coroutine: Awaitable[Any], cancel_event: Optional[threading.Event] = None) -> Any:
+    """
+    Ejecuta una corrutina en el event loop compartido y espera su resultado.
+
+    Args:
+        coroutine: Corrutina a ejecutar
+        cancel_event: Evento que, si se activa, cancela la corrutina
+
+    Returns:
+        Resultado de la corrutina
+    """
+    future = asyncio.run_coroutine_threadsafe(coroutine, _get_loop())
+    while True:
+        try:
+            return future.result(timeout=CANCEL_POLL_SECONDS)
+        except FutureTimeoutError:
+            if cancel_event is not None and cancel_event.is_set():
+                future.cancel()
+                raise CancelledError("Solicitud a OpenAI cancelada")
+
+
+def _get_retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """
+    Calcula la espera antes de reintentar una solicitud fallida.
+
+    Args:
+        error: Error de la solicitud
+        attempt: Número de intento (desde 0)
+
+    Returns:
+        Segundos de espera o None si el error no es reintentable
+    """
+    if isinstance(error, RateLimitError) and error.code == "insufficient_quota":
+        return None
+    if isinstance(error, APIStatusError):
+        if error.status_code != 429 and error.status_code < 500:
+            return None
+        headers = error.response.headers
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after", "").replace(".", "", 1).isdigit():
+            return float(headers["retry-after"])
+    elif not isinstance(error, (APIConnectionError, APITimeoutError)):
+        return None
+
+    # Backoff exponencial con jitter cuando no hay Retry-After
+    backoff = min(
+        config.OPENAI_RETRY_MAX_SECONDS, config.OPENAI_RETRY_BASE_SECONDS * 2**attempt
+    )
+    return random.uniform(backoff / 2, backoff)
+
+
+async def _request(
+    create: Callable[[AsyncOpenAI], Awaitable[Any]], estimated_tokens: int
+) -> Any:
+    """
+    Ejecuta una solicitud a OpenAI respetando el semáforo, el limitador y los reintentos.
+
+    Args:
+        create: Función que recibe el cliente y devuelve la respuesta cruda (with_raw_response)
+        estimated_tokens: Tokens estimados de la solicitud
+
+    Returns:
+        Respuesta de OpenAI ya interpretada
+    """
+    client, semaphore, limiter = _get_state()
+    for attempt in range(config.OPENAI_MAX_RETRIES + 1):
+        await limiter.acquire(estimated_tokens)
+        try:
+            async with semaphore:
+                raw_response = await create(client)
+            limiter.update(raw_response.headers)
+            return raw_response.parse()
+        except Exception as e:
+            delay = _get_retry_delay(e, attempt)
+            if delay is None or attempt == config.OPENAI_MAX_RETRIES:
+                raise
+            if isinstance(e, RateLimitError):
+                limiter.pause(delay)
+            logging.warning(
+                f"Error de OpenAI ({e.__class__.__name__}), reintento "
+                f"{attempt + 1}/{config.OPENAI_MAX_RETRIES} en {delay:.2f} s"
+            )
+            await asyncio.sleep(delay)
+
+
+async def complete(
+    prompt: str,
+    estimated_tokens: int,
+    response_format: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Solicita una respuesta de chat para un prompt.
+
+    Args:
+        prompt: Prompt del usuario
+        estimated_tokens: Tokens estimados del prompt
+        response_format: Formato de respuesta estructurada, si se requiere
+
+    Returns:
+        Contenido de la respuesta
+    """
+    extra_args = {"response_format": response_format} if response_format else {}
+    response = await _request(
+        lambda client: client.chat.completions.with_raw_response.create(
+            model=config.OPENAI_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            **extra_args,
+        ),
+        estimated_tokens,
+    )
+    return response.choices[0].message.content
+
+
+async def embed_batches(
+    batches: List[List[str]], estimated_tokens: List[int]
+) -> List[List[List[float]]]:
+    """
+    Genera los embeddings de varios lotes de textos en paralelo.
+    Igual que en la variante síncrona, un lote que agota sus reintentos
+    produce un error en lugar de vectores vacíos.
+
+    Args:
+        batches: Lotes de textos
+        estimated_tokens: Tokens estimados de cada lote
+
+    Returns:
+        Embeddings de cada lote, en el mismo orden que los textos
+    """
+
+    async def embed_batch(batch_number: int, texts: List[str], tokens: int):
+        start_time = time.perf_counter()
+        response = await _request(
+            lambda client: client.embeddings.with_raw_response.create(
+                model=config.EMBEDDING_MODEL,
+                input=texts,
+                dimensions=config.EMBEDDING_DIMENSIONS,
+            ),
+            tokens,
+        )
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        logging.info(
+            f"Lote de embeddings {batch_number}: {len(texts)} páginas, "
+            f"~{tokens} tokens estimados, "
+            f"{response.usage.total_tokens} tokens reales, {elapsed_ms:.0f} ms"
+        )
+        return [
+            item.embedding
+            for item in sorted(response.data, key=lambda item: item.index)
+        ]
+
+    tasks = [
+        asyncio.ensure_future(embed_batch(batch_number, texts, tokens))
+        for batch_number, (texts, tokens) in enumerate(zip(batches, estimated_tokens))
+    ]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        # Cancelar los lotes pendientes si uno falla o si se cancela la operación
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+print("Servicios de IA asíncronos cargados")
@@ -0,0 +1,119 @@
+"""
+Módulo para dividir las páginas de un documento en fragmentos para la búsqueda vectorial.
+Cada fragmento tiene un tamaño acotado en tokens, se solapa con el anterior y
+conserva la página y la posición del texto de la que proviene.
+"""
+
+from typing import List, NamedTuple, Optional
+
+import config
+from token_estimator import token_prefix_length
+
+
+class Chunk(NamedTuple):
+    """Fragmento de una página con su posición dentro del texto de la página."""
+
+    page: int
+    chunk: int
+    char_start: int
+    char_end: int
+    text: str
+
+
+def _find_break(text: str, start: int, end: int) -> int:
+    """
+    Busca el mejor punto de corte antes de `end`, priorizando saltos de párrafo,
+    saltos de línea, fin de oración y espacios, en ese orden.
+
+    Args:
+        text: Texto de la página
+        start: Inicio del fragmento
+        end: Posición máxima del corte
+
+    Returns:
+        Posición del corte
+    """
+    # No cortar en la primera mitad del fragmento para no generar fragmentos diminutos
+    min_end = start + (end - start) // 2
+    for separator in ("\n\n", "\n", ". ", " "):
+        position = text.rfind(separator, min_end, end)
+        if position != -1:
+            return position + len(separator)
+    return end
+
+
+def chunk_page(
+    page_num: int, text: str, max_tokens: int, overlap_tokens: int
+) -> List[Chunk]:
+    """
+    Divide el texto de una página en fragmentos solapados. El tamaño de los
+    fragmentos y del solapamiento se mide con token_estimator, el mismo
+    estimador que aplica los límites de las solicitudes de embeddings.
+
+    Args:
+        page_num: Número de página
+        text: Texto de la página
+        max_tokens: Tokens estimados máximos por fragmento
+        overlap_tokens: Tokens estimados de solapamiento entre fragmentos consecutivos
+
+    Returns:
+        Lista de fragmentos; vacía si la página no tiene texto
+    """
+    if not text.strip():
+        return []
+
+    chunks = []
+    start = 0
+    while True:
+        max_end = start + token_prefix_length(text[start:], max_tokens)
+        end = max_end if max_end >= len(text) else _find_break(text, start, max_end)
+        if text[start:end].strip():
+            chunks.append(Chunk(page_num, len(chunks), start, end, text[start:end]))
+        if end >= len(text):
+            break
+
+        # El siguiente fragmento empieza antes del corte, en un límite de palabra.
+        # El solapamiento es el sufijo más largo que no supera overlap_tokens, y
+        # como mucho la mitad del fragmento
+        overlap_chars = min(
+            token_prefix_length(text[start:end][::-1], overlap_tokens) if overlap_tokens > 0 else 0,
+            (end - start) // 2,
+        )
+        next_start = max(end - overlap_chars, start + 1)
+        word_start = text.find(" ", next_start, end)
+        start = word_start + 1 if word_start != -1 else next_start
+    return chunks
+
+
+def chunk_pages(
+    pages: List[str],
+    page_numbers: Optional[List[int]] = None,
+    max_tokens: Optional[int] = None,
+    overlap_tokens: Optional[int] = None,
+) -> List[Chunk]:
+    """
+    Divide las páginas de un documento en fragmentos solapados.
+
+    Args:
+        pages: Lista de textos de páginas
+        page_numbers: Números de página de cada texto. Por defecto, la posición en la lista
+        max_tokens: Tokens máximos por fragmento (default: CHUNK_MAX_TOKENS)
+        overlap_tokens: Tokens de solapamiento (default: CHUNK_OVERLAP_TOKENS)
+
+    Returns:
+        Lista de fragmentos en orden de página y posición
+    """
+    if page_numbers is None:
+        page_numbers = list(range(len(pages)))
+    if max_tokens is None:
+        max_tokens = config.CHUNK_MAX_TOKENS
+    if overlap_tokens is None:
+        overlap_tokens = config.CHUNK_OVERLAP_TOKENS
+
+    chunks = []
+    for page_num, text in zip(page_numbers, pages):
+        chunks.extend(chunk_page(page_num, text, max_tokens, overlap_tokens))
+    return chunks
+
+
+print("Fragmentador de páginas cargado")
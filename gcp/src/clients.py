@@ -0,0 +1,68 @@
+"""
+Módulo que provee los clientes de Google Cloud del proceso.
+Cada cliente se crea una sola vez, en su primer uso, y se comparte entre módulos
+y eventos, de modo que el descubrimiento de credenciales y las conexiones
+HTTP/gRPC no se repiten en cada llamada. Las bibliotecas también se importan
+en el primer uso, ya que su importación domina el arranque en frío.
+"""
+
+import threading
+from typing import TYPE_CHECKING, Optional
+
+import config
+
+if TYPE_CHECKING:
+    from google.cloud import documentai
+    from google.cloud import storage
+
+_storage_client: Optional["storage.Client"] = None
+_documentai_client: Optional["documentai.DocumentProcessorServiceClient"] = None
+_clients_lock = threading.Lock()
+
+
+def get_storage_client() -> "storage.Client":
+    """
+    Obtiene el cliente de Cloud Storage del proceso, creándolo en el primer uso.
+    El pool de conexiones HTTP se dimensiona para las descargas en paralelo.
+
+    Returns:
+        Cliente de Cloud Storage
+    """
+    global _storage_client
+    if _storage_client is None:
+        with _clients_lock:
+            if _storage_client is None:
+                from google.cloud import storage
+                from requests.adapters import HTTPAdapter
+
+                client = storage.Client()
+                adapter = HTTPAdapter(
+                    pool_connections=config.STORAGE_HTTP_POOL_SIZE,
+                    pool_maxsize=config.STORAGE_HTTP_POOL_SIZE,
+                )
+                client._http.mount("https://", adapter)
+                _storage_client = client
+    return _storage_client
+
+
+def get_documentai_client() -> "documentai.DocumentProcessorServiceClient":
+    """
+    Obtiene el cliente de Document AI del proceso, creándolo en el primer uso.
+    El canal gRPC del cliente se reutiliza en todas las solicitudes.
+
+    Returns:
+        Cliente de Document AI
+    """
+    global _documentai_client
+    if _documentai_client is None:
+        with _clients_lock:
+            if _documentai_client is None:
+                from google.cloud import documentai
+
+                _documentai_client = documentai.DocumentProcessorServiceClient(
+                    client_options=config.get_docai_client_options()
+                )
+    return _documentai_client
+
+
+print("Proveedor de clientes de Google Cloud cargado")
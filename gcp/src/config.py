@@ -1,16 +1,23 @@
 import os
 import logging
+import random
+import threading
 import time
 from google.api_core.client_options import ClientOptions
-from google.cloud import aiplatform
-import vertexai
-from redis import Redis
-from redis.exceptions import ConnectionError, TimeoutError
+from redis import BlockingConnectionPool, Redis
+from redis.backoff import EqualJitterBackoff
+from redis.connection import Connection, parse_url
+from redis.exceptions import ConnectionError, RedisError, TimeoutError
+from redis.retry import Retry
 
 # Ubicaciones
 VERTEXAI_LOCATION = os.environ.get("VERTEXAI_LOCATION", "us-central1")
 DOCAI_LOCATION = os.environ.get("DOCAI_LOCATION", "us")
 
+# Backend de búsqueda vectorial: "redis" (por defecto) o "vertex". Vertex AI
+# solo se importa e inicializa si está configurado
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "redis").lower()
+
 # IDs y nombres de recursos
 OUTPUT_BUCKET = os.environ.get("OUTPUT_BUCKET")
 INDEX_ID = os.environ.get("INDEX_ID")
@@ -19,12 +26,132 @@ DOCAI_PROCESSOR = os.environ.get("DOCAI_PROCESSOR")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 # Modelo de OpenAI a utilizar
 OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4.1")
+# Cliente asíncrono compartido con limitación de tasa y reintentos
+OPENAI_ASYNC = os.environ.get("OPENAI_ASYNC", "false").lower() == "true"
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "8"))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "5"))
+OPENAI_RETRY_BASE_SECONDS = float(os.environ.get("OPENAI_RETRY_BASE_SECONDS", "1"))
+OPENAI_RETRY_MAX_SECONDS = float(os.environ.get("OPENAI_RETRY_MAX_SECONDS", "60"))
+
+# Modo de extracción de tópicos y preguntas: "combined" (una sola llamada con
+# salida estructurada) o "separate" (una llamada para tópicos y otra para preguntas)
+LLM_EXTRACTION_MODE = os.environ.get("LLM_EXTRACTION_MODE", "combined")
+
+# Documentos que superan este número de tokens estimados se analizan por
+# fragmentos (map) cuyos resultados se consolidan en una llamada final (reduce)
+LLM_CHUNK_MAX_TOKENS = int(os.environ.get("LLM_CHUNK_MAX_TOKENS", "60000"))
+LLM_MAP_MAX_CONCURRENCY = int(os.environ.get("LLM_MAP_MAX_CONCURRENCY", "4"))
+
+# Configuración de embeddings
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = int(os.environ.get("EMBEDDING_DIMENSIONS", "1536"))
+# Límites por solicitud de embeddings (OpenAI admite hasta 2048 entradas
+# y 300.000 tokens por solicitud; se dejan márgenes por la estimación de tokens)
+EMBEDDING_BATCH_MAX_INPUTS = int(os.environ.get("EMBEDDING_BATCH_MAX_INPUTS", "256"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.environ.get("EMBEDDING_BATCH_MAX_TOKENS", "250000"))
+# Máximo de tokens estimados por entrada de embeddings; los textos más largos se
+# recortan (text-embedding-3 admite 8191 tokens; se deja margen por la estimación)
+EMBEDDING_INPUT_MAX_TOKENS = int(os.environ.get("EMBEDDING_INPUT_MAX_TOKENS", "6000"))
+# Número máximo de lotes de embeddings en vuelo simultáneamente
+EMBEDDING_MAX_CONCURRENCY = int(os.environ.get("EMBEDDING_MAX_CONCURRENCY", "4"))
+# Caché de embeddings en Redis (TTL renovado en cada acierto)
+EMBEDDING_CACHE_ENABLED = os.environ.get("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_TTL_SECONDS = int(os.environ.get("EMBEDDING_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# Extracción local de texto (texto plano, HTML, DOCX y PDF con capa de texto)
+LOCAL_EXTRACTION_ENABLED = os.environ.get("LOCAL_EXTRACTION_ENABLED", "true").lower() == "true"
+LOCAL_EXTRACTION_MIN_CHARS_PER_PAGE = int(os.environ.get("LOCAL_EXTRACTION_MIN_CHARS_PER_PAGE", "100"))
+LOCAL_EXTRACTION_MIN_READABLE_RATIO = float(os.environ.get("LOCAL_EXTRACTION_MIN_READABLE_RATIO", "0.9"))
+# Caracteres máximos por página en los formatos sin paginación propia
+LOCAL_PAGE_MAX_CHARS = int(os.environ.get("LOCAL_PAGE_MAX_CHARS", "3000"))
+# Tamaño máximo (bytes) de un archivo que se descarga para extraerlo localmente;
+# los mayores (p. ej. PDF escaneados grandes) se envían directamente a Document AI
+LOCAL_EXTRACTION_MAX_BYTES = int(os.environ.get("LOCAL_EXTRACTION_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Procesamiento en línea (síncrono) de Document AI para documentos pequeños
+ONLINE_PROCESSING_ENABLED = os.environ.get("ONLINE_PROCESSING_ENABLED", "true").lower() == "true"
+ONLINE_PROCESSING_MAX_BYTES = int(os.environ.get("ONLINE_PROCESSING_MAX_BYTES", str(10 * 1024 * 1024)))
+ONLINE_PROCESSING_MAX_PAGES = int(os.environ.get("ONLINE_PROCESSING_MAX_PAGES", "15"))
+
+# Caché de resultados de OCR en Redis, direccionada por el hash del contenido
+OCR_CACHE_ENABLED = os.environ.get("OCR_CACHE_ENABLED", "true").lower() == "true"
+OCR_CACHE_TTL_SECONDS = int(os.environ.get("OCR_CACHE_TTL_SECONDS", str(90 * 24 * 3600)))
+# Eliminar los shards de salida de Document AI (prefijo ocr/) tras leerlos
+OCR_OUTPUT_CLEANUP = os.environ.get("OCR_OUTPUT_CLEANUP", "true").lower() == "true"
+# Días tras los que la regla de ciclo de vida elimina los objetos del prefijo ocr/
+OCR_OUTPUT_RETENTION_DAYS = int(os.environ.get("OCR_OUTPUT_RETENTION_DAYS", "7"))
+
+# Conexiones HTTP del cliente compartido de Cloud Storage (descargas en paralelo)
+STORAGE_HTTP_POOL_SIZE = int(os.environ.get("STORAGE_HTTP_POOL_SIZE", "16"))
+
+# Fragmentos (shards) de salida de Document AI descargados e interpretados en paralelo
+OCR_SHARD_MAX_CONCURRENCY = int(os.environ.get("OCR_SHARD_MAX_CONCURRENCY", "4"))
+
+# Fragmentación de páginas para el índice vectorial (tokens estimados)
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", "512"))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", "64"))
+
+# Procesamiento en streaming: las páginas se indexan a medida que Document AI
+# las entrega, sin mantener el documento completo en memoria
+STREAMING_PIPELINE = os.environ.get("STREAMING_PIPELINE", "false").lower() == "true"
+# Fragmentos por lote de embeddings e indexación en modo streaming
+STREAM_BATCH_CHUNKS = int(os.environ.get("STREAM_BATCH_CHUNKS", "64"))
+# Páginas acumuladas antes de escribirlas en el hash pages:{filename}
+STREAM_PAGE_BUFFER = int(os.environ.get("STREAM_PAGE_BUFFER", "32"))
+
+# Número máximo de etapas independientes del pipeline (análisis con LLM y
+# embeddings) ejecutadas en paralelo; con 1 se ejecutan en secuencia
+PIPELINE_MAX_CONCURRENCY = int(os.environ.get("PIPELINE_MAX_CONCURRENCY", "2"))
+
+# Eventos procesados en paralelo por una instancia; los que superan el límite
+# esperan. Debe acompañar a la concurrencia configurada en el despliegue
+EVENT_MAX_CONCURRENCY = int(os.environ.get("EVENT_MAX_CONCURRENCY", "4"))
+
+# Lease en Redis que impide que dos instancias procesen el mismo archivo a la vez:
+# duración (se renueva mientras se procesa) y espera máxima para tomarlo
+DOCUMENT_LOCK_TTL_SECONDS = float(os.environ.get("DOCUMENT_LOCK_TTL_SECONDS", "60"))
+DOCUMENT_LOCK_WAIT_SECONDS = float(os.environ.get("DOCUMENT_LOCK_WAIT_SECONDS", "300"))
+
+# Tiempo que se recuerdan los eventos procesados para descartar reentregas (7 días)
+EVENT_LEDGER_TTL_SECONDS = int(os.environ.get("EVENT_LEDGER_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Reindexar solo las páginas modificadas al actualizar un documento
+INCREMENTAL_REINDEX = os.environ.get("INCREMENTAL_REINDEX", "true").lower() == "true"
+
+# Compresión del texto de páginas guardado en Redis (opcional)
+COMPRESSION_ENABLED = os.environ.get("COMPRESSION_ENABLED", "false").lower() == "true"
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "512"))
+COMPRESSION_LEVEL = int(os.environ.get("COMPRESSION_LEVEL", "6"))
 
 # Configuración de Redis
 REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
 REDIS_CLIENT = None
-MAX_RETRY_ATTEMPTS = 3
-RETRY_DELAY_SECONDS = 1
+# Conexiones máximas del pool compartido por todos los hilos del proceso
+REDIS_POOL_MAX_CONNECTIONS = int(os.environ.get("REDIS_POOL_MAX_CONNECTIONS", "32"))
+# Segundos que un hilo espera una conexión libre cuando el pool está lleno
+REDIS_POOL_TIMEOUT_SECONDS = float(os.environ.get("REDIS_POOL_TIMEOUT_SECONDS", "10"))
+# Segundos de inactividad tras los que se verifica una conexión antes de usarla
+REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+# Timeouts de conexión y de lectura/escritura de los sockets
+REDIS_SOCKET_CONNECT_TIMEOUT = float(os.environ.get("REDIS_SOCKET_CONNECT_TIMEOUT", "5"))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", "30"))
+# Reintentos de un comando ante errores de conexión. Los timeouts de lectura no se
+# reintentan: el comando pudo ejecutarse y repetirlo no es seguro si no es idempotente
+REDIS_COMMAND_RETRIES = int(os.environ.get("REDIS_COMMAND_RETRIES", "3"))
+# Espera base y máxima (segundos) del backoff exponencial con jitter
+REDIS_RETRY_BASE_DELAY = float(os.environ.get("REDIS_RETRY_BASE_DELAY", "0.1"))
+REDIS_RETRY_MAX_DELAY = float(os.environ.get("REDIS_RETRY_MAX_DELAY", "2"))
+# Intentos de conexión por inicialización
+MAX_RETRY_ATTEMPTS = int(os.environ.get("REDIS_CONNECT_ATTEMPTS", "3"))
+# Fallos consecutivos de conexión o de comandos (errores de conexión y timeouts)
+# que abren el circuit breaker, y segundos que permanece abierto antes de
+# permitir un nuevo intento. Mientras está abierto, los comandos fallan de inmediato
+REDIS_CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("REDIS_CIRCUIT_FAILURE_THRESHOLD", "5"))
+REDIS_CIRCUIT_RESET_SECONDS = float(os.environ.get("REDIS_CIRCUIT_RESET_SECONDS", "30"))
+
+# Estado de la conexión, protegido por _redis_lock
+_redis_lock = threading.Lock()
+_vertex_initialized = False
 
 # Muestra en consola las variables de entorno
 logging.info(f"REDIS_URL: {REDIS_URL}")
@@ -32,65 +159,256 @@ logging.info(f"OUTPUT_BUCKET: {OUTPUT_BUCKET}")
 logging.info(f"INDEX_ID: {INDEX_ID}")
 logging.info(f"DOCAI_PROCESSOR: {DOCAI_PROCESSOR}")
 logging.info(f"VERTEXAI_LOCATION: {VERTEXAI_LOCATION}")
+logging.info(f"VECTOR_BACKEND: {VECTOR_BACKEND}")
+
+
+class CircuitOpenError(RedisError):
+    """Redis no está disponible y el circuit breaker rechaza el comando sin intentarlo."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de Redis compartido por todas las conexiones del proceso.
+    Tras `failure_threshold` fallos consecutivos se abre durante `reset_seconds`;
+    después deja pasar las operaciones: el primer éxito lo cierra y un nuevo
+    fallo lo vuelve a abrir.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def check(self) -> None:
+        """
+        Comprueba que el circuito permita operar.
+
+        Raises:
+            CircuitOpenError: Si el circuito está abierto
+        """
+        remaining = self._open_until - time.monotonic()
+        if remaining > 0:
+            raise CircuitOpenError(
+                f"Circuit breaker de Redis abierto: se rechazan operaciones durante {remaining:.1f} s"
+            )
+
+    def record_success(self) -> None:
+        """Registra una operación exitosa y cierra el circuito."""
+        if self._failures:
+            with self._lock:
+                self._failures = 0
+                self._open_until = 0.0
+
+    def record_failure(self) -> None:
+        """Registra un fallo de conexión o timeout y abre el circuito al alcanzar el umbral."""
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._open_until = time.monotonic() + self.reset_seconds
+                logging.error(
+                    f"Circuit breaker de Redis abierto tras {self._failures} fallos "
+                    f"consecutivos, durante {self.reset_seconds} s"
+                )
+                # Tras la espera, un único fallo vuelve a abrir el circuito
+                self._failures = self.failure_threshold - 1
+
+
+REDIS_CIRCUIT_BREAKER = CircuitBreaker(
+    REDIS_CIRCUIT_FAILURE_THRESHOLD, REDIS_CIRCUIT_RESET_SECONDS
+)
+
+
+class _CircuitBreakerConnectionMixin:
+    """
+    Conexión de Redis que consulta el circuit breaker antes de conectar o enviar un
+    comando, y le informa de los errores de conexión y timeouts. Cubre comandos,
+    pipelines y health checks, ya que todos pasan por la conexión.
+    """
+
+    def _guard(self, operation, *args, **kwargs):
+        REDIS_CIRCUIT_BREAKER.check()
+        try:
+            result = operation(*args, **kwargs)
+        except (ConnectionError, TimeoutError):
+            REDIS_CIRCUIT_BREAKER.record_failure()
+            raise
+        REDIS_CIRCUIT_BREAKER.record_success()
+        return result
+
+    def connect(self):
+        return self._guard(super().connect)
+
+    def send_packed_command(self, *args, **kwargs):
+        return self._guard(super().send_packed_command, *args, **kwargs)
+
+    def read_response(self, *args, **kwargs):
+        return self._guard(super().read_response, *args, **kwargs)
+
+
+def _get_connection_class(url: str):
+    """
+    Obtiene la clase de conexión para la URL de Redis (TCP, TLS o socket Unix)
+    con el circuit breaker incorporado.
+
+    Args:
+        url: URL de Redis
+
+    Returns:
+        Clase de conexión
+    """
+    base_class = parse_url(url).get("connection_class", Connection)
+    return type(
+        f"CircuitBreaker{base_class.__name__}",
+        (_CircuitBreakerConnectionMixin, base_class),
+        {},
+    )
 
 
 # Inicialización de servicios
 def initialize_services():
-    """Inicializa los servicios de Vertex AI y Redis."""
-    global REDIS_CLIENT
-    
-    # Inicializar Vertex AI
+    """
+    Inicializa Redis y, si VECTOR_BACKEND es "vertex", Vertex AI.
+
+    La conexión usa un pool compartido con health checks y keepalive. Si no se
+    puede conectar, se reintenta con backoff exponencial con jitter. Todas las
+    conexiones pasan por el circuit breaker: mientras está abierto, la
+    inicialización y los comandos fallan de inmediato con CircuitOpenError.
+    """
+    global REDIS_CLIENT, _vertex_initialized
+
+    with _redis_lock:
+        if VECTOR_BACKEND == "vertex" and not _vertex_initialized:
+            initialize_vertex()
+            _vertex_initialized = True
+
+        if REDIS_CLIENT is not None:
+            return
+
+        for attempt in range(MAX_RETRY_ATTEMPTS):
+            pool = None
+            try:
+                logging.info(f"Intentando conectar a Redis en {REDIS_URL} (intento {attempt + 1})")
+                pool = _create_redis_pool()
+                client = Redis(connection_pool=pool)
+                client.ping()
+            except CircuitOpenError as e:
+                logging.error(str(e))
+                if pool is not None:
+                    pool.disconnect()
+                return
+            except Exception as e:
+                logging.warning(f"Error al conectar a Redis: {e}")
+                if pool is not None:
+                    pool.disconnect()
+                if attempt + 1 < MAX_RETRY_ATTEMPTS:
+                    delay = _get_reconnect_delay(attempt)
+                    logging.info(f"Reintentando en {delay:.2f} segundos...")
+                    time.sleep(delay)
+                continue
+
+            REDIS_CLIENT = client
+            logging.info(f"Servicios inicializados - Backend {VECTOR_BACKEND}, Redis en {REDIS_URL}")
+            return
+
+        logging.error(f"No se pudo establecer conexión con Redis después de {MAX_RETRY_ATTEMPTS} intentos")
+
+
+def get_redis_client() -> Redis:
+    """
+    Obtiene el cliente Redis compartido por todos los módulos e hilos del proceso.
+    Si no está inicializado, lo inicializa.
+
+    Returns:
+        Cliente Redis
+    """
+    # Leer la global una sola vez: otro hilo puede cerrarla entre la comprobación y el uso
+    client = REDIS_CLIENT
+    if client is None:
+        initialize_services()
+        client = REDIS_CLIENT
+        if client is None:
+            # Si sigue siendo None, lanzamos un error más explicativo
+            raise RuntimeError(
+                "No se pudo inicializar el cliente Redis. Verifique la configuración y conexión."
+            )
+    return client
+
+
+def _create_redis_pool() -> BlockingConnectionPool:
+    """
+    Crea el pool de conexiones de Redis. Cuando se alcanza REDIS_POOL_MAX_CONNECTIONS,
+    los hilos esperan una conexión libre hasta REDIS_POOL_TIMEOUT_SECONDS. Los
+    comandos que fallan por un error de conexión se reintentan con backoff con
+    jitter; los timeouts de lectura no, porque el comando pudo ejecutarse.
+
+    Returns:
+        Pool de conexiones bloqueante
+    """
+    return BlockingConnectionPool.from_url(
+        REDIS_URL,
+        connection_class=_get_connection_class(REDIS_URL),
+        max_connections=REDIS_POOL_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT_SECONDS,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        socket_keepalive=True,
+        socket_connect_timeout=REDIS_SOCKET_CONNECT_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        retry=Retry(
+            EqualJitterBackoff(cap=REDIS_RETRY_MAX_DELAY, base=REDIS_RETRY_BASE_DELAY),
+            REDIS_COMMAND_RETRIES,
+            supported_errors=(ConnectionError,),
+        ),
+        retry_on_error=[ConnectionError],
+    )
+
+
+def _get_reconnect_delay(attempt: int) -> float:
+    """
+    Calcula la espera antes de reintentar la conexión: backoff exponencial con
+    jitter completo, para que las instancias no reconecten todas a la vez.
+
+    Args:
+        attempt: Número de intento fallido, empezando en 0
+
+    Returns:
+        Segundos de espera
+    """
+    return random.uniform(0, min(REDIS_RETRY_MAX_DELAY, REDIS_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def initialize_vertex():
+    """
+    Inicializa Vertex AI. Las bibliotecas se importan aquí, y no al cargar el
+    módulo, porque su importación es costosa y el backend por defecto es Redis.
+    """
+    import vertexai
+    from google.cloud import aiplatform
+
     vertexai.init(location=VERTEXAI_LOCATION)
     aiplatform.init(location=VERTEXAI_LOCATION)
-    
-    # Inicializar cliente Redis con reintentos
-    retry_count = 0
-    while REDIS_CLIENT is None and retry_count < MAX_RETRY_ATTEMPTS:
-        try:
-            logging.info(f"Intentando conectar a Redis en {REDIS_URL} (intento {retry_count + 1})")
-            REDIS_CLIENT = Redis.from_url(REDIS_URL, socket_connect_timeout=5)
-            
-            # Verificar la conexión con un ping
-            if REDIS_CLIENT.ping():
-                logging.info(f"Conexión a Redis establecida exitosamente")
-            else:
-                logging.warning("No se recibió respuesta al ping de Redis")
-                REDIS_CLIENT = None
-                retry_count += 1
-                
-        except (ConnectionError, TimeoutError) as e:
-            logging.warning(f"Error al conectar a Redis: {e}")
-            REDIS_CLIENT = None
-            retry_count += 1
-            
-        except Exception as e:
-            logging.error(f"Error inesperado al inicializar Redis: {e}")
-            REDIS_CLIENT = None
-            retry_count += 1
-            
-        if REDIS_CLIENT is None and retry_count < MAX_RETRY_ATTEMPTS:
-            logging.info(f"Reintentando en {RETRY_DELAY_SECONDS} segundos...")
-            time.sleep(RETRY_DELAY_SECONDS)
-    
-    if REDIS_CLIENT is None:
-        logging.error(f"No se pudo establecer conexión con Redis después de {MAX_RETRY_ATTEMPTS} intentos")
-    else:
-        logging.info(f"Servicios inicializados - Vertex AI en {VERTEXAI_LOCATION}, Redis en {REDIS_URL}")
+    logging.info(f"Vertex AI inicializado en {VERTEXAI_LOCATION}")
 
 
 def close_services():
-    """Cierra las conexiones de servicios para liberar recursos."""
+    """
+    Cierra las conexiones de servicios para liberar recursos. Se llama al terminar
+    el proceso; los errores de un evento no cierran el pool, que recupera por sí
+    solo las conexiones caídas.
+    """
     global REDIS_CLIENT
-    
-    # Cerrar cliente Redis
-    if REDIS_CLIENT is not None:
-        try:
-            REDIS_CLIENT.close()
-            logging.info("Conexión Redis cerrada correctamente")
-        except Exception as e:
-            logging.error(f"Error al cerrar la conexión Redis: {e}")
-        finally:
-            REDIS_CLIENT = None
+
+    # Cerrar cliente Redis y las conexiones de su pool
+    with _redis_lock:
+        if REDIS_CLIENT is not None:
+            try:
+                REDIS_CLIENT.connection_pool.disconnect()
+                logging.info("Conexión Redis cerrada correctamente")
+            except Exception as e:
+                logging.error(f"Error al cerrar la conexión Redis: {e}")
+            finally:
+                REDIS_CLIENT = None
 
 
 # Opciones de cliente para Document AI
@@ -4,17 +4,38 @@ Contiene funciones para extraer texto, tópicos, preguntas e indexar contenido.
 """
 
 import logging
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import (
+    CancelledError,
+    FIRST_COMPLETED,
+    FIRST_EXCEPTION,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple
 
 # Importar módulos del proyecto
 import config
 from document_processor import get_document_text
-from ai_service import extract_topics, generate_questions, create_embeddings
-from database_service import (
-    get_document,
-    save_document_metadata,
-    save_topics_and_questions,
+from ai_service import (
+    analyze_document,
+    analyze_text,
+    extract_document_topics,
+    extract_topics,
+    generate_document_questions,
+    generate_questions,
+    create_embeddings,
+    reduce_analysis,
+    reduce_questions,
+    reduce_topics,
+    split_into_chunks,
 )
-from vector_search import index_pages
+from chunker import Chunk, chunk_page, chunk_pages
+from token_estimator import estimate_tokens
+from database_service import DocumentWriteSession, StoredPages
+from vector_search import get_chunk_key, index_chunks, get_indexed_pages, remove_pages
 
 
 def process_document_content(
@@ -22,80 +43,513 @@ def process_document_content(
     input_bucket: str,
     filename: str,
     mime_type: str,
-    redis_client,
+    session: DocumentWriteSession,
+    previous_pages: Optional[Sequence[str]] = None,
+    file_size: Optional[int] = None,
+    content_hash: Optional[str] = None,
 ) -> None:
     """
     Procesa el contenido de un documento: extrae texto, tópicos, preguntas e indexa.
     Esta función es común para creación y actualización.
+    La extracción de tópicos y preguntas y la generación de embeddings se ejecutan
+    en paralelo, ya que no dependen entre sí.
 
     Args:
         event_id: ID del evento
         input_bucket: Nombre del bucket
         filename: Nombre del archivo
         mime_type: Tipo MIME del archivo
-        redis_client: Cliente Redis
+        session: Sesión de escritura del documento; los cambios se guardan en un único flush
+        previous_pages: Textos de las páginas de la versión anterior del documento.
+            Si se indican, solo se reindexan las páginas que cambiaron.
+        file_size: Tamaño del archivo en bytes, para elegir la vía de OCR
+        content_hash: Hash del contenido del archivo, para la caché de OCR
     """
+    if config.STREAMING_PIPELINE:
+        process_document_content_streaming(
+            event_id,
+            input_bucket,
+            filename,
+            mime_type,
+            session,
+            previous_pages,
+            file_size,
+            content_hash,
+        )
+        return
+
     # Extraer texto del documento
     input_gcs_uri = f"gs://{input_bucket}/{filename}"
     logging.info(f"📄 {event_id}: Extrayendo texto del documento")
+    processing_info: Dict[str, Any] = {}
     pages = list(
         get_document_text(
-            input_gcs_uri, mime_type, config.DOCAI_PROCESSOR, config.OUTPUT_BUCKET
+            input_gcs_uri,
+            mime_type,
+            config.DOCAI_PROCESSOR,
+            config.OUTPUT_BUCKET,
+            file_size=file_size,
+            page_count_hint=len(previous_pages) if previous_pages is not None else None,
+            processing_info=processing_info,
+            content_hash=content_hash,
         )
     )
+    logging.info(f"📄 {event_id}: Texto extraído por la vía {processing_info.get('ocr_path')}")
 
-    # Actualizar documento con páginas extraídas
-    doc_data = get_document(redis_client, filename)
-    if doc_data is None:
-        logging.warning(
-            f"⚠️ {event_id}: No se encontró el documento que acabamos de crear/actualizar"
+    # Actualizar documento con páginas extraídas y la vía de OCR usada
+    session.set_pages(pages)
+    session.update(processing_info)
+
+    # Dividir las páginas en fragmentos para el índice vectorial
+    chunks = chunk_pages(pages)
+    logging.info(f"✂️ {event_id}: {len(pages)} páginas divididas en {len(chunks)} fragmentos")
+
+    # Determinar qué páginas se deben indexar
+    if previous_pages is None:
+        pages_to_index = list(range(len(pages)))
+        stale_entries: Dict[str, int] = {}
+    else:
+        pages_to_index, stale_entries = plan_reindex(
+            event_id, filename, pages, previous_pages, chunks
         )
-        doc_data = {
-            "event_id": event_id,
-            "filename": filename,
-        }
+    page_set = set(pages_to_index)
+    chunks_to_index = [chunk for chunk in chunks if chunk.page in page_set]
 
-    doc_data["pages"] = pages
-    doc_data["page_count"] = len(pages)
+    def analyze_content(cancel_event: threading.Event) -> Tuple[List[str], List[str]]:
+        if config.LLM_EXTRACTION_MODE == "combined":
+            # Extraer tópicos y preguntas en una sola llamada
+            logging.info(f"🤖 {event_id}: Extrayendo tópicos y preguntas con OpenAI")
+            topics, questions = analyze_document(pages)
+            logging.info(f"📋 {event_id}: Tópicos extraídos: {topics}")
+            logging.info(f"❓ {event_id}: Preguntas generadas: {questions}")
+            return topics, questions
 
-    save_document_metadata(
-        redis_client=redis_client, filename=filename, metadata=doc_data
-    )
+        # Extraer tópicos
+        logging.info(f"🤖 {event_id}: Extrayendo tópicos con OpenAI")
+        topics = extract_document_topics(pages)
+        logging.info(f"📋 {event_id}: Tópicos extraídos: {topics}")
 
-    # Concatenar todas las páginas para procesamiento con OpenAI
-    full_text = "\n\n".join(pages)
+        if cancel_event.is_set():
+            raise CancelledError("Generación de preguntas cancelada")
 
-    # Extraer tópicos
-    logging.info(f"🤖 {event_id}: Extrayendo tópicos con OpenAI")
-    topics = extract_topics(full_text)
-    logging.info(f"📋 {event_id}: Tópicos extraídos: {topics}")
+        # Generar preguntas
+        logging.info(f"🤖 {event_id}: Generando preguntas con OpenAI")
+        questions = generate_document_questions(pages, topics)
+        logging.info(f"❓ {event_id}: Preguntas generadas: {questions}")
+        return topics, questions
 
-    # Generar preguntas
-    logging.info(f"🤖 {event_id}: Generando preguntas con OpenAI")
-    questions = generate_questions(full_text, topics)
-    logging.info(f"❓ {event_id}: Preguntas generadas: {questions}")
+    def embed_chunks(cancel_event: threading.Event) -> List[Any]:
+        logging.info(
+            f"🔢 {event_id}: Generando embeddings de {len(chunks_to_index)} fragmentos "
+            f"de {len(pages_to_index)} páginas"
+        )
+        return create_embeddings([chunk.text for chunk in chunks_to_index], cancel_event)
 
-    # Guardar tópicos y preguntas
-    refs = save_topics_and_questions(
-        redis_client=redis_client, filename=filename, topics=topics, questions=questions
+    results = run_concurrent_stages(
+        {"analysis": analyze_content, "embeddings": embed_chunks},
+        config.PIPELINE_MAX_CONCURRENCY,
     )
+    topics, questions = results["analysis"]
+
+    # Guardar páginas, tópicos, preguntas y referencias en una sola escritura
+    session.set_topics_and_questions(topics, questions)
+    session.flush()
 
-    # Actualizar documento con referencias
-    doc_data = get_document(redis_client, filename)
-    if doc_data is None:
-        logging.warning(
-            f"⚠️ {event_id}: No se encontró el documento después de guardar tópicos y preguntas"
+    # Indexar fragmentos y eliminar las entradas que quedaron obsoletas
+    logging.info(f"📖 {event_id}: Indexando fragmentos en Vector Search")
+    new_keys = set(
+        index_chunks(config.INDEX_ID, filename, chunks_to_index, results["embeddings"])
+    )
+    # Se excluyen las entradas que acaban de sobrescribirse con la misma clave
+    stale_entries = {
+        key: page for key, page in stale_entries.items() if key not in new_keys
+    }
+    if stale_entries:
+        remove_pages(
+            config.INDEX_ID,
+            filename,
+            sorted(set(stale_entries.values())),
+            indexed_pages=stale_entries,
         )
-        doc_data = refs
-    else:
-        doc_data.update(refs)
+    logging.info(f"✅ {event_id}: Documento procesado exitosamente")
+
+
+def run_concurrent_stages(
+    stages: Dict[str, Callable[[threading.Event], Any]], max_concurrency: int
+) -> Dict[str, Any]:
+    """
+    Ejecuta etapas independientes del pipeline en paralelo.
+    Si una etapa falla, se activa el evento de cancelación para que las demás se
+    detengan en su siguiente punto de control y se propaga la excepción.
+
+    Args:
+        stages: Diccionario {nombre: función}; cada función recibe el evento de cancelación
+        max_concurrency: Número máximo de etapas simultáneas. Con 1, se ejecutan en secuencia
+
+    Returns:
+        Diccionario {nombre: resultado de la etapa}
+    """
+    cancel_event = threading.Event()
+    if max_concurrency <= 1:
+        return {name: stage(cancel_event) for name, stage in stages.items()}
+
+    executor = ThreadPoolExecutor(max_workers=min(max_concurrency, len(stages)))
+    futures = {
+        executor.submit(stage, cancel_event): name for name, stage in stages.items()
+    }
+    try:
+        done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in done:
+            if future.exception() is not None:
+                logging.error(
+                    f"Etapa {futures[future]} fallida, cancelando las restantes"
+                )
+                raise future.exception()
+        return {name: future.result() for future, name in futures.items()}
+    finally:
+        cancel_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def plan_reindex(
+    event_id: str,
+    filename: str,
+    pages: List[str],
+    previous_pages: Sequence[str],
+    chunks: List[Chunk],
+) -> Tuple[List[int], Dict[str, int]]:
+    """
+    Determina qué páginas deben reindexarse respecto a la versión anterior.
+
+    Args:
+        event_id: ID del evento
+        filename: Nombre del archivo
+        pages: Textos de las páginas de la nueva versión
+        previous_pages: Textos de las páginas de la versión anterior
+        chunks: Fragmentos de las páginas de la nueva versión
+
+    Returns:
+        Tupla con los números de página a indexar y las entradas actuales del
+        índice ({clave: página}) de las páginas reindexadas o eliminadas
+    """
+    indexed_pages = get_indexed_pages(config.INDEX_ID, filename)
+    indexed_keys = _group_keys_by_page(indexed_pages)
+    page_chunks: Dict[int, List[Chunk]] = defaultdict(list)
+    for chunk in chunks:
+        page_chunks[chunk.page].append(chunk)
+
+    pages_to_index = [
+        page_num
+        for page_num, page_text in enumerate(pages)
+        if _page_needs_reindex(
+            filename,
+            page_num,
+            page_text,
+            page_chunks[page_num],
+            previous_pages[page_num] if page_num < len(previous_pages) else None,
+            indexed_keys,
+        )
+    ]
+    removed_pages = [page_num for page_num in indexed_keys if page_num >= len(pages)]
 
-    save_document_metadata(
-        redis_client=redis_client, filename=filename, metadata=doc_data
+    logging.info(
+        f"📖 {event_id}: Reindexando {len(pages_to_index)} de {len(pages)} páginas, "
+        f"{len(removed_pages)} páginas eliminadas"
     )
 
-    # Crear embeddings e indexar páginas
-    logging.info(f"📖 {event_id}: Indexando páginas en Vector Search")
-    embeddings = create_embeddings(pages)
-    index_pages(config.INDEX_ID, filename, pages, embeddings)
+    stale_pages = set(pages_to_index) | set(removed_pages)
+    stale_entries = {
+        key: page for key, page in indexed_pages.items() if page in stale_pages
+    }
+    return pages_to_index, stale_entries
+
+
+def _group_keys_by_page(indexed_pages: Dict[str, int]) -> Dict[int, Set[str]]:
+    """
+    Agrupa las claves del índice de un documento por número de página.
+
+    Args:
+        indexed_pages: Resultado de get_indexed_pages ({clave: página})
+
+    Returns:
+        Diccionario {página: conjunto de claves}
+    """
+    indexed_keys: Dict[int, Set[str]] = defaultdict(set)
+    for key, page_num in indexed_pages.items():
+        indexed_keys[page_num].add(key)
+    return indexed_keys
+
+
+def _page_needs_reindex(
+    filename: str,
+    page_num: int,
+    page_text: str,
+    chunks: List[Chunk],
+    previous_text: Optional[str],
+    indexed_keys: Dict[int, Set[str]],
+) -> bool:
+    """
+    Indica si una página debe reindexarse respecto a la versión anterior.
+    Se reindexan también las páginas sin cambios cuyas entradas en el índice no
+    coinciden con sus fragmentos (p. ej. por un procesamiento previo interrumpido,
+    entradas de página completa o un cambio en la configuración de fragmentación).
+
+    Args:
+        filename: Nombre del archivo
+        page_num: Número de página
+        page_text: Texto de la página en la nueva versión
+        chunks: Fragmentos de la página en la nueva versión
+        previous_text: Texto de la página en la versión anterior, o None si no existía
+        indexed_keys: Claves actuales del índice agrupadas por página
+
+    Returns:
+        True si la página debe reindexarse
+    """
+    if previous_text is None or page_text != previous_text:
+        return True
+    expected_keys = {get_chunk_key(filename, page_num, chunk.chunk) for chunk in chunks}
+    return indexed_keys.get(page_num, set()) != expected_keys
+
+
+class _LlmChunkBuffer:
+    """
+    Agrupa las páginas recibidas en orden en fragmentos de hasta
+    LLM_CHUNK_MAX_TOKENS tokens estimados, sin esperar al documento completo.
+    """
+
+    def __init__(self):
+        self.pages: List[str] = []
+        self.tokens = 0
+
+    def add(self, page_text: str) -> List[str]:
+        """
+        Añade una página al buffer.
+
+        Args:
+            page_text: Texto de la página
+
+        Returns:
+            Fragmentos completos, listos para analizar
+        """
+        self.pages.append(page_text)
+        self.tokens += estimate_tokens(page_text)
+        if self.tokens < config.LLM_CHUNK_MAX_TOKENS:
+            return []
+        chunks = split_into_chunks(self.pages, config.LLM_CHUNK_MAX_TOKENS)
+        self.pages = [chunks[-1]]
+        self.tokens = estimate_tokens(chunks[-1])
+        return chunks[:-1]
+
+    def finish(self) -> List[str]:
+        """
+        Vacía el buffer.
+
+        Returns:
+            Fragmentos con el texto restante, o una lista vacía si no hay texto
+        """
+        pages, self.pages, self.tokens = self.pages, [], 0
+        if not any(text.strip() for text in pages):
+            return []
+        return split_into_chunks(pages, config.LLM_CHUNK_MAX_TOKENS)
+
+
+def process_document_content_streaming(
+    event_id: str,
+    input_bucket: str,
+    filename: str,
+    mime_type: str,
+    session: DocumentWriteSession,
+    previous_pages: Optional[Sequence[str]] = None,
+    file_size: Optional[int] = None,
+    content_hash: Optional[str] = None,
+) -> None:
+    """
+    Variante en streaming de process_document_content (STREAMING_PIPELINE).
+    Las páginas se procesan a medida que Document AI las entrega: se guardan en el
+    hash pages:{filename} por bloques, sus fragmentos se envían en lotes a
+    embeddings e indexación, y el texto se agrupa en fragmentos de hasta
+    LLM_CHUNK_MAX_TOKENS que se analizan con OpenAI (map). Al terminar, los
+    candidatos se consolidan en una llamada final (reduce).
+
+    Con LLM_EXTRACTION_MODE=combined cada fragmento se analiza con la extracción
+    combinada. Con separate, durante la lectura se extraen los tópicos y, una vez
+    consolidados, las preguntas se generan en una segunda pasada sobre las
+    páginas ya guardadas, que se leen de Redis por bloques.
+
+    Los lotes en vuelo están acotados por EMBEDDING_MAX_CONCURRENCY y
+    LLM_MAP_MAX_CONCURRENCY: si se alcanzan, la lectura de páginas espera, por lo
+    que la memoria no crece con el tamaño del documento y las primeras páginas
+    son consultables antes de terminar de leer el resultado del OCR.
+
+    Args:
+        event_id: ID del evento
+        input_bucket: Nombre del bucket
+        filename: Nombre del archivo
+        mime_type: Tipo MIME del archivo
+        session: Sesión de escritura del documento
+        previous_pages: Textos de las páginas de la versión anterior del documento,
+            leídos en orden (p. ej. StoredPages). Si se indican, solo se reindexan
+            las páginas que cambiaron.
+        file_size: Tamaño del archivo en bytes, para elegir la vía de OCR
+        content_hash: Hash del contenido del archivo, para la caché de OCR
+    """
+    input_gcs_uri = f"gs://{input_bucket}/{filename}"
+    logging.info(f"📄 {event_id}: Extrayendo texto del documento en streaming")
+    processing_info: Dict[str, Any] = {}
+    combined = config.LLM_EXTRACTION_MODE == "combined"
+
+    indexed_keys: Dict[int, Set[str]] = {}
+    if previous_pages is not None:
+        indexed_keys = _group_keys_by_page(get_indexed_pages(config.INDEX_ID, filename))
+
+    cancel_event = threading.Event()
+    index_executor = ThreadPoolExecutor(max_workers=config.EMBEDDING_MAX_CONCURRENCY)
+    analysis_executor = ThreadPoolExecutor(max_workers=config.LLM_MAP_MAX_CONCURRENCY)
+    index_futures: Deque[Future] = deque()
+    analysis_futures: List[Future] = []
+    new_keys: Set[str] = set()
+    reindexed_pages: List[int] = []
+
+    page_buffer: Dict[int, str] = {}
+    chunk_buffer: List[Chunk] = []
+    llm_buffer = _LlmChunkBuffer()
+    page_count = 0
+
+    def embed_and_index(chunks: List[Chunk]) -> List[str]:
+        if cancel_event.is_set():
+            raise CancelledError("Lote de indexación cancelado")
+        embeddings = create_embeddings([chunk.text for chunk in chunks], cancel_event)
+        return index_chunks(config.INDEX_ID, filename, chunks, embeddings)
+
+    def submit_index_batch() -> None:
+        # Las páginas se guardan antes de indexar sus fragmentos, para que los
+        # resultados de búsqueda siempre encuentren el texto de la página
+        session.write_pages(page_buffer)
+        page_buffer.clear()
+        while len(index_futures) >= config.EMBEDDING_MAX_CONCURRENCY:
+            new_keys.update(index_futures.popleft().result())
+        index_futures.append(index_executor.submit(embed_and_index, list(chunk_buffer)))
+        chunk_buffer.clear()
+
+    def submit_analysis(function: Callable[..., Any], text: str, *args) -> None:
+        while True:
+            pending = [future for future in analysis_futures if not future.done()]
+            if len(pending) < config.LLM_MAP_MAX_CONCURRENCY:
+                break
+            wait(pending, return_when=FIRST_COMPLETED)
+        for future in analysis_futures:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+        analysis_futures.append(analysis_executor.submit(function, text, *args))
+
+    # Función de análisis de cada fragmento durante la lectura (map)
+    map_function = analyze_text if combined else extract_topics
+
+    try:
+        for page_num, page_text in enumerate(
+            get_document_text(
+                input_gcs_uri,
+                mime_type,
+                config.DOCAI_PROCESSOR,
+                config.OUTPUT_BUCKET,
+                file_size=file_size,
+                page_count_hint=len(previous_pages) if previous_pages is not None else None,
+                processing_info=processing_info,
+                content_hash=content_hash,
+            )
+        ):
+            # El texto anterior se lee antes de sobrescribir la página en Redis
+            previous_text = None
+            if previous_pages is not None and page_num < len(previous_pages):
+                previous_text = previous_pages[page_num]
+
+            page_count += 1
+            page_buffer[page_num] = page_text
+            if len(page_buffer) >= config.STREAM_PAGE_BUFFER:
+                session.write_pages(page_buffer)
+                page_buffer.clear()
+
+            # Análisis con LLM por fragmentos de hasta LLM_CHUNK_MAX_TOKENS
+            for text in llm_buffer.add(page_text):
+                submit_analysis(map_function, text)
+
+            # Fragmentos para el índice vectorial
+            chunks = chunk_page(
+                page_num, page_text, config.CHUNK_MAX_TOKENS, config.CHUNK_OVERLAP_TOKENS
+            )
+            if previous_pages is None or _page_needs_reindex(
+                filename, page_num, page_text, chunks, previous_text, indexed_keys
+            ):
+                reindexed_pages.append(page_num)
+                chunk_buffer.extend(chunks)
+                if len(chunk_buffer) >= config.STREAM_BATCH_CHUNKS:
+                    submit_index_batch()
+
+        # Enviar los restos de los buffers
+        if chunk_buffer:
+            submit_index_batch()
+        session.write_pages(page_buffer)
+        page_buffer.clear()
+        for text in llm_buffer.finish():
+            submit_analysis(map_function, text)
+
+        while index_futures:
+            new_keys.update(index_futures.popleft().result())
+        logging.info(
+            f"📖 {event_id}: {page_count} páginas leídas, {len(reindexed_pages)} "
+            f"indexadas en {len(new_keys)} fragmentos"
+        )
+
+        results = [future.result() for future in analysis_futures]
+        if combined:
+            logging.info(f"🤖 {event_id}: Consolidando tópicos y preguntas con OpenAI")
+            topics, questions = reduce_analysis(results) if results else ([], [])
+        else:
+            logging.info(f"🤖 {event_id}: Consolidando tópicos con OpenAI")
+            topics = reduce_topics(results) if results else []
+
+            # Las preguntas dependen de los tópicos consolidados, por lo que se
+            # generan en una segunda pasada sobre las páginas ya guardadas
+            logging.info(f"🤖 {event_id}: Generando preguntas con OpenAI")
+            analysis_futures.clear()
+            for page_text in StoredPages(session.redis_client, filename, page_count):
+                for text in llm_buffer.add(page_text):
+                    submit_analysis(generate_questions, text, topics)
+            for text in llm_buffer.finish():
+                submit_analysis(generate_questions, text, topics)
+            results = [future.result() for future in analysis_futures]
+            questions = reduce_questions(results, topics) if results else []
+        logging.info(f"📋 {event_id}: Tópicos extraídos: {topics}")
+        logging.info(f"❓ {event_id}: Preguntas generadas: {questions}")
+    except BaseException:
+        cancel_event.set()
+        raise
+    finally:
+        index_executor.shutdown(wait=False, cancel_futures=True)
+        analysis_executor.shutdown(wait=False, cancel_futures=True)
+
+    # Guardar número de páginas, vía de OCR, tópicos, preguntas y referencias
+    # en una sola escritura
+    session.set_page_count(page_count)
+    session.update(processing_info)
+    session.set_topics_and_questions(topics, questions)
+    session.flush()
+
+    # Eliminar las entradas de las páginas reindexadas o eliminadas que no se sobrescribieron
+    stale_pages = set(reindexed_pages) | {
+        page_num for page_num in indexed_keys if page_num >= page_count
+    }
+    stale_entries = {
+        key: page_num
+        for page_num in stale_pages
+        for key in indexed_keys.get(page_num, set())
+        if key not in new_keys
+    }
+    if stale_entries:
+        remove_pages(
+            config.INDEX_ID,
+            filename,
+            sorted(set(stale_entries.values())),
+            indexed_pages=stale_entries,
+        )
     logging.info(f"✅ {event_id}: Documento procesado exitosamente")
@@ -6,35 +6,73 @@ Implementa operaciones CRUD para documentos, tópicos y preguntas.
 import json
 import logging
 import os
+import zlib
 from datetime import datetime
 from typing import Dict, List, Any, Optional, Union
 from redis import Redis
 
 # Importar cliente desde el módulo config
 import config
+from document_locks import ensure_lease
 
 # Configurar un logger específico para las operaciones de Redis
 redis_logger = logging.getLogger("redis_operations")
 redis_logger.setLevel(logging.DEBUG)
 
+# Prefijo que identifica los valores comprimidos con zlib. Los valores sin
+# prefijo (texto UTF-8 plano, incluidos los registros anteriores) se leen tal cual
+COMPRESSION_MARKER = b"\x00zl1"
 
-def get_redis_client():
+
+def encode_value(text: str) -> bytes:
     """
-    Obtiene el cliente Redis desde el módulo config.
-    Si el cliente de config no está inicializado, lo inicializa.
+    Codifica un texto para guardarlo en Redis.
+    Si la compresión está habilitada y el texto supera COMPRESSION_MIN_BYTES,
+    se comprime con zlib y se antepone COMPRESSION_MARKER.
+
+    Args:
+        text: Texto a codificar
 
     Returns:
-        Cliente Redis
-    """
-    if config.REDIS_CLIENT is None:
-        # Si el cliente no está inicializado, intentamos inicializarlo
-        config.initialize_services()
-        if config.REDIS_CLIENT is None:
-            # Si sigue siendo None, lanzamos un error más explicativo
-            raise RuntimeError(
-                "No se pudo inicializar el cliente Redis. Verifique la configuración y conexión."
-            )
-    return config.REDIS_CLIENT
+        Valor a guardar en Redis
+    """
+    data = text.encode("utf-8")
+    if not config.COMPRESSION_ENABLED or len(data) < config.COMPRESSION_MIN_BYTES:
+        return data
+
+    compressed = COMPRESSION_MARKER + zlib.compress(data, config.COMPRESSION_LEVEL)
+    # Conservar el texto plano si la compresión no reduce el tamaño
+    return compressed if len(compressed) < len(data) else data
+
+
+def is_compressed_value(value: Optional[bytes]) -> bool:
+    """
+    Indica si un valor leído de Redis está comprimido.
+
+    Args:
+        value: Valor leído de Redis
+
+    Returns:
+        True si el valor tiene el prefijo de compresión
+    """
+    return isinstance(value, bytes) and value.startswith(COMPRESSION_MARKER)
+
+
+def decode_value(value: Optional[Union[bytes, str]]) -> Optional[str]:
+    """
+    Decodifica un valor leído de Redis, comprimido o no.
+
+    Args:
+        value: Valor leído de Redis
+
+    Returns:
+        Texto decodificado o None si el valor no existe
+    """
+    if value is None or isinstance(value, str):
+        return value
+    if is_compressed_value(value):
+        value = zlib.decompress(value[len(COMPRESSION_MARKER) :])
+    return value.decode("utf-8")
 
 
 def get_document(redis_client: Redis, filename: str) -> Optional[Dict[str, Any]]:
@@ -65,66 +103,283 @@ def get_document(redis_client: Redis, filename: str) -> Optional[Dict[str, Any]]
         return None
 
 
-def save_document_metadata(redis_client: Redis, filename=None, metadata=None) -> None:
+def get_document_pages(
+    redis_client: Redis, filename: str, document: Optional[Dict[str, Any]] = None
+) -> List[str]:
     """
-    Guarda o actualiza los metadatos de un documento en Redis.
+    Obtiene el texto de las páginas de un documento.
+    El texto se guarda en el hash pages:{filename}, separado de los metadatos;
+    los documentos guardados con el formato anterior lo incluyen en el campo "pages".
 
     Args:
         redis_client: Cliente de Redis
-        filename: Nombre del archivo/documento. Si es None, se buscará en metadata.
-        metadata: Metadatos a guardar
+        filename: Nombre del archivo/documento
+        document: Metadatos del documento ya leídos, si se dispone de ellos
+
+    Returns:
+        Lista con el texto de cada página, en orden
     """
-    key = f"document:{filename.replace('/', '-')}"
-    redis_logger.debug(
-        f"SET Redis - Guardando documento: {key}, fields: {list(metadata.keys())}"
-    )
+    if document is not None and "pages" in document:
+        return document["pages"]
 
-    try:
-        # Verificar que metadata no sea None
-        if metadata is None:
-            raise ValueError("Los metadatos no pueden ser None")
+    key = f"pages:{filename.replace('/', '-')}"
+    redis_logger.debug(f"HGETALL Redis - Consultando páginas: {key}")
+    pages = redis_client.hgetall(key)
+    return [
+        decode_value(text)
+        for _, text in sorted(pages.items(), key=lambda item: int(item[0]))
+    ]
 
-        # Guardar los datos directamente sin el objeto metadata envolvente
-        document_data = {**metadata, "filename": filename}
-        redis_client.set(key, json.dumps(document_data))
-        redis_logger.debug(f"SET Redis - Documento guardado: {key}")
-        logging.debug(f"Metadatos guardados para documento {filename}")
-    except Exception as e:
-        redis_logger.error(f"Error al guardar documento {key}: {str(e)}")
-        logging.error(f"Error al guardar metadatos para {filename}: {e}")
 
+class StoredPages:
+    """
+    Acceso de solo lectura y bajo demanda al texto de las páginas de un documento.
+    Las páginas se leen del hash pages:{filename} en bloques consecutivos con
+    HMGET y solo se mantiene en memoria el último bloque leído, de modo que
+    recorrer el documento en orden no requiere cargarlo completo.
+    """
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        filename: str,
+        page_count: int,
+        document: Optional[Dict[str, Any]] = None,
+        batch_size: Optional[int] = None,
+    ):
+        """
+        Args:
+            redis_client: Cliente de Redis
+            filename: Nombre del archivo/documento
+            page_count: Número de páginas del documento
+            document: Metadatos del documento ya leídos. Si incluyen el campo
+                "pages" (formato anterior), las páginas se toman de ahí
+            batch_size: Páginas leídas por consulta (default: STREAM_PAGE_BUFFER)
+        """
+        self.redis_client = redis_client
+        self.pages_key = f"pages:{filename.replace('/', '-')}"
+        self.page_count = page_count
+        self.batch_size = max(1, batch_size or config.STREAM_PAGE_BUFFER)
+        self._legacy_pages = document.get("pages") if document is not None else None
+        self._start = 0
+        self._batch: List[Optional[str]] = []
+
+    def __len__(self) -> int:
+        return self.page_count
+
+    def __getitem__(self, page_num: int) -> str:
+        if not 0 <= page_num < self.page_count:
+            raise IndexError(page_num)
+        if self._legacy_pages is not None:
+            return self._legacy_pages[page_num]
+
+        if not self._start <= page_num < self._start + len(self._batch):
+            fields = [
+                str(i)
+                for i in range(page_num, min(page_num + self.batch_size, self.page_count))
+            ]
+            redis_logger.debug(
+                f"HMGET Redis - Consultando páginas {fields[0]}-{fields[-1]}: {self.pages_key}"
+            )
+            self._start = page_num
+            self._batch = [
+                decode_value(text) for text in self.redis_client.hmget(self.pages_key, fields)
+            ]
+        return self._batch[page_num - self._start] or ""
 
-def save_topics_and_questions(
-    redis_client: Redis, filename: str, topics: List[str], questions: List[str]
-) -> Dict[str, str]:
+    def __iter__(self):
+        for page_num in range(self.page_count):
+            yield self[page_num]
+
+
+def get_page_count(document: Dict[str, Any]) -> int:
     """
-    Guarda tópicos y preguntas relacionadas con un documento en Redis.
+    Obtiene el número de páginas de un documento a partir de sus metadatos.
 
     Args:
-        redis_client: Cliente de Redis
-        filename: Nombre del archivo/documento
-        topics: Lista de tópicos identificados
-        questions: Lista de preguntas generadas
+        document: Metadatos del documento
 
     Returns:
-        Referencias a los objetos guardados
+        Número de páginas
     """
-    file_key = filename.replace("/", "-")
+    if "page_count" in document:
+        return document["page_count"]
+    return len(document.get("pages", []))
 
-    # Guardar tópicos
-    topics_key = f"topics:{file_key}"
-    redis_logger.debug(f"SET Redis - Guardando tópicos: {topics_key}")
-    redis_client.set(topics_key, json.dumps({"filename": filename, "topics": topics}))
 
-    # Guardar preguntas
-    questions_key = f"questions:{file_key}"
-    redis_logger.debug(f"SET Redis - Guardando preguntas: {questions_key}")
-    redis_client.set(
-        questions_key, json.dumps({"filename": filename, "questions": questions})
-    )
+class DocumentWriteSession:
+    """
+    Unidad de trabajo para las escrituras de un documento en Redis.
+    Acumula en memoria los cambios del documento, sus páginas, tópicos y preguntas, y los
+    escribe en un único pipeline MULTI/EXEC al llamar a flush(). El documento
+    se lee como máximo una vez, al crear la sesión.
+    """
 
-    # Devolver referencias para actualizar el documento principal
-    return {"topics_ref": topics_key, "questions_ref": questions_key}
+    def __init__(
+        self,
+        redis_client: Redis,
+        filename: str,
+        document: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Args:
+            redis_client: Cliente de Redis
+            filename: Nombre del archivo/documento
+            document: Datos iniciales del documento. Si es None, se leen de Redis
+        """
+        self.redis_client = redis_client
+        self.filename = filename
+        self.file_key = filename.replace("/", "-")
+
+        if document is None:
+            document = get_document(redis_client, filename) or {"filename": filename}
+        self.document = {**document, "filename": filename}
+
+        self._document_dirty = True
+        self._pending_sets: Dict[str, str] = {}
+        self._pending_deletes: List[str] = []
+        self._pending_pages: Optional[List[str]] = None
+        self._streamed_page_count: Optional[int] = None
+
+    def update(self, fields: Dict[str, Any]) -> None:
+        """
+        Actualiza campos del documento en memoria.
+
+        Args:
+            fields: Campos a actualizar
+        """
+        self.document.update(fields)
+        self._document_dirty = True
+
+    def set_pages(self, pages: List[str]) -> None:
+        """
+        Registra el texto de las páginas, que se guarda en el hash pages:{filename}.
+        Los metadatos solo conservan el número de páginas.
+
+        Args:
+            pages: Lista con el texto de cada página
+        """
+        self._pending_pages = pages
+        self.document.pop("pages", None)
+        self.update({"page_count": len(pages)})
+
+    def write_pages(self, pages: Dict[int, str]) -> None:
+        """
+        Escribe de inmediato un bloque de páginas en el hash pages:{filename}, sin
+        esperar a flush(). Se usa en el procesamiento en streaming, en el que el
+        texto completo del documento no se mantiene en memoria.
+
+        Args:
+            pages: Diccionario {número de página: texto}
+        """
+        if not pages:
+            return
+        ensure_lease(self.filename)
+        pages_key = f"pages:{self.file_key}"
+        redis_logger.debug(f"HSET Redis - Guardando {len(pages)} páginas: {pages_key}")
+        self.redis_client.hset(
+            pages_key,
+            mapping={str(i): encode_value(text) for i, text in pages.items()},
+        )
+
+    def set_page_count(self, page_count: int) -> None:
+        """
+        Registra el número final de páginas escritas con write_pages().
+        Las páginas sobrantes de una versión anterior se eliminan en flush().
+
+        Args:
+            page_count: Número de páginas del documento
+        """
+        self._streamed_page_count = page_count
+        self.document.pop("pages", None)
+        self.update({"page_count": page_count})
+
+    def set_topics_and_questions(
+        self, topics: List[str], questions: List[str]
+    ) -> Dict[str, str]:
+        """
+        Registra los tópicos y preguntas del documento y sus referencias.
+
+        Args:
+            topics: Lista de tópicos identificados
+            questions: Lista de preguntas generadas
+
+        Returns:
+            Referencias a los objetos que se guardarán
+        """
+        topics_key = f"topics:{self.file_key}"
+        questions_key = f"questions:{self.file_key}"
+        self._pending_sets[topics_key] = json.dumps(
+            {"filename": self.filename, "topics": topics}
+        )
+        self._pending_sets[questions_key] = json.dumps(
+            {"filename": self.filename, "questions": questions}
+        )
+
+        refs = {"topics_ref": topics_key, "questions_ref": questions_key}
+        self.update(refs)
+        return refs
+
+    def delete_topics_and_questions(self) -> None:
+        """Registra la eliminación de los tópicos y preguntas actuales del documento."""
+        for key in (f"topics:{self.file_key}", f"questions:{self.file_key}"):
+            self._pending_sets.pop(key, None)
+            self._pending_deletes.append(key)
+
+    def flush(self) -> None:
+        """Escribe los cambios pendientes en un único MULTI/EXEC."""
+        if (
+            not self._document_dirty
+            and not self._pending_sets
+            and not self._pending_deletes
+            and self._pending_pages is None
+            and self._streamed_page_count is None
+        ):
+            return
+
+        ensure_lease(self.filename)
+        document_key = f"document:{self.file_key}"
+        pages_key = f"pages:{self.file_key}"
+        stale_page_fields = []
+        if self._streamed_page_count is not None:
+            stale_page_fields = [
+                field
+                for field in self.redis_client.hkeys(pages_key)
+                if int(field) >= self._streamed_page_count
+            ]
+        redis_logger.debug(
+            f"MULTI Redis - Documento: {document_key}, "
+            f"SET: {list(self._pending_sets)}, DEL: {self._pending_deletes}"
+        )
+
+        pipeline = self.redis_client.pipeline(transaction=True)
+        if self._pending_deletes:
+            pipeline.delete(*self._pending_deletes)
+        for key, value in self._pending_sets.items():
+            pipeline.set(key, value)
+        if self._pending_pages is not None:
+            # Reemplazar el hash completo para no dejar páginas sobrantes
+            pipeline.delete(pages_key)
+            if self._pending_pages:
+                pipeline.hset(
+                    pages_key,
+                    mapping={
+                        str(i): encode_value(text)
+                        for i, text in enumerate(self._pending_pages)
+                    },
+                )
+        if stale_page_fields:
+            pipeline.hdel(pages_key, *stale_page_fields)
+        if self._document_dirty:
+            pipeline.set(document_key, json.dumps(self.document))
+        pipeline.execute()
+
+        self._document_dirty = False
+        self._pending_sets = {}
+        self._pending_deletes = []
+        self._pending_pages = None
+        self._streamed_page_count = None
+        redis_logger.debug(f"EXEC Redis - Documento guardado: {document_key}")
 
 
 def delete_document(redis_client: Redis, filename: str) -> None:
@@ -135,12 +390,14 @@ def delete_document(redis_client: Redis, filename: str) -> None:
         redis_client: Cliente de Redis
         filename: Nombre del archivo/documento
     """
+    ensure_lease(filename)
     file_key = filename.replace("/", "-")
 
-    # Eliminar documento principal
+    # Eliminar documento principal y el texto de sus páginas
     document_key = f"document:{file_key}"
-    redis_logger.debug(f"DEL Redis - Eliminando documento: {document_key}")
-    redis_client.delete(document_key)
+    pages_key = f"pages:{file_key}"
+    redis_logger.debug(f"DEL Redis - Eliminando documento: {document_key} y páginas: {pages_key}")
+    redis_client.delete(document_key, pages_key)
 
     # Eliminar tópicos y preguntas asociados
     topics_key = f"topics:{file_key}"
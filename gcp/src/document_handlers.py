@@ -5,18 +5,24 @@ Contiene funciones para procesar creación, actualización y eliminación de doc
 
 import logging
 from datetime import datetime
+from typing import Optional
 
 # Importar módulos del proyecto
 import config
+from config import get_redis_client
 from database_service import (
     get_document,
-    save_document_metadata,
+    get_document_pages,
+    get_page_count,
     delete_document,
-    get_redis_client,
+    DocumentWriteSession,
+    StoredPages,
 )
 from storage_service import get_blob_metadata
-from vector_search import remove_datapoints
-from content_processor import process_document_content
+
+# content_processor y vector_search (Document AI, OpenAI, redisvl y numpy) se
+# importan al usarse, de modo que las eliminaciones y las actualizaciones de solo
+# metadatos no pagan su importación en un arranque en frío
 
 
 def handle_document_deletion(event_id: str, input_bucket: str, filename: str) -> None:
@@ -36,16 +42,15 @@ def handle_document_deletion(event_id: str, input_bucket: str, filename: str) ->
     # Obtener documento de Redis
     doc_data = get_document(redis_client, filename)
 
-    # Eliminar datapoints del índice si existen
-    old_page_count = 0
-    if doc_data and "pages" in doc_data:
-        old_page_count = len(doc_data["pages"])
+    # Eliminar datapoints del índice. Se consulta el índice aunque no conste el
+    # número de páginas, ya que un procesamiento interrumpido puede haber
+    # indexado fragmentos antes de registrarlo
+    old_page_count = get_page_count(doc_data) if doc_data else 0
 
-    if old_page_count > 0:
-        remove_datapoints(config.INDEX_ID, filename, old_page_count)
-        logging.info(
-            f"🗑️ Eliminadas {old_page_count} datapoints del índice para {filename}"
-        )
+    from vector_search import remove_datapoints
+
+    remove_datapoints(config.INDEX_ID, filename, old_page_count)
+    logging.info(f"🗑️ Eliminados los datapoints del índice para {filename}")
 
     # Eliminar referencias en Redis
     delete_document(redis_client, filename)
@@ -58,6 +63,10 @@ def handle_document_creation(
     filename: str,
     mime_type: str,
     time_uploaded: datetime,
+    file_size: Optional[int] = None,
+    content_hash: Optional[str] = None,
+    generation: Optional[str] = None,
+    object_metadata: Optional[dict] = None,
 ) -> None:
     """
     Maneja la creación de un nuevo documento.
@@ -68,6 +77,10 @@ def handle_document_creation(
         filename: Nombre del archivo
         mime_type: Tipo MIME del archivo
         time_uploaded: Fecha de carga
+        file_size: Tamaño del archivo en bytes
+        content_hash: Hash del contenido del archivo
+        generation: Generación del objeto en Cloud Storage
+        object_metadata: Metadatos personalizados incluidos en el evento
     """
     logging.info(f"➕ {event_id}: Procesando NUEVO documento {filename}")
 
@@ -75,7 +88,7 @@ def handle_document_creation(
     redis_client = get_redis_client()
 
     # Obtener metadatos personalizados
-    custom_metadata = get_blob_metadata(input_bucket, filename)
+    custom_metadata = get_blob_metadata(input_bucket, filename, object_metadata)
 
     # Crear registro inicial del documento
     doc_data = {
@@ -94,12 +107,22 @@ def handle_document_creation(
     }
 
     # Guardar metadatos iniciales
-    save_document_metadata(
-        redis_client=redis_client, filename=filename, metadata=doc_data
-    )
+    session = DocumentWriteSession(redis_client, filename, document=doc_data)
+    session.flush()
 
     # Procesar el contenido del documento
-    process_document_content(event_id, input_bucket, filename, mime_type, redis_client)
+    from content_processor import process_document_content
+
+    process_document_content(
+        event_id,
+        input_bucket,
+        filename,
+        mime_type,
+        session,
+        file_size=file_size,
+        content_hash=content_hash,
+    )
+    mark_content_processed(session, generation, content_hash)
 
 
 def handle_document_update(
@@ -109,9 +132,15 @@ def handle_document_update(
     mime_type: str,
     time_uploaded: datetime,
     existing_doc: dict,
+    file_size: Optional[int] = None,
+    content_hash: Optional[str] = None,
+    generation: Optional[str] = None,
+    object_metadata: Optional[dict] = None,
 ) -> None:
     """
     Maneja la actualización de un documento existente.
+    Si la generación y el hash del objeto coinciden con los del último
+    procesamiento completo, solo cambiaron los metadatos y no se reprocesa.
 
     Args:
         event_id: ID del evento
@@ -120,31 +149,46 @@ def handle_document_update(
         mime_type: Tipo MIME del archivo
         time_uploaded: Fecha de carga
         existing_doc: Datos existentes del documento
+        file_size: Tamaño del archivo en bytes
+        content_hash: Hash del contenido del archivo
+        generation: Generación del objeto en Cloud Storage
+        object_metadata: Metadatos personalizados incluidos en el evento
     """
     logging.info(f"🔄 {event_id}: Actualizando documento existente {filename}")
 
     # Obtener el cliente Redis
     redis_client = get_redis_client()
 
-    # Verificar si ya procesamos este evento
-    if existing_doc.get("event_id") == event_id:
-        logging.info(f"⏭️ {event_id}: Evento ya procesado anteriormente, ignorando")
+    # Las reentregas de un evento ya procesado se descartan en main con el
+    # registro de eventos; aquí no se comprueba event_id, ya que el documento lo
+    # guarda antes de procesar el contenido y un reintento tras un fallo se omitiría
+
+    if is_content_unchanged(existing_doc, generation, content_hash):
+        handle_metadata_update(
+            event_id, input_bucket, filename, existing_doc, object_metadata
+        )
         return
 
-    # Eliminar datapoints del índice si existen
-    old_page_count = len(existing_doc.get("pages", []))
-    if old_page_count > 0:
+    # En modo incremental se conservan los datapoints y solo se reindexan
+    # las páginas que cambien; en caso contrario se eliminan todos
+    old_page_count = get_page_count(existing_doc)
+    previous_pages = None
+    if config.INCREMENTAL_REINDEX and old_page_count > 0 and config.STREAMING_PIPELINE:
+        # En streaming, las páginas anteriores se leen por bloques a medida que
+        # se comparan, sin cargar el documento completo en memoria
+        previous_pages = StoredPages(redis_client, filename, old_page_count, existing_doc)
+    elif config.INCREMENTAL_REINDEX and old_page_count > 0:
+        previous_pages = get_document_pages(redis_client, filename, existing_doc)
+    else:
+        from vector_search import remove_datapoints
+
         remove_datapoints(config.INDEX_ID, filename, old_page_count)
         logging.info(
             f"🗑️ Eliminadas {old_page_count} datapoints previas para {filename}"
         )
 
-    # Eliminar referencias de tópicos y preguntas, pero preservamos el documento
-    # Esto es más seguro que eliminar todo y volver a crear
-    delete_document(redis_client, filename)
-
     # Obtener metadatos personalizados actualizados
-    custom_metadata = get_blob_metadata(input_bucket, filename)
+    custom_metadata = get_blob_metadata(input_bucket, filename, object_metadata)
 
     # Actualizar metadatos manteniendo históricos como creation_time
     doc_data = {
@@ -166,10 +210,103 @@ def handle_document_update(
     if "creation_time" in existing_doc:
         doc_data["creation_time"] = existing_doc["creation_time"]
 
-    # Guardar metadatos actualizados - pasamos filename como parte del diccionario
-    save_document_metadata(
-        redis_client=redis_client, filename=filename, metadata=doc_data
-    )
+    # En modo incremental se conserva el número de páginas hasta terminar, para
+    # que si el procesamiento falla la siguiente actualización o eliminación
+    # siga encontrando las páginas y los datapoints anteriores
+    if previous_pages is not None:
+        doc_data["page_count"] = old_page_count
+
+    # Reemplazar los metadatos y eliminar las referencias de tópicos y preguntas
+    # anteriores en una sola escritura, preservando el documento
+    session = DocumentWriteSession(redis_client, filename, document=doc_data)
+    session.delete_topics_and_questions()
+    session.flush()
 
     # Procesar el contenido del documento
-    process_document_content(event_id, input_bucket, filename, mime_type, redis_client)
+    from content_processor import process_document_content
+
+    process_document_content(
+        event_id,
+        input_bucket,
+        filename,
+        mime_type,
+        session,
+        previous_pages=previous_pages,
+        file_size=file_size,
+        content_hash=content_hash,
+    )
+    mark_content_processed(session, generation, content_hash)
+
+
+def is_content_unchanged(
+    existing_doc: dict, generation: Optional[str], content_hash: Optional[str]
+) -> bool:
+    """
+    Indica si el contenido del objeto es el del último procesamiento completo.
+    La generación cambia con cada reescritura del contenido, pero no con los
+    cambios de metadatos; el hash confirma que el contenido es el mismo.
+
+    Args:
+        existing_doc: Datos existentes del documento
+        generation: Generación del objeto en Cloud Storage
+        content_hash: Hash del contenido del archivo
+
+    Returns:
+        True si el contenido no cambió
+    """
+    if generation is None or content_hash is None:
+        return False
+    return (
+        existing_doc.get("generation") == generation
+        and existing_doc.get("content_hash") == content_hash
+    )
+
+
+def handle_metadata_update(
+    event_id: str,
+    input_bucket: str,
+    filename: str,
+    existing_doc: dict,
+    object_metadata: Optional[dict] = None,
+) -> None:
+    """
+    Maneja un cambio solo de metadatos: actualiza los metadatos personalizados
+    del documento sin repetir OCR, análisis ni indexación.
+
+    Args:
+        event_id: ID del evento
+        input_bucket: Nombre del bucket
+        filename: Nombre del archivo
+        existing_doc: Datos existentes del documento
+        object_metadata: Metadatos personalizados incluidos en el evento
+    """
+    logging.info(f"🏷️ {event_id}: Contenido sin cambios, actualizando solo metadatos de {filename}")
+
+    session = DocumentWriteSession(get_redis_client(), filename, document=existing_doc)
+    session.update(
+        {
+            "event_id": event_id,
+            "metadata": get_blob_metadata(input_bucket, filename, object_metadata),
+            "metadata_update_time": datetime.now().isoformat(),
+        }
+    )
+    session.flush()
+
+
+def mark_content_processed(
+    session: DocumentWriteSession,
+    generation: Optional[str],
+    content_hash: Optional[str],
+) -> None:
+    """
+    Registra la generación y el hash del contenido procesado. Se guardan solo al
+    terminar el procesamiento, para que un procesamiento interrumpido no se
+    confunda con un cambio de metadatos en el siguiente evento.
+
+    Args:
+        session: Sesión de escritura del documento
+        generation: Generación del objeto en Cloud Storage
+        content_hash: Hash del contenido del archivo
+    """
+    session.update({"generation": generation, "content_hash": content_hash})
+    session.flush()
@@ -0,0 +1,202 @@
+"""
+Módulo con los bloqueos que serializan el procesamiento de un mismo documento.
+Una instancia puede recibir varios eventos a la vez; los eventos de un mismo
+archivo se procesan de uno en uno y los de archivos distintos, en paralelo.
+Entre instancias, el documento se protege con un lease en Redis.
+"""
+
+import logging
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from redis import Redis
+from redis.exceptions import ConnectionError, TimeoutError
+
+import config
+
+LEASE_PREFIX = "lock"
+
+# Libera o renueva el lease solo si sigue perteneciendo a quien lo tomó
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Registro {nombre de archivo: [bloqueo, eventos que lo usan o esperan]}
+_filename_locks: Dict[str, List] = {}
+# Leases en Redis que mantiene el proceso {nombre de archivo: señal de lease perdido}
+_held_leases: Dict[str, threading.Event] = {}
+_registry_lock = threading.Lock()
+
+
+class LeaseLostError(RuntimeError):
+    """El lease de un documento expiró o lo tomó otro proceso durante el procesamiento."""
+
+
+def ensure_lease(filename: str) -> None:
+    """
+    Comprueba, antes de escribir datos de un documento, que el proceso no haya
+    perdido su lease. Sin lease tomado (p. ej. en los scripts) no hace nada.
+
+    Args:
+        filename: Nombre del archivo
+
+    Raises:
+        LeaseLostError: Si el lease del archivo se perdió
+    """
+    with _registry_lock:
+        lost = _held_leases.get(filename)
+    if lost is not None and lost.is_set():
+        raise LeaseLostError(f"Se perdió el lease de {filename}, se cancela la escritura")
+
+
+@contextmanager
+def filename_lock(filename: str) -> Iterator[None]:
+    """
+    Bloquea un archivo dentro del proceso mientras dura el bloque `with`.
+    El bloqueo se elimina del registro cuando ningún evento lo usa.
+
+    Args:
+        filename: Nombre del archivo
+    """
+    with _registry_lock:
+        entry = _filename_locks.setdefault(filename, [threading.Lock(), 0])
+        entry[1] += 1
+
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _registry_lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _filename_locks[filename]
+
+
+def _acquire_lease(redis_client: Redis, key: str, token: str, ttl_ms: int) -> bool:
+    """
+    Intenta tomar un lease con SET NX PX. Si el SET falla por un error de conexión
+    o un timeout, pudo haberse ejecutado igualmente; por eso, cuando no se obtiene
+    una respuesta afirmativa, se comprueba si la clave ya contiene el token propio.
+
+    Args:
+        redis_client: Cliente de Redis
+        key: Clave del lease
+        token: Token propio
+        ttl_ms: Duración del lease en milisegundos
+
+    Returns:
+        True si el lease es propio
+    """
+    try:
+        if redis_client.set(key, token, nx=True, px=ttl_ms):
+            return True
+    except (ConnectionError, TimeoutError) as e:
+        logging.warning(f"Error al tomar el lease {key}: {e}")
+    return redis_client.get(key) == token.encode("utf-8")
+
+
+@contextmanager
+def document_lease(
+    redis_client: Redis,
+    filename: str,
+    ttl_seconds: Optional[float] = None,
+    wait_seconds: Optional[float] = None,
+) -> Iterator[None]:
+    """
+    Toma en Redis el lease de un archivo mientras dura el bloque `with`, de modo
+    que dos instancias no procesen el mismo documento a la vez. El lease se
+    toma con SET NX PX y un token propio, se renueva en segundo plano cada
+    tercio de su duración y se libera solo si sigue siendo propio. Si la
+    instancia muere, el lease expira por sí solo tras ttl_seconds.
+
+    Si el lease se pierde (otro proceso lo tomó o no se pudo renovar a tiempo),
+    las escrituras posteriores fallan con LeaseLostError (ver ensure_lease) y,
+    si el bloque termina sin error, se lanza LeaseLostError al salir, de modo
+    que el evento se reintente.
+
+    Args:
+        redis_client: Cliente de Redis
+        filename: Nombre del archivo
+        ttl_seconds: Duración del lease (default: DOCUMENT_LOCK_TTL_SECONDS)
+        wait_seconds: Espera máxima para tomarlo (default: DOCUMENT_LOCK_WAIT_SECONDS)
+
+    Raises:
+        RuntimeError: Si otro proceso mantiene el lease durante toda la espera
+        LeaseLostError: Si el lease se perdió durante el procesamiento
+    """
+    if ttl_seconds is None:
+        ttl_seconds = config.DOCUMENT_LOCK_TTL_SECONDS
+    if wait_seconds is None:
+        wait_seconds = config.DOCUMENT_LOCK_WAIT_SECONDS
+
+    key = f"{LEASE_PREFIX}:{filename}"
+    token = uuid.uuid4().hex
+    ttl_ms = int(ttl_seconds * 1000)
+
+    deadline = time.monotonic() + wait_seconds
+    while not _acquire_lease(redis_client, key, token, ttl_ms):
+        if time.monotonic() >= deadline:
+            raise RuntimeError(
+                f"No se pudo tomar el lease de {filename} en {wait_seconds} segundos"
+            )
+        # Sondeo con jitter para que las instancias en espera no coincidan
+        time.sleep(random.uniform(0.5, 1.5))
+    logging.info(f"🔒 Lease tomado para {filename}")
+
+    renew = redis_client.register_script(_RENEW_SCRIPT)
+    release = redis_client.register_script(_RELEASE_SCRIPT)
+    stop = threading.Event()
+    lost = threading.Event()
+
+    def keep_alive():
+        renewed_at = time.monotonic()
+        while not stop.wait(ttl_seconds / 3):
+            try:
+                if renew(keys=[key], args=[token, ttl_ms]):
+                    renewed_at = time.monotonic()
+                    continue
+                logging.error(f"Se perdió el lease de {filename}: otro proceso puede tomarlo")
+            except Exception as e:
+                # Se reintenta en el siguiente ciclo mientras el lease no haya expirado
+                logging.warning(f"No se pudo renovar el lease de {filename}: {e}")
+                if time.monotonic() - renewed_at < ttl_seconds:
+                    continue
+                logging.error(f"El lease de {filename} expiró sin poder renovarse")
+            lost.set()
+            return
+
+    with _registry_lock:
+        _held_leases[filename] = lost
+    renewer = threading.Thread(target=keep_alive, name=f"lease:{filename}", daemon=True)
+    renewer.start()
+    try:
+        yield
+        if lost.is_set():
+            raise LeaseLostError(f"Se perdió el lease de {filename} durante el procesamiento")
+    finally:
+        stop.set()
+        renewer.join()
+        with _registry_lock:
+            _held_leases.pop(filename, None)
+        if not lost.is_set():
+            try:
+                release(keys=[key], args=[token])
+            except Exception as e:
+                # El lease expira por sí solo tras ttl_seconds
+                logging.warning(f"No se pudo liberar el lease de {filename}: {e}")
+
+
+print("Bloqueos de documentos cargados")
@@ -1,8 +1,19 @@
 import logging
-from typing import Generator
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Generator, List, Optional, Tuple
+from google.api_core.exceptions import InvalidArgument
 from google.cloud import documentai
 from google.cloud import storage
 import config
+from clients import get_documentai_client, get_storage_client
+from config import get_redis_client
+from ocr_cache import cache_pages, get_cache_key, get_cached_pages
+from text_extractors import count_pdf_pages, extract_pages, get_extractor
+
+# Formatos de imagen de un solo cuadro: siempre tienen una página
+SINGLE_PAGE_MIME_TYPES = {"image/jpeg", "image/png", "image/bmp", "image/webp", "image/gif"}
 
 
 def get_document_text(
@@ -10,24 +21,293 @@ def get_document_text(
     mime_type: str,
     processor_id: str,
     temp_bucket: str,
+    file_size: Optional[int] = None,
+    page_count_hint: Optional[int] = None,
+    processing_info: Optional[Dict[str, Any]] = None,
+    content_hash: Optional[str] = None,
 ) -> Generator[str, None, None]:
     """
     Realiza OCR en un archivo de Cloud Storage usando Document AI.
+    Si se conoce el hash del contenido, el resultado se reutiliza desde la caché
+    de OCR cuando el mismo contenido ya fue procesado. Los formatos con texto nativo (texto plano, HTML, DOCX y PDF con capa de texto)
+    se extraen localmente, sin Document AI, si el resultado supera el control de
+    calidad. Los documentos pequeños se procesan en línea (process_document), sin operación
+    de larga duración ni resultados intermedios en GCS; el resto, por lotes.
 
     Args:
         input_file: URI de GCS del archivo a procesar (gs://bucket/filename)
         mime_type: Tipo MIME del documento
         processor_id: ID del procesador de Document AI
         temp_bucket: Bucket para almacenar resultados temporales
+        file_size: Tamaño del archivo en bytes, si se conoce
+        page_count_hint: Número de páginas esperado (p. ej. de la versión anterior)
+        processing_info: Diccionario en el que se registra la vía de OCR usada
+            ("ocr_path": "cache", "local", "online" o "batch")
+        content_hash: Hash del contenido del archivo (md5Hash o crc32c del evento)
+
+    Returns:
+        Generador con el texto de cada página del documento
+    """
+    if processing_info is None:
+        processing_info = {}
+
+    pages = _extract_document_text(
+        input_file,
+        mime_type,
+        processor_id,
+        temp_bucket,
+        file_size,
+        page_count_hint,
+        processing_info,
+    )
+    # Sin tamaño no se usa la caché: forma parte de la clave junto al hash
+    if not config.OCR_CACHE_ENABLED or not content_hash or file_size is None:
+        yield from pages
+        return
+
+    cache_key = get_cache_key(content_hash, file_size, mime_type)
+    try:
+        redis_client = get_redis_client()
+        cached_pages = get_cached_pages(redis_client, cache_key)
+    except Exception as e:
+        logging.warning(f"Caché de OCR no disponible: {e}")
+        yield from pages
+        return
+
+    if cached_pages is not None:
+        logging.info(f"Texto de {input_file} obtenido de la caché de OCR")
+        processing_info["ocr_path"] = "cache"
+        yield from cached_pages
+        return
+
+    yield from cache_pages(redis_client, cache_key, pages)
+
+
+def _extract_document_text(
+    input_file: str,
+    mime_type: str,
+    processor_id: str,
+    temp_bucket: str,
+    file_size: Optional[int],
+    page_count_hint: Optional[int],
+    processing_info: Dict[str, Any],
+) -> Generator[str, None, None]:
+    """
+    Extrae el texto de un documento localmente o con Document AI, sin caché.
+    Los argumentos son los de get_document_text.
 
     Returns:
         Generador con el texto de cada página del documento
     """
-    # Crear cliente de Document AI
-    documentai_client = documentai.DocumentProcessorServiceClient(
-        client_options=config.get_docai_client_options()
+    content = None
+    if config.LOCAL_EXTRACTION_ENABLED and get_extractor(mime_type) is not None:
+        if file_size is None:
+            bucket_name, blob_name = _parse_gcs_uri(input_file)
+            blob = get_storage_client().bucket(bucket_name).get_blob(blob_name)
+            file_size = blob.size if blob is not None else None
+        if file_size is not None and file_size > config.LOCAL_EXTRACTION_MAX_BYTES:
+            logging.info(
+                f"{input_file} supera LOCAL_EXTRACTION_MAX_BYTES ({file_size} bytes), "
+                f"se omite la extracción local"
+            )
+        else:
+            content = _download(input_file)
+            pages = _extract_locally(input_file, content, mime_type)
+            if pages is not None:
+                processing_info["ocr_path"] = "local"
+                yield from pages
+                return
+
+    # Cliente de Document AI compartido por el proceso
+    documentai_client = get_documentai_client()
+
+    if page_count_hint is None and _fits_online_size(file_size):
+        page_count_hint = _estimate_page_count(input_file, mime_type, content)
+
+    if _use_online_processing(file_size, page_count_hint):
+        try:
+            document = _process_online(
+                documentai_client, input_file, mime_type, processor_id
+            )
+        except InvalidArgument as e:
+            # P. ej. el documento supera el límite de páginas del procesamiento en línea
+            logging.warning(
+                f"Procesamiento en línea rechazado para {input_file}, usando lotes: {e}"
+            )
+        else:
+            processing_info["ocr_path"] = "online"
+            yield from _get_document_pages(document)
+            return
+
+    processing_info["ocr_path"] = "batch"
+    yield from _get_batch_document_text(
+        documentai_client, input_file, mime_type, processor_id, temp_bucket
     )
 
+
+def _download(input_file: str) -> bytes:
+    """
+    Descarga el contenido de un archivo de Cloud Storage.
+
+    Args:
+        input_file: URI de GCS del archivo (gs://bucket/filename)
+
+    Returns:
+        Contenido del archivo
+    """
+    bucket_name, blob_name = _parse_gcs_uri(input_file)
+    return get_storage_client().bucket(bucket_name).blob(blob_name).download_as_bytes()
+
+
+def _extract_locally(input_file: str, content: bytes, mime_type: str) -> Optional[List[str]]:
+    """
+    Extrae el texto de un archivo descargado sin Document AI.
+
+    Args:
+        input_file: URI de GCS del archivo (gs://bucket/filename)
+        content: Contenido del archivo
+        mime_type: Tipo MIME del documento
+
+    Returns:
+        Lista con el texto de cada página, o None si se debe usar Document AI
+    """
+    pages = extract_pages(content, mime_type)
+    if pages is None:
+        logging.info(f"Extracción local no disponible para {input_file}, usando Document AI")
+    else:
+        logging.info(f"Texto extraído localmente de {input_file}: {len(pages)} páginas")
+    return pages
+
+
+def _parse_gcs_uri(uri: str) -> Tuple[str, str]:
+    """
+    Separa una URI de GCS en bucket y nombre del objeto.
+
+    Args:
+        uri: URI de GCS (gs://bucket/filename)
+
+    Returns:
+        Tupla (bucket, nombre del objeto)
+    """
+    bucket_name, blob_name = uri.removeprefix("gs://").split("/", 1)
+    return bucket_name, blob_name
+
+
+def _fits_online_size(file_size: Optional[int]) -> bool:
+    """
+    Indica si el tamaño de un documento permite el procesamiento en línea.
+
+    Args:
+        file_size: Tamaño del archivo en bytes, si se conoce
+
+    Returns:
+        True si el procesamiento en línea está habilitado y el tamaño es conocido y admitido
+    """
+    return (
+        config.ONLINE_PROCESSING_ENABLED
+        and file_size is not None
+        and file_size <= config.ONLINE_PROCESSING_MAX_BYTES
+    )
+
+
+def _estimate_page_count(
+    input_file: str, mime_type: str, content: Optional[bytes]
+) -> Optional[int]:
+    """
+    Obtiene el número de páginas de un documento sin Document AI, para decidir
+    si cabe en el procesamiento en línea. Las imágenes de un solo cuadro tienen
+    una página; en los PDF se cuentan con pypdf, reutilizando el contenido si ya
+    se descargó para la extracción local.
+
+    Args:
+        input_file: URI de GCS del archivo (gs://bucket/filename)
+        mime_type: Tipo MIME del documento
+        content: Contenido del archivo, si ya se descargó
+
+    Returns:
+        Número de páginas, o None si no se puede obtener de forma económica
+    """
+    mime_type = mime_type.split(";")[0].strip().lower()
+    if mime_type in SINGLE_PAGE_MIME_TYPES:
+        return 1
+    if mime_type != "application/pdf":
+        return None
+    if content is None:
+        content = _download(input_file)
+    return count_pdf_pages(content)
+
+
+def _use_online_processing(
+    file_size: Optional[int], page_count_hint: Optional[int]
+) -> bool:
+    """
+    Indica si un documento se procesa en línea según su tamaño y número de páginas.
+
+    Args:
+        file_size: Tamaño del archivo en bytes, si se conoce
+        page_count_hint: Número de páginas esperado, si se conoce
+
+    Returns:
+        True si se debe usar el procesamiento en línea
+    """
+    # Sin número de páginas se usa el procesamiento por lotes: una solicitud en
+    # línea de un documento largo fallaría tras subirlo y habría que repetirlo
+    if not _fits_online_size(file_size) or page_count_hint is None:
+        return False
+    return page_count_hint <= config.ONLINE_PROCESSING_MAX_PAGES
+
+
+def _process_online(
+    documentai_client: documentai.DocumentProcessorServiceClient,
+    input_file: str,
+    mime_type: str,
+    processor_id: str,
+) -> documentai.Document:
+    """
+    Procesa un documento de Cloud Storage de forma síncrona con Document AI.
+
+    Args:
+        documentai_client: Cliente de Document AI
+        input_file: URI de GCS del archivo a procesar
+        mime_type: Tipo MIME del documento
+        processor_id: ID del procesador de Document AI
+
+    Returns:
+        Documento procesado
+    """
+    logging.info(f"Procesando documento en línea con Document AI: {input_file}")
+    result = documentai_client.process_document(
+        request=documentai.ProcessRequest(
+            name=processor_id,
+            gcs_document=documentai.GcsDocument(
+                gcs_uri=input_file,
+                mime_type=mime_type,
+            ),
+        ),
+    )
+    return result.document
+
+
+def _get_batch_document_text(
+    documentai_client: documentai.DocumentProcessorServiceClient,
+    input_file: str,
+    mime_type: str,
+    processor_id: str,
+    temp_bucket: str,
+) -> Generator[str, None, None]:
+    """
+    Procesa un documento por lotes con Document AI y lee los resultados desde GCS.
+
+    Args:
+        documentai_client: Cliente de Document AI
+        input_file: URI de GCS del archivo a procesar
+        mime_type: Tipo MIME del documento
+        processor_id: ID del procesador de Document AI
+        temp_bucket: Bucket para almacenar resultados temporales
+
+    Returns:
+        Generador con el texto de cada página del documento
+    """
     # Configurar solicitud de procesamiento por lotes
     operation = documentai_client.batch_process_documents(
         request=documentai.BatchProcessRequest(
@@ -55,30 +335,111 @@ def get_document_text(
     operation.result()
 
     # Obtener resultados del procesamiento
-    storage_client = storage.Client()
+    storage_client = get_storage_client()
     metadata = documentai.BatchProcessMetadata(operation.metadata)
     output_gcs_path = metadata.individual_process_statuses[0].output_gcs_destination
 
     # Extraer el bucket y prefijo del path de salida
     (output_bucket, output_prefix) = output_gcs_path.removeprefix("gs://").split("/", 1)
 
-    # Recorrer los blobs de salida y extraer el texto de cada página
-    for blob in storage_client.list_blobs(output_bucket, prefix=output_prefix):
-        blob_contents = blob.download_as_bytes()
-        document = documentai.Document.from_json(
-            blob_contents, ignore_unknown_fields=True
-        )
-
-        # Generar el texto de cada página
-        for page in document.pages:
-            # Extraer segmentos de texto
-            segments = [
-                (segment.start_index, segment.end_index)
-                for segment in page.layout.text_anchor.text_segments
-            ]
-
-            # Unir los segmentos y devolver el texto completo de la página
-            yield "\n".join([document.text[start:end] for (start, end) in segments])
+    # Ordenar los shards de salida por su número, no alfabéticamente
+    blobs = sorted(
+        storage_client.list_blobs(output_bucket, prefix=output_prefix),
+        key=_get_shard_number,
+    )
+
+    # Descargar e interpretar los shards en paralelo, con un máximo de
+    # OCR_SHARD_MAX_CONCURRENCY en vuelo, y devolver sus páginas en orden
+    executor = ThreadPoolExecutor(max_workers=config.OCR_SHARD_MAX_CONCURRENCY)
+    pending = deque()
+    try:
+        for blob in blobs:
+            if len(pending) >= config.OCR_SHARD_MAX_CONCURRENCY:
+                yield from pending.popleft().result()
+            pending.append(executor.submit(_get_shard_pages, blob))
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    # El texto ya fue leído (y guardado en la caché de OCR), los shards no se reutilizan
+    if config.OCR_OUTPUT_CLEANUP:
+        _delete_blobs(storage_client, blobs)
+
+
+def _delete_blobs(storage_client: storage.Client, blobs: List[storage.Blob]) -> None:
+    """
+    Elimina los shards de salida de Document AI en lotes de solicitudes.
+    Los que no se puedan eliminar los borra la regla de ciclo de vida del prefijo ocr/.
+
+    Args:
+        storage_client: Cliente de Cloud Storage
+        blobs: Blobs a eliminar
+    """
+    try:
+        # Las solicitudes por lotes de GCS admiten hasta 100 operaciones
+        for i in range(0, len(blobs), 100):
+            with storage_client.batch():
+                for blob in blobs[i : i + 100]:
+                    blob.delete()
+        logging.info(f"Eliminados {len(blobs)} shards de salida de Document AI")
+    except Exception as e:
+        logging.warning(f"No se pudieron eliminar los shards de salida de Document AI: {e}")
+
+
+def _get_shard_number(blob: storage.Blob) -> int:
+    """
+    Obtiene el número de un shard de salida de Document AI a partir de su nombre
+    (p. ej. documento-12.json).
+
+    Args:
+        blob: Blob del shard
+
+    Returns:
+        Número del shard, o 0 si el nombre no tiene sufijo numérico
+    """
+    match = re.search(r"-(\d+)\.json$", blob.name)
+    return int(match.group(1)) if match else 0
+
+
+def _get_shard_pages(blob: storage.Blob) -> List[str]:
+    """
+    Descarga un shard de salida de Document AI y extrae el texto de sus páginas.
+
+    Args:
+        blob: Blob del shard
+
+    Returns:
+        Lista con el texto de cada página del shard
+    """
+    blob_contents = blob.download_as_bytes()
+    document = documentai.Document.from_json(
+        blob_contents, ignore_unknown_fields=True
+    )
+    return _get_document_pages(document)
+
+
+def _get_document_pages(document: documentai.Document) -> List[str]:
+    """
+    Extrae el texto de cada página de un documento de Document AI.
+
+    Args:
+        document: Documento procesado
+
+    Returns:
+        Lista con el texto de cada página
+    """
+    pages = []
+    for page in document.pages:
+        # Extraer segmentos de texto
+        segments = [
+            (segment.start_index, segment.end_index)
+            for segment in page.layout.text_anchor.text_segments
+        ]
+
+        # Unir los segmentos y obtener el texto completo de la página
+        pages.append("\n".join([document.text[start:end] for (start, end) in segments]))
+    return pages
 
 
 print("Procesador de documentos cargado")
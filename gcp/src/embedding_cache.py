@@ -0,0 +1,126 @@
+"""
+Módulo para la caché persistente de embeddings en Redis.
+Los embeddings se direccionan por el contenido de la página, de modo que las páginas
+sin cambios entre versiones de un documento no vuelven a enviarse a OpenAI.
+"""
+
+import hashlib
+import logging
+import threading
+from typing import Any, List, Optional
+
+import numpy as np
+from redis import Redis
+
+import config
+
+CACHE_PREFIX = "embedding_cache"
+STATS_KEY = f"{CACHE_PREFIX}:stats"
+
+# Contadores del proceso actual, complementan los contadores globales en Redis.
+# Se protegen con un lock porque varios eventos pueden actualizarlos a la vez
+cache_stats = {"hits": 0, "misses": 0}
+_cache_stats_lock = threading.Lock()
+
+
+def get_cache_key(text: str) -> str:
+    """
+    Genera la clave de caché de un texto a partir de su hash, el modelo y las dimensiones.
+
+    Args:
+        text: Texto de la página
+
+    Returns:
+        Clave de Redis para el embedding
+    """
+    digest = hashlib.sha256(
+        f"{config.EMBEDDING_MODEL}:{config.EMBEDDING_DIMENSIONS}:{text}".encode("utf-8")
+    ).hexdigest()
+    return f"{CACHE_PREFIX}:{digest}"
+
+
+def get_cached_embeddings(
+    redis_client: Redis, texts: List[str]
+) -> List[Optional[List[float]]]:
+    """
+    Obtiene de la caché los embeddings de una lista de textos en un único pipeline.
+    Cada acierto renueva el TTL de la entrada, por lo que las entradas sin uso
+    son las primeras en expirar.
+
+    Args:
+        redis_client: Cliente de Redis
+        texts: Lista de textos
+
+    Returns:
+        Lista con el embedding de cada texto o None si no está en caché
+    """
+    if not texts:
+        return []
+
+    pipeline = redis_client.pipeline(transaction=False)
+    for text in texts:
+        pipeline.getex(get_cache_key(text), ex=config.EMBEDDING_CACHE_TTL_SECONDS)
+    blobs = pipeline.execute()
+
+    embeddings = [
+        np.frombuffer(blob, dtype=np.float32).tolist() if blob else None
+        for blob in blobs
+    ]
+
+    hits = sum(1 for embedding in embeddings if embedding is not None)
+    misses = len(embeddings) - hits
+    with _cache_stats_lock:
+        cache_stats["hits"] += hits
+        cache_stats["misses"] += misses
+
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.hincrby(STATS_KEY, "hits", hits)
+    pipeline.hincrby(STATS_KEY, "misses", misses)
+    pipeline.execute()
+
+    logging.info(f"Caché de embeddings: {hits} aciertos, {misses} fallos")
+    return embeddings
+
+
+def save_embeddings(
+    redis_client: Redis, texts: List[str], embeddings: List[Any]
+) -> None:
+    """
+    Guarda embeddings en la caché como blobs float32 con TTL.
+    Los vectores vacíos (errores de generación) no se guardan.
+
+    Args:
+        redis_client: Cliente de Redis
+        texts: Lista de textos
+        embeddings: Embeddings correspondientes a cada texto
+    """
+    pipeline = redis_client.pipeline(transaction=False)
+    for text, embedding in zip(texts, embeddings):
+        if not any(embedding):
+            continue
+        pipeline.set(
+            get_cache_key(text),
+            np.array(embedding, dtype=np.float32).tobytes(),
+            ex=config.EMBEDDING_CACHE_TTL_SECONDS,
+        )
+    pipeline.execute()
+
+
+def get_cache_stats(redis_client: Redis) -> dict:
+    """
+    Obtiene los contadores globales de aciertos y fallos de la caché.
+
+    Args:
+        redis_client: Cliente de Redis
+
+    Returns:
+        Diccionario con los contadores "hits" y "misses"
+    """
+    stats = redis_client.hgetall(STATS_KEY)
+    return {
+        "hits": int(stats.get(b"hits", 0)),
+        "misses": int(stats.get(b"misses", 0)),
+    }
+
+
+print("Caché de embeddings cargada")
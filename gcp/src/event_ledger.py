@@ -0,0 +1,60 @@
+"""
+Módulo con el registro en Redis de los eventos ya procesados.
+Cloud Storage entrega los eventos al menos una vez y los reintenta tras un
+error; el registro permite descartar una entrega repetida antes de repetir
+OCR, análisis e indexación. Las entradas expiran tras EVENT_LEDGER_TTL_SECONDS.
+"""
+
+from datetime import datetime
+
+from redis import Redis
+
+import config
+
+LEDGER_PREFIX = "processed_event"
+
+
+def get_ledger_key(event_id: str) -> str:
+    """
+    Genera la clave del registro de un evento.
+
+    Args:
+        event_id: ID del CloudEvent, que se conserva en las reentregas
+
+    Returns:
+        Clave de Redis del evento
+    """
+    return f"{LEDGER_PREFIX}:{event_id}"
+
+
+def is_event_processed(redis_client: Redis, event_id: str) -> bool:
+    """
+    Comprueba si un evento ya se procesó.
+
+    Args:
+        redis_client: Cliente de Redis
+        event_id: ID del CloudEvent
+
+    Returns:
+        True si el evento está en el registro
+    """
+    return bool(redis_client.exists(get_ledger_key(event_id)))
+
+
+def mark_event_processed(redis_client: Redis, event_id: str) -> None:
+    """
+    Registra un evento como procesado. Solo se llama si el procesamiento terminó
+    sin errores, para que una reentrega tras un error se procese de nuevo.
+
+    Args:
+        redis_client: Cliente de Redis
+        event_id: ID del CloudEvent
+    """
+    redis_client.set(
+        get_ledger_key(event_id),
+        datetime.now().isoformat(),
+        ex=config.EVENT_LEDGER_TTL_SECONDS,
+    )
+
+
+print("Registro de eventos procesados cargado")
@@ -6,25 +6,50 @@ Contiene la función principal que procesa eventos de Cloud Storage.
 import logging
 import functions_framework
 import atexit
+import threading
 from cloudevents.http import CloudEvent
 from datetime import datetime
 
-# Importar módulos del proyecto
+# Importar módulos del proyecto. Los manejadores de documentos (y con ellos
+# Document AI, OpenAI y redisvl) se importan en el primer evento, y la conexión
+# a Redis se establece en su primer uso, para reducir el arranque en frío
 import config
-from database_service import get_document, get_redis_client
-from document_handlers import (
-    handle_document_creation,
-    handle_document_update,
-    handle_document_deletion,
-)
-
-# Inicializar servicios
-config.initialize_services()
+from config import get_redis_client
+from database_service import get_document
+from document_locks import document_lease, filename_lock
+from event_ledger import is_event_processed, mark_event_processed
 
 # Registrar solo la función de cierre de conexiones de config.py
 # ya que ahora todos los módulos usan el mismo cliente Redis
 atexit.register(config.close_services)
 
+SUPPORTED_EVENT_TYPES = (
+    "google.cloud.storage.object.v1.finalized",
+    "google.cloud.storage.object.v1.metadataUpdated",
+    "google.cloud.storage.object.v1.deleted",
+)
+
+# Limita los eventos procesados a la vez cuando la instancia recibe varios en paralelo
+_event_slots = threading.BoundedSemaphore(config.EVENT_MAX_CONCURRENCY)
+
+
+def get_content_hash(data: dict):
+    """
+    Obtiene el hash del contenido de un objeto a partir de los datos del evento.
+    Los objetos compuestos no tienen md5Hash, en ese caso se usa crc32c.
+
+    Args:
+        data: Datos del evento de Cloud Storage
+
+    Returns:
+        Hash con el prefijo de su algoritmo (p. ej. "md5:...") o None si no viene en el evento
+    """
+    if data.get("md5Hash"):
+        return f"md5:{data['md5Hash']}"
+    if data.get("crc32c"):
+        return f"crc32c:{data['crc32c']}"
+    return None
+
 
 @functions_framework.cloud_event
 def on_cloud_event(event: CloudEvent) -> None:
@@ -32,57 +57,91 @@ def on_cloud_event(event: CloudEvent) -> None:
     Procesa eventos de Cloud Storage para documentos.
     Se manejan:
     - google.cloud.storage.object.v1.finalized y google.cloud.storage.object.v1.metadataUpdated:
-      Se trata de un nuevo documento o de una actualización. Se procesa el documento.
+      Se trata de un nuevo documento o de una actualización. Se procesa el documento,
+      salvo que su contenido no haya cambiado: en ese caso solo se actualizan los metadatos.
     - google.cloud.storage.object.v1.deleted:
       Se elimina el documento: se remueven las referencias en Redis y en el índice.
 
+    La función admite eventos concurrentes: los de un mismo archivo se procesan
+    de uno en uno, también entre instancias (lease en Redis), y como mucho se
+    procesan EVENT_MAX_CONCURRENCY a la vez. Los eventos ya procesados se omiten.
+
     Args:
         event: Evento de Cloud Storage
     """
     try:
+        import document_handlers
+
         event_type = event["type"]
         event_id = event.data["id"]
         input_bucket = event.data["bucket"]
         filename = event.data["name"]
+        # El tamaño llega como string en los eventos de Cloud Storage
+        file_size = int(event.data["size"]) if event.data.get("size") else None
+        content_hash = get_content_hash(event.data)
+        generation = event.data.get("generation")
+        # El evento incluye los metadatos personalizados del objeto y omite el
+        # campo si no hay, por lo que no hace falta consultarlos en Cloud Storage
+        object_metadata = event.data.get("metadata", {})
 
-        logging.info(f"Procesando evento {event_type} para {filename}")
-
-        if event_type == "google.cloud.storage.object.v1.deleted":
-            handle_document_deletion(event_id, input_bucket, filename)
-        elif event_type in [
-            "google.cloud.storage.object.v1.finalized",
-            "google.cloud.storage.object.v1.metadataUpdated",
-        ]:
-            # Obtener documento actual para determinar si es creación o actualización
-            redis_client = get_redis_client()
-            doc_data = get_document(redis_client, filename)
-
-            if doc_data:
-                # Es una actualización
-                handle_document_update(
-                    event_id=event_id,
-                    input_bucket=input_bucket,
-                    filename=filename,
-                    mime_type=event.data["contentType"],
-                    time_uploaded=datetime.fromisoformat(event.data["timeCreated"]),
-                    existing_doc=doc_data,
-                )
-            else:
-                # Es una creación
-                handle_document_creation(
-                    event_id=event_id,
-                    input_bucket=input_bucket,
-                    filename=filename,
-                    mime_type=event.data["contentType"],
-                    time_uploaded=datetime.fromisoformat(event.data["timeCreated"]),
-                )
-        else:
+        if event_type not in SUPPORTED_EVENT_TYPES:
             logging.info(f"Ignorando evento no soportado: {event_type}")
+            return
+
+        # Esperar primero al archivo (en el proceso y entre instancias), para que
+        # los eventos en espera de un mismo archivo no ocupen cupos de procesamiento
+        redis_client = get_redis_client()
+        with filename_lock(filename), document_lease(redis_client, filename), _event_slots:
+            # Descartar reentregas de un evento ya procesado antes de cualquier
+            # etapa costosa. El ID del CloudEvent se conserva en las reentregas
+            if is_event_processed(redis_client, event["id"]):
+                logging.info(f"Evento {event['id']} ya procesado para {filename}, se omite")
+                return
+
+            logging.info(f"Procesando evento {event_type} para {filename}")
+
+            if event_type == "google.cloud.storage.object.v1.deleted":
+                document_handlers.handle_document_deletion(event_id, input_bucket, filename)
+            else:
+                # Obtener documento actual para determinar si es creación o actualización
+                doc_data = get_document(redis_client, filename)
+
+                if doc_data:
+                    # Es una actualización
+                    document_handlers.handle_document_update(
+                        event_id=event_id,
+                        input_bucket=input_bucket,
+                        filename=filename,
+                        mime_type=event.data["contentType"],
+                        time_uploaded=datetime.fromisoformat(event.data["timeCreated"]),
+                        existing_doc=doc_data,
+                        file_size=file_size,
+                        content_hash=content_hash,
+                        generation=generation,
+                        object_metadata=object_metadata,
+                    )
+                else:
+                    # Es una creación
+                    document_handlers.handle_document_creation(
+                        event_id=event_id,
+                        input_bucket=input_bucket,
+                        filename=filename,
+                        mime_type=event.data["contentType"],
+                        time_uploaded=datetime.fromisoformat(event.data["timeCreated"]),
+                        file_size=file_size,
+                        content_hash=content_hash,
+                        generation=generation,
+                        object_metadata=object_metadata,
+                    )
+
+            mark_event_processed(redis_client, event["id"])
     except Exception as e:
-        # En caso de error, eliminar la conexión Redis
-        # y registrar el error
-        config.close_services()
+        # Registrar el error y propagarlo para que el evento se reintente (el
+        # disparador debe tener reintentos habilitados): el evento no figura en
+        # el registro de procesados, por lo que la reentrega se procesa completa.
+        # La conexión Redis se conserva: el pool recupera las conexiones caídas
         logging.exception(e, stack_info=True)
+        raise
 
 
 if __name__ == "__main__":
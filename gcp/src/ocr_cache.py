@@ -0,0 +1,148 @@
+"""
+Módulo para la caché de resultados de OCR en Redis.
+El texto de las páginas se direcciona por el hash y el tamaño del contenido del
+archivo que incluye el evento de Cloud Storage, de modo que el mismo contenido
+subido con otro nombre, o vuelto a subir, no se procesa de nuevo con Document AI.
+"""
+
+import hashlib
+import logging
+import uuid
+from typing import Iterable, Iterator, List, Optional
+
+from redis import Redis
+
+import config
+from database_service import decode_value, encode_value
+
+CACHE_PREFIX = "ocr_cache"
+# Versión del formato del texto extraído; se incrementa cuando cambia la
+# extracción (p. ej. el control de calidad local) para no servir texto anterior
+CACHE_VERSION = 1
+# Campo del hash con el número de páginas; su presencia indica una entrada completa
+PAGE_COUNT_FIELD = "page_count"
+# Páginas acumuladas antes de escribirlas en la entrada en construcción
+WRITE_BATCH_PAGES = 32
+
+
+def get_cache_key(content_hash: str, file_size: int, mime_type: str) -> str:
+    """
+    Genera la clave de caché de un archivo. Además del hash del contenido, incluye:
+    - el tamaño, ya que los objetos compuestos solo tienen crc32c (32 bits) y una
+      colisión serviría el texto de otro archivo;
+    - el tipo MIME y la configuración de la extracción local y de la paginación,
+      que deciden qué texto se obtiene;
+    - el procesador de Document AI, ya que otro procesador produce otro texto.
+
+    Args:
+        content_hash: Hash del contenido del archivo (md5Hash o crc32c del evento)
+        file_size: Tamaño del archivo en bytes
+        mime_type: Tipo MIME del documento
+
+    Returns:
+        Clave de Redis para el texto de las páginas
+    """
+    extraction_settings = (
+        f"{config.LOCAL_EXTRACTION_ENABLED}:{config.LOCAL_EXTRACTION_MIN_CHARS_PER_PAGE}:"
+        f"{config.LOCAL_EXTRACTION_MIN_READABLE_RATIO}:{config.LOCAL_PAGE_MAX_CHARS}:"
+        f"{config.LOCAL_EXTRACTION_MAX_BYTES}"
+    )
+    digest = hashlib.sha256(
+        f"v{CACHE_VERSION}:{config.DOCAI_PROCESSOR}:{content_hash}:{file_size}:"
+        f"{mime_type}:{extraction_settings}".encode("utf-8")
+    ).hexdigest()
+    return f"{CACHE_PREFIX}:{digest}"
+
+
+def get_cached_pages(redis_client: Redis, key: str) -> Optional[List[str]]:
+    """
+    Obtiene de la caché el texto de las páginas de un archivo y renueva su TTL.
+
+    Args:
+        redis_client: Cliente de Redis
+        key: Clave de caché del archivo (ver get_cache_key)
+
+    Returns:
+        Lista con el texto de cada página o None si no está en caché
+    """
+    pipeline = redis_client.pipeline(transaction=False)
+    pipeline.hgetall(key)
+    pipeline.expire(key, config.OCR_CACHE_TTL_SECONDS)
+    fields, _ = pipeline.execute()
+
+    page_count = fields.pop(PAGE_COUNT_FIELD.encode("utf-8"), None)
+    if page_count is None:
+        return None
+
+    pages = [decode_value(fields.get(str(i).encode("utf-8"))) for i in range(int(page_count))]
+    if any(page is None for page in pages):
+        logging.warning(f"Entrada de caché de OCR incompleta: {key}")
+        return None
+    return pages
+
+
+def cache_pages(
+    redis_client: Redis, key: str, pages: Iterable[str]
+) -> Iterator[str]:
+    """
+    Devuelve las páginas de un iterable a medida que se leen y las guarda en la caché.
+    Las páginas se escriben por bloques en una clave temporal que se renombra al
+    terminar, por lo que una lectura interrumpida nunca deja una entrada parcial.
+    Un error de Redis desactiva la caché para este archivo sin interrumpir la lectura.
+
+    Args:
+        redis_client: Cliente de Redis
+        key: Clave de caché del archivo (ver get_cache_key)
+        pages: Iterable con el texto de cada página
+
+    Returns:
+        Iterador con el texto de cada página
+    """
+    # Sufijo único para que dos procesamientos simultáneos no mezclen sus páginas
+    partial_key = f"{key}:partial:{uuid.uuid4().hex}"
+    buffer = {}
+    page_count = 0
+    caching = True
+    completed = False
+
+    def write_buffer():
+        nonlocal caching
+        if caching and buffer:
+            try:
+                redis_client.hset(partial_key, mapping=buffer)
+                redis_client.expire(partial_key, config.OCR_CACHE_TTL_SECONDS)
+            except Exception as e:
+                logging.warning(f"No se pudo guardar el OCR en caché: {e}")
+                caching = False
+        buffer.clear()
+
+    try:
+        for page in pages:
+            if caching:
+                buffer[str(page_count)] = encode_value(page)
+                if len(buffer) >= WRITE_BATCH_PAGES:
+                    write_buffer()
+            page_count += 1
+            yield page
+
+        write_buffer()
+        if caching:
+            try:
+                pipeline = redis_client.pipeline(transaction=True)
+                pipeline.hset(partial_key, PAGE_COUNT_FIELD, page_count)
+                pipeline.rename(partial_key, key)
+                pipeline.expire(key, config.OCR_CACHE_TTL_SECONDS)
+                pipeline.execute()
+                completed = True
+                logging.info(f"Resultado de OCR guardado en caché: {page_count} páginas")
+            except Exception as e:
+                logging.warning(f"No se pudo guardar el OCR en caché: {e}")
+    finally:
+        if not completed:
+            try:
+                redis_client.delete(partial_key)
+            except Exception as e:
+                logging.warning(f"No se pudo eliminar la entrada parcial {partial_key}: {e}")
+
+
+print("Caché de OCR cargada")
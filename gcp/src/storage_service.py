@@ -4,22 +4,33 @@ Implementa funciones para obtener metadatos de archivos.
 """
 
 import logging
-from google.cloud import storage
+from typing import Optional
 
+from clients import get_storage_client
 
-def get_blob_metadata(bucket_name: str, filename: str):
+
+def get_blob_metadata(
+    bucket_name: str, filename: str, object_metadata: Optional[dict] = None
+):
     """
     Obtiene los metadatos personalizados de un blob en Cloud Storage.
+    Si se indican los metadatos del objeto incluidos en el evento, se usan
+    directamente sin consultar Cloud Storage.
 
     Args:
         bucket_name: Nombre del bucket
         filename: Nombre del archivo/blob
+        object_metadata: Metadatos personalizados del evento (campo metadata).
+            El evento omite el campo si el objeto no tiene metadatos
 
     Returns:
         Metadatos personalizados o None si no existen
     """
+    if object_metadata is not None:
+        return object_metadata.get("metadata")
+
     try:
-        storage_client = storage.Client()
+        storage_client = get_storage_client()
         bucket = storage_client.bucket(bucket_name)
         blob = bucket.get_blob(filename)
 
@@ -44,7 +55,7 @@ def check_blob_exists(bucket_name: str, filename: str):
         True si el blob existe, False en caso contrario
     """
     try:
-        storage_client = storage.Client()
+        storage_client = get_storage_client()
         bucket = storage_client.bucket(bucket_name)
         blob = bucket.blob(filename)
 
@@ -66,7 +77,7 @@ def list_folder_contents(bucket_name: str, folder_prefix: str):
         Lista de nombres de archivos
     """
     try:
-        storage_client = storage.Client()
+        storage_client = get_storage_client()
         blobs = storage_client.list_blobs(bucket_name, prefix=folder_prefix)
 
         # Filtrar carpetas virtuales (terminan en /)
@@ -0,0 +1,301 @@
+"""
+Módulo con extractores locales de texto para formatos que no requieren OCR.
+Cada extractor recibe el contenido del archivo y devuelve el texto de cada página,
+igual que Document AI. Si el formato no está registrado o el texto no supera el
+control de calidad, se usa Document AI.
+"""
+
+import io
+import logging
+import re
+import zipfile
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+from xml.etree import ElementTree
+
+from pypdf import PdfReader
+
+import config
+
+DOCX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# Registro {tipo MIME: extractor}
+_extractors: Dict[str, Callable[[bytes], Iterable[str]]] = {}
+# Tipos MIME con paginación propia, cuyas páginas pueden ser imágenes sin texto
+_paged_mime_types: Set[str] = set()
+
+
+def register_extractor(*mime_types: str, paged: bool = False):
+    """
+    Decorador que registra un extractor local para uno o varios tipos MIME.
+
+    Args:
+        *mime_types: Tipos MIME que maneja el extractor
+        paged: Si el formato tiene paginación propia (p. ej. PDF). Sus páginas se
+            someten a los controles por página; el resto se pagina con paginate().
+            Los extractores paginados pueden devolver un iterador: la extracción
+            se detiene en la primera página sin texto
+
+    Returns:
+        Decorador que devuelve la función sin modificar
+    """
+
+    def decorator(function: Callable[[bytes], Iterable[str]]):
+        for mime_type in mime_types:
+            _extractors[mime_type] = function
+            if paged:
+                _paged_mime_types.add(mime_type)
+        return function
+
+    return decorator
+
+
+def _normalize_mime_type(mime_type: str) -> str:
+    """Elimina los parámetros (p. ej. charset) de un tipo MIME."""
+    return mime_type.split(";")[0].strip().lower()
+
+
+def get_extractor(mime_type: str) -> Optional[Callable[[bytes], Iterable[str]]]:
+    """
+    Obtiene el extractor local registrado para un tipo MIME.
+
+    Args:
+        mime_type: Tipo MIME del documento (se ignoran parámetros como charset)
+
+    Returns:
+        Extractor o None si el tipo no tiene extractor local
+    """
+    return _extractors.get(_normalize_mime_type(mime_type))
+
+
+def extract_pages(content: bytes, mime_type: str) -> Optional[List[str]]:
+    """
+    Extrae localmente el texto de cada página de un documento.
+
+    Args:
+        content: Contenido del archivo
+        mime_type: Tipo MIME del documento
+
+    Returns:
+        Lista con el texto de cada página, o None si se debe usar Document AI
+    """
+    extractor = get_extractor(mime_type)
+    if extractor is None:
+        return None
+
+    paged = _normalize_mime_type(mime_type) in _paged_mime_types
+    pages = []
+    try:
+        for page in extractor(content):
+            # Una página sin texto descarta la extracción: no se extraen las
+            # siguientes, ya que el documento se procesará con Document AI
+            if paged and not page.strip():
+                logging.info(f"Extracción local descartada: página {len(pages)} sin texto")
+                return None
+            pages.append(page)
+    except Exception as e:
+        logging.warning(f"Error en la extracción local de {mime_type}: {e}")
+        return None
+
+    if not passes_quality_check(pages, paged):
+        return None
+    return pages
+
+
+def passes_quality_check(pages: List[str], paged: bool = False) -> bool:
+    """
+    Comprueba que el texto extraído localmente sea utilizable: una proporción alta
+    de caracteres legibles (descarta codificaciones rotas) y, en los formatos con
+    paginación propia, que todas las páginas tengan capa de texto y suficientes
+    caracteres por página. Una página sin texto en un PDF suele ser una imagen
+    escaneada, cuyo texto solo obtiene Document AI. En los demás formatos no se
+    exige un mínimo por página: un archivo corto es válido y Document AI no
+    acepta esos tipos MIME.
+
+    Args:
+        pages: Texto de cada página
+        paged: Si el formato tiene paginación propia (p. ej. PDF)
+
+    Returns:
+        True si el texto supera el control de calidad
+    """
+    if not pages:
+        return False
+
+    if paged:
+        empty_pages = sum(1 for page in pages if not page.strip())
+        if empty_pages:
+            logging.info(
+                f"Extracción local descartada: {empty_pages} de {len(pages)} páginas sin texto"
+            )
+            return False
+
+        chars = len("".join(pages).strip())
+        if chars / len(pages) < config.LOCAL_EXTRACTION_MIN_CHARS_PER_PAGE:
+            logging.info(
+                f"Extracción local descartada: {chars} caracteres en {len(pages)} páginas"
+            )
+            return False
+
+    text = "".join(pages)
+    if not text.strip():
+        return False
+
+    readable = sum(1 for char in text if char.isprintable() or char in "\n\t")
+    readable -= text.count("�")
+    if readable / len(text) < config.LOCAL_EXTRACTION_MIN_READABLE_RATIO:
+        logging.info(
+            f"Extracción local descartada: {readable / len(text):.0%} de caracteres legibles"
+        )
+        return False
+    return True
+
+
+def paginate(text: str, max_chars: Optional[int] = None) -> List[str]:
+    """
+    Divide un texto sin paginación propia en páginas de hasta max_chars caracteres,
+    cortando en saltos de línea. Los saltos de página (\\f) siempre inician una página.
+
+    Args:
+        text: Texto completo
+        max_chars: Caracteres máximos por página (default: LOCAL_PAGE_MAX_CHARS)
+
+    Returns:
+        Lista con el texto de cada página
+    """
+    if max_chars is None:
+        max_chars = config.LOCAL_PAGE_MAX_CHARS
+
+    pages = []
+    for section in text.split("\f"):
+        current = []
+        current_chars = 0
+        for line in section.splitlines(keepends=True):
+            if current and current_chars + len(line) > max_chars:
+                pages.append("".join(current).strip())
+                current = []
+                current_chars = 0
+            current.append(line)
+            current_chars += len(line)
+        if current:
+            pages.append("".join(current).strip())
+    return [page for page in pages if page]
+
+
+def _decode_text(content: bytes) -> str:
+    """Decodifica texto en UTF-8 (con o sin BOM) o, si falla, en Latin-1."""
+    try:
+        return content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return content.decode("latin-1")
+
+
+@register_extractor("text/plain", "text/markdown", "text/csv")
+def extract_plain_text(content: bytes) -> List[str]:
+    """Extrae el texto de un archivo de texto plano."""
+    return paginate(_decode_text(content))
+
+
+class _HTMLTextParser(HTMLParser):
+    """Parser que conserva el texto visible de un HTML con saltos en los bloques."""
+
+    SKIPPED_TAGS = {"script", "style", "head", "noscript", "template"}
+    BLOCK_TAGS = {
+        "p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6",
+        "section", "article", "table", "ul", "ol", "pre", "blockquote",
+    }
+
+    def __init__(self):
+        super().__init__()
+        self.parts: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+
+@register_extractor("text/html", "application/xhtml+xml")
+def extract_html(content: bytes) -> List[str]:
+    """Extrae el texto visible de un documento HTML."""
+    parser = _HTMLTextParser()
+    parser.feed(_decode_text(content))
+    parser.close()
+    text = "".join(parser.parts)
+    # Normalizar espacios y líneas vacías consecutivas
+    text = re.sub(r"[ \t\r]+", " ", text)
+    text = re.sub(r"\n\s*\n+", "\n\n", text)
+    return paginate(text)
+
+
+@register_extractor(DOCX_MIME_TYPE)
+def extract_docx(content: bytes) -> List[str]:
+    """
+    Extrae el texto de un documento DOCX a partir de word/document.xml.
+    Los saltos de página explícitos separan páginas; si no hay, se pagina por tamaño.
+    """
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+
+    sections = [[]]
+    for paragraph in root.iter(f"{WORD_NAMESPACE}p"):
+        parts = []
+        for element in paragraph.iter():
+            if element.tag == f"{WORD_NAMESPACE}t" and element.text:
+                parts.append(element.text)
+            elif element.tag == f"{WORD_NAMESPACE}tab":
+                parts.append("\t")
+            elif (
+                element.tag == f"{WORD_NAMESPACE}br"
+                and element.get(f"{WORD_NAMESPACE}type") == "page"
+            ):
+                sections[-1].append("".join(parts))
+                parts = []
+                sections.append([])
+        sections[-1].append("".join(parts))
+
+    return paginate("\f".join("\n".join(section) for section in sections))
+
+
+@register_extractor("application/pdf", paged=True)
+def extract_pdf(content: bytes) -> Iterator[str]:
+    """
+    Extrae página a página la capa de texto de un PDF con pypdf.
+    Los PDF escaneados no tienen capa de texto y no superan el control de calidad.
+    """
+    reader = PdfReader(io.BytesIO(content))
+    for page in reader.pages:
+        yield (page.extract_text() or "").strip()
+
+
+def count_pdf_pages(content: bytes) -> Optional[int]:
+    """
+    Cuenta las páginas de un PDF con pypdf, sin extraer texto.
+
+    Args:
+        content: Contenido del PDF
+
+    Returns:
+        Número de páginas, o None si el PDF no se puede leer
+    """
+    try:
+        return len(PdfReader(io.BytesIO(content)).pages)
+    except Exception as e:
+        logging.warning(f"No se pudo contar las páginas del PDF: {e}")
+        return None
+
+
+print("Extractores locales de texto cargados")
@@ -0,0 +1,80 @@
+"""
+Módulo para estimar el número de tokens de un texto sin tokenizador.
+Lo usan el fragmentador de páginas y el servicio de IA, de modo que el tamaño de
+los fragmentos y los límites de las solicitudes a OpenAI se calculan igual.
+"""
+
+import re
+from typing import List
+
+# Caracteres fuera del alfabeto latino (cirílico, árabe, CJK, símbolos...)
+_NON_LATIN_PATTERN = re.compile(r"[^\u0000-\u024f]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estima de forma conservadora el número de tokens de un texto.
+
+    Para el alfabeto latino se asume un promedio de 3 caracteres por token, por
+    debajo de los ~4 habituales en español, para no superar los límites del modelo
+    con texto OCR denso. El resto de caracteres cuenta como un token cada uno, ya
+    que en otros alfabetos un carácter suele ocupar uno o más tokens.
+
+    Args:
+        text: Texto a evaluar
+
+    Returns:
+        Número estimado de tokens
+    """
+    non_latin = len(_NON_LATIN_PATTERN.findall(text))
+    return (len(text) - non_latin) // 3 + non_latin + 1
+
+
+def token_prefix_length(text: str, max_tokens: int) -> int:
+    """
+    Calcula la longitud del prefijo más largo de un texto que no supera
+    max_tokens tokens estimados.
+
+    Args:
+        text: Texto a evaluar
+        max_tokens: Máximo de tokens estimados
+
+    Returns:
+        Número de caracteres del prefijo (al menos 1 si el texto no está vacío)
+    """
+    # Cada carácter cuenta al menos 1/3 de token, por lo que el prefijo no supera
+    # 3 * max_tokens caracteres; solo se evalúa esa parte del texto
+    text = text[: max(1, 3 * max_tokens)]
+    if estimate_tokens(text) <= max_tokens:
+        return len(text)
+    low, high = 1, len(text) - 1
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """
+    Divide un texto en partes consecutivas de hasta max_tokens tokens estimados.
+
+    Args:
+        text: Texto a dividir
+        max_tokens: Máximo de tokens estimados por parte
+
+    Returns:
+        Lista de partes (una parte vacía si el texto está vacío)
+    """
+    parts = []
+    while True:
+        length = token_prefix_length(text, max_tokens)
+        parts.append(text[:length])
+        text = text[length:]
+        if not text:
+            return parts
+
+
+print("Estimador de tokens cargado")
@@ -5,36 +5,38 @@ Implementa funciones para indexar y buscar embeddings de documentos.
 import logging
 import numpy as np
 import os
-from typing import Dict, List, Any, Optional, Tuple
+import re
+import threading
+from typing import Callable, Dict, List, Any, Optional, Tuple
 import uuid
 
+from redisvl.exceptions import RedisSearchError
 from redisvl.index import SearchIndex
 from redisvl.query import VectorQuery
 from redis import Redis
+from redis.exceptions import ResponseError
+from redis.commands.search.field import NumericField
+from redis.commands.search.query import Query
 
 # Importar cliente desde config
 import config
+from config import get_redis_client
+from chunker import Chunk
+from document_locks import ensure_lease
 
 # Configuración
 VECTOR_DIMS = 1536  # Dimensiones para text-embedding-3-small
 DEFAULT_PREFIX = "docs"
+# Resultados por página al consultar el índice con FT.SEARCH
+SEARCH_PAGE_SIZE = 1000
+# Claves por comando DEL al eliminar datapoints
+DELETE_BATCH_SIZE = 500
+# Campos de posición de los fragmentos, añadidos con FT.ALTER a los índices anteriores
+CHUNK_FIELDS = ["chunk", "char_start", "char_end"]
 
-
-def get_redis_client():
-    """
-    Obtiene el cliente Redis desde el módulo config.
-    Si el cliente de config no está inicializado, lo inicializa.
-
-    Returns:
-        Cliente Redis
-    """
-    if config.REDIS_CLIENT is None:
-        # Si el cliente no está inicializado, intentamos inicializarlo
-        config.initialize_services()
-        if config.REDIS_CLIENT is None:
-            # Si sigue siendo None, lanzamos un error más explicativo
-            raise RuntimeError("No se pudo inicializar el cliente Redis. Verifique la configuración y conexión.")
-    return config.REDIS_CLIENT
+# Registro de índices del proceso: cada índice se valida o crea una sola vez
+_index_registry: Dict[str, SearchIndex] = {}
+_index_registry_lock = threading.Lock()
 
 
 def get_index_schema(index_name: str, prefix: str = DEFAULT_PREFIX, vector_dims: int = VECTOR_DIMS):
@@ -58,6 +60,9 @@ def get_index_schema(index_name: str, prefix: str = DEFAULT_PREFIX, vector_dims:
         "fields": [
             {"name": "filename", "type": "tag"},
             {"name": "page", "type": "numeric"},
+            {"name": "chunk", "type": "numeric"},
+            {"name": "char_start", "type": "numeric"},
+            {"name": "char_end", "type": "numeric"},
             {"name": "content", "type": "text"},
             {
                 "name": "embedding",
@@ -88,21 +93,97 @@ def create_index_if_not_exists(index_name: str):
     client = get_redis_client()
     schema = get_index_schema(index_name)
     
-    # Usar el cliente directamente
-    index = SearchIndex.from_dict(schema, client=client)
+    # Usar el cliente compartido; sin redis_client, redisvl abriría su propia
+    # conexión a partir de REDIS_URL, fuera del pool del proceso
+    index = SearchIndex.from_dict(schema, redis_client=client)
     
     try:
         # Verificar si el índice ya existe
         info = index.info()
-        logging.info(f"Índice {index_name} ya existe: {info}")
+        logging.info(f"Índice {index_name} ya existe ({info.get('num_docs')} documentos)")
+        logging.debug(f"Información del índice {index_name}: {info}")
     except Exception as e:
         # Crear el índice si no existe
         logging.info(f"Creando índice {index_name}: {e}")
         index.create()
-        
+        return index
+
+    # Añadir los campos de fragmento a los índices creados antes de la fragmentación
+    missing_fields = [
+        field for field in CHUNK_FIELDS if field not in _get_index_fields(info)
+    ]
+    if missing_fields:
+        logging.info(f"Añadiendo campos {missing_fields} al índice {index_name}")
+        client.ft(index_name).alter_schema_add(
+            [NumericField(field) for field in missing_fields]
+        )
+
     return index
 
 
+def _get_index_fields(info: Dict[str, Any]) -> List[str]:
+    """
+    Obtiene los nombres de los campos de un índice a partir de la respuesta de FT.INFO.
+
+    Args:
+        info: Respuesta de FT.INFO
+
+    Returns:
+        Lista de nombres de campos
+    """
+    fields = []
+    for attribute in info.get("attributes", []):
+        values = [
+            value.decode("utf-8") if isinstance(value, bytes) else value
+            for value in attribute
+        ]
+        if "attribute" in values:
+            fields.append(values[values.index("attribute") + 1])
+    return fields
+
+
+def get_index(index_name: str, refresh: bool = False) -> SearchIndex:
+    """
+    Obtiene el índice desde el registro del proceso.
+    El índice se valida o crea solo la primera vez, cuando se solicita
+    explícitamente con refresh o cuando cambió el cliente Redis compartido.
+
+    Args:
+        index_name: Nombre del índice
+        refresh: Si es True, vuelve a validar el índice contra Redis
+
+    Returns:
+        Objeto de índice
+    """
+    client = get_redis_client()
+    with _index_registry_lock:
+        index = _index_registry.get(index_name)
+        if index is None or refresh or index.client is not client:
+            index = create_index_if_not_exists(index_name)
+            _index_registry[index_name] = index
+        return index
+
+
+def _run_with_index(index_name: str, operation: Callable[[SearchIndex], Any]) -> Any:
+    """
+    Ejecuta una operación sobre el índice registrado.
+    Si Redis responde con un error (p. ej. el índice fue eliminado), se vuelve a
+    validar el índice y se reintenta la operación una vez.
+
+    Args:
+        index_name: Nombre del índice
+        operation: Función que recibe el índice
+
+    Returns:
+        Resultado de la operación
+    """
+    try:
+        return operation(get_index(index_name))
+    except (ResponseError, RedisSearchError) as e:
+        logging.warning(f"Error en el índice {index_name}, revalidando: {e}")
+        return operation(get_index(index_name, refresh=True))
+
+
 def vector_to_bytes(vector):
     """
     Convierte un vector numpy a bytes para almacenamiento.
@@ -116,78 +197,315 @@ def vector_to_bytes(vector):
     return np.array(vector, dtype=np.float32).tobytes()
 
 
-def index_pages(index_name: str, filename: str, pages: List[str], embeddings: List[Any]):
+def get_page_key(filename: str, page: int, prefix: str = DEFAULT_PREFIX) -> str:
     """
-    Indexa las páginas de un documento en Redis Vector Search.
+    Genera la clave determinista de la entrada de una página completa en el índice,
+    el formato anterior a la fragmentación.
+
+    Args:
+        filename: Nombre del archivo
+        page: Número de página
+        prefix: Prefijo de las claves del índice
+
+    Returns:
+        Clave de Redis con el formato {prefix}:{filename}:{page}
+    """
+    return f"{prefix}:{filename}:{page}"
+
+
+def get_chunk_key(
+    filename: str, page: int, chunk: int, prefix: str = DEFAULT_PREFIX
+) -> str:
+    """
+    Genera la clave determinista de la entrada de un fragmento en el índice.
+
+    Args:
+        filename: Nombre del archivo
+        page: Número de página
+        chunk: Número de fragmento dentro de la página
+        prefix: Prefijo de las claves del índice
+
+    Returns:
+        Clave de Redis con el formato {prefix}:{filename}:{page}:{chunk}
+    """
+    return f"{prefix}:{filename}:{page}:{chunk}"
+
+
+def index_chunks(
+    index_name: str,
+    filename: str,
+    chunks: List[Chunk],
+    embeddings: List[Any],
+):
+    """
+    Indexa los fragmentos de un documento en Redis Vector Search.
+    Los fragmentos sin embedding (vector vacío, p. ej. de un texto vacío) no se
+    indexan, para no contaminar los resultados KNN.
 
     Args:
         index_name: Nombre del índice
         filename: Nombre del archivo
-        pages: Lista de textos de páginas
-        embeddings: Lista de embeddings correspondientes a cada página
+        chunks: Lista de fragmentos
+        embeddings: Lista de embeddings correspondientes a cada fragmento
+
+    Returns:
+        Lista de claves indexadas
     """
-    # Crear o obtener índice usando el cliente de config
-    index = create_index_if_not_exists(index_name)
-    
+    # Obtener el índice desde el registro del proceso
+    index = get_index(index_name)
+
     # Preparar datos para indexación
     documents = []
-    for page_num, (page_text, embedding) in enumerate(zip(pages, embeddings)):
+    document_keys = []
+    for chunk, embedding in zip(chunks, embeddings):
+        if not any(embedding):
+            logging.warning(
+                f"Fragmento {chunk.chunk} de la página {chunk.page} de {filename} "
+                f"sin embedding, no se indexa"
+            )
+            continue
+
+        # El texto se guarda siempre sin comprimir: content es un campo de texto
+        # indexado que leen también otros clientes (API de recuperación, FT.SEARCH)
         document = {
             "filename": filename,
-            "page": page_num,
-            "content": page_text,
+            "page": chunk.page,
+            "chunk": chunk.chunk,
+            "char_start": chunk.char_start,
+            "char_end": chunk.char_end,
+            "content": chunk.text,
             "embedding": vector_to_bytes(embedding),
         }
         documents.append(document)
-    
-    # Cargar documentos en el índice
-    keys = index.load(documents)
-    logging.info(f"Indexadas {len(keys)} páginas del documento {filename}")
-    
+        document_keys.append(
+            get_chunk_key(filename, chunk.page, chunk.chunk, index.prefix)
+        )
+
+    if not documents:
+        return []
+
+    ensure_lease(filename)
+    # Cargar documentos en el índice con claves deterministas, de modo que
+    # reprocesar una página sobrescribe sus entradas en lugar de duplicarlas
+    keys = index.load(documents, keys=document_keys)
+    logging.info(f"Indexados {len(keys)} fragmentos del documento {filename}")
+
     return keys
 
 
+def _escape_tag_value(value: str) -> str:
+    """
+    Escapa los caracteres especiales de un valor para usarlo en un filtro TAG.
+
+    Args:
+        value: Valor a escapar
+
+    Returns:
+        Valor escapado
+    """
+    return re.sub(r"([,.<>{}\[\]\\\"':;!@#$%^&*()\-+=~/| ])", r"\\\1", value)
+
+
+def _get_filename_query(filename: str) -> str:
+    """
+    Construye la consulta FT.SEARCH que preselecciona las entradas de un documento.
+    El campo TAG filename usa las opciones por defecto: no distingue mayúsculas y
+    separa los valores por comas, por lo que un nombre con comas se indexa como
+    varias etiquetas. Se consulta la parte más larga del nombre y los resultados
+    se filtran después por el nombre exacto.
+
+    Args:
+        filename: Nombre del archivo
+
+    Returns:
+        Consulta FT.SEARCH
+    """
+    parts = [part.strip() for part in filename.split(",") if part.strip()]
+    if not parts:
+        return "*"
+    return f"@filename:{{{_escape_tag_value(max(parts, key=len))}}}"
+
+
+def get_indexed_pages(index_name: str, filename: str) -> Dict[str, int]:
+    """
+    Obtiene las claves del índice que pertenecen a un documento y su número de página.
+    Utiliza FT.SEARCH sobre el campo TAG filename, devolviendo los campos filename
+    y page, y conserva solo las entradas cuyo nombre coincide exactamente (la
+    consulta TAG no distingue mayúsculas ni admite comas en el valor).
+
+    Args:
+        index_name: Nombre del índice
+        filename: Nombre del archivo
+
+    Returns:
+        Diccionario {clave: número de página}
+    """
+    query_string = _get_filename_query(filename)
+
+    def collect_keys(index: SearchIndex) -> Dict[str, int]:
+        keys = {}
+        offset = 0
+        while True:
+            query = (
+                Query(query_string)
+                .return_fields("filename", "page")
+                .paging(offset, SEARCH_PAGE_SIZE)
+            )
+            results = index.search(query)
+            for doc in results.docs:
+                if getattr(doc, "filename", None) == filename:
+                    keys[doc.id] = int(doc.page)
+
+            offset += SEARCH_PAGE_SIZE
+            if offset >= results.total:
+                break
+        return keys
+
+    keys = _run_with_index(index_name, collect_keys)
+    return keys
+
+
+def _delete_keys(keys: List[str]):
+    """
+    Elimina claves de Redis en lotes enviados por un único pipeline.
+
+    Args:
+        keys: Claves a eliminar
+    """
+    pipeline = get_redis_client().pipeline(transaction=False)
+    for i in range(0, len(keys), DELETE_BATCH_SIZE):
+        pipeline.delete(*keys[i : i + DELETE_BATCH_SIZE])
+    pipeline.execute()
+
+
+def remove_pages(
+    index_name: str,
+    filename: str,
+    page_numbers: List[int],
+    indexed_pages: Optional[Dict[str, int]] = None,
+) -> int:
+    """
+    Elimina del índice las entradas de páginas concretas de un documento.
+
+    Args:
+        index_name: Nombre del índice
+        filename: Nombre del archivo
+        page_numbers: Números de página a eliminar
+        indexed_pages: Resultado previo de get_indexed_pages. Si es None, se consulta el índice
+
+    Returns:
+        Número de entradas eliminadas
+    """
+    page_set = set(page_numbers)
+    if not page_set:
+        return 0
+
+    if indexed_pages is None:
+        indexed_pages = get_indexed_pages(index_name, filename)
+
+    keys_to_delete = [
+        key for key, page in indexed_pages.items() if page in page_set
+    ]
+    if keys_to_delete:
+        ensure_lease(filename)
+        _delete_keys(keys_to_delete)
+        logging.info(
+            f"Eliminadas {len(keys_to_delete)} entradas de {len(page_set)} páginas para {filename}"
+        )
+
+    return len(keys_to_delete)
+
+
 def remove_datapoints(index_name: str, filename: str, page_count: int):
     """
     Elimina los datapoints de un documento del índice.
+    Las claves de página completa se eliminan directamente; después se consulta el
+    índice con FT.SEARCH sobre el campo filename para eliminar los fragmentos y las
+    entradas restantes (claves aleatorias anteriores a la migración o páginas fuera de rango).
 
     Args:
         index_name: Nombre del índice
         filename: Nombre del archivo
         page_count: Número de páginas a eliminar
     """
-    # Crear o obtener índice usando el cliente de config
-    index = create_index_if_not_exists(index_name)
-    
-    # Obtener el cliente Redis desde config
+    ensure_lease(filename)
+    index = get_index(index_name)
+    page_keys = [get_page_key(filename, page, index.prefix) for page in range(page_count)]
+    if page_keys:
+        _delete_keys(page_keys)
+
+    # Fragmentos de cada página y entradas con claves anteriores
+    remaining_keys = list(get_indexed_pages(index_name, filename))
+    if remaining_keys:
+        _delete_keys(remaining_keys)
+
+    logging.info(
+        f"Eliminadas {page_count} claves de página y {len(remaining_keys)} fragmentos "
+        f"y datapoints adicionales para {filename}"
+    )
+
+
+def migrate_vector_keys(index_name: str, batch_size: int = 500) -> Dict[str, int]:
+    """
+    Migra las entradas del índice con claves aleatorias al formato determinista
+    {prefix}:{filename}:{page}. Si ya existe una entrada con la clave determinista,
+    la entrada antigua se considera un duplicado y se elimina. Las entradas de
+    fragmentos ya tienen claves deterministas y no se modifican; las de página
+    completa se reemplazan por fragmentos en la siguiente actualización del documento.
+
+    Args:
+        index_name: Nombre del índice
+        batch_size: Número de claves procesadas por pipeline
+
+    Returns:
+        Contadores de claves renombradas, duplicadas eliminadas y ya migradas
+    """
+    index = get_index(index_name)
     client = get_redis_client()
-    
-    # Obtener el prefijo desde el esquema del índice
-    schema_dict = index.schema.to_dict()
-    prefix = schema_dict["index"]["prefix"] if "prefix" in schema_dict.get("index", {}) else DEFAULT_PREFIX
-    
-    # Buscar y eliminar todas las páginas del documento
-    pattern = f"{prefix}:*"
-    keys_to_delete = []
-    
-    for key in client.scan_iter(match=pattern):
-        key_str = key.decode('utf-8')
-        # Obtener los metadatos para verificar el filename
-        try:
-            metadata = client.hgetall(key)
-            if not metadata:
+    stats = {"renamed": 0, "duplicates_removed": 0, "already_migrated": 0}
+
+    def migrate_batch(keys):
+        pipeline = client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.hmget(key, "filename", "page", "chunk")
+        fields = pipeline.execute()
+
+        renames = []
+        pipeline = client.pipeline(transaction=False)
+        for key, (filename, page, chunk) in zip(keys, fields):
+            if filename is None or page is None:
                 continue
-                
-            # Verificar si la clave pertenece al documento que queremos eliminar
-            if b'filename' in metadata and metadata[b'filename'].decode('utf-8') == filename:
-                keys_to_delete.append(key)
-        except Exception as e:
-            logging.error(f"Error al procesar clave {key}: {e}")
-    
-    # Eliminar las claves encontradas
-    if keys_to_delete:
-        client.delete(*keys_to_delete)
-        logging.info(f"Eliminadas {len(keys_to_delete)} datapoints para {filename}")
+            if chunk is not None:
+                new_key = get_chunk_key(
+                    filename.decode("utf-8"), int(page), int(chunk), index.prefix
+                )
+            else:
+                new_key = get_page_key(filename.decode("utf-8"), int(page), index.prefix)
+            if key.decode("utf-8") == new_key:
+                stats["already_migrated"] += 1
+                continue
+            pipeline.renamenx(key, new_key)
+            renames.append(key)
+        results = pipeline.execute()
+
+        # Si la clave determinista ya existía, la entrada antigua es un duplicado
+        duplicates = [key for key, renamed in zip(renames, results) if not renamed]
+        if duplicates:
+            client.delete(*duplicates)
+        stats["renamed"] += len(renames) - len(duplicates)
+        stats["duplicates_removed"] += len(duplicates)
+
+    batch = []
+    for key in client.scan_iter(match=f"{index.prefix}:*", count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            migrate_batch(batch)
+            batch = []
+    if batch:
+        migrate_batch(batch)
+
+    logging.info(f"Migración de claves del índice {index_name}: {stats}")
+    return stats
 
 
 def search_similar_content(index_name: str, query_vector: Any, num_results: int = 5):
@@ -202,20 +520,19 @@ def search_similar_content(index_name: str, query_vector: Any, num_results: int
     Returns:
         Lista de resultados similares
     """
-    # Crear o obtener índice usando el cliente de config
-    index = create_index_if_not_exists(index_name)
-    
     # Crear consulta vectorial
     query = VectorQuery(
         vector=query_vector if not hasattr(query_vector, 'values') else query_vector.values,
         vector_field_name="embedding",
-        return_fields=["filename", "page", "content", "vector_distance"],
+        return_fields=[
+            "filename", "page", "chunk", "char_start", "char_end", "content", "vector_distance"
+        ],
         num_results=num_results,
     )
     
-    # Ejecutar búsqueda
-    results = index.query(query)
-    
+    # Ejecutar búsqueda sobre el índice registrado
+    results = _run_with_index(index_name, lambda index: index.query(query))
+
     return results
 
 
@@ -0,0 +1,28 @@
+"""Configuración común de las pruebas: los módulos de la función están en src/."""
+
+import os
+import sys
+
+import fakeredis
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+
+class LeaseRedis(fakeredis.FakeRedis):
+    """FakeRedis con los scripts de renovación y liberación del lease emulados en Python."""
+
+    def register_script(self, script):
+        def run(keys, args):
+            if self.get(keys[0]) != args[0].encode("utf-8"):
+                return 0
+            if "pexpire" in script:
+                return self.pexpire(keys[0], int(args[1]))
+            return self.delete(keys[0])
+
+        return run
+
+
+@pytest.fixture
+def lease_redis():
+    return LeaseRedis()
@@ -0,0 +1,86 @@
+"""Pruebas de la estimación de tokens y los lotes de embeddings de ai_service."""
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+# El cliente de OpenAI se crea al importar el módulo y exige una clave
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import ai_service
+
+
+def test_estimate_tokens_counts_non_latin_characters_individually():
+    assert ai_service.estimate_tokens("a" * 30) == 11
+    assert ai_service.estimate_tokens("ñandú " * 5) == 11
+    assert ai_service.estimate_tokens("文" * 30) == 31
+
+
+def test_split_into_chunks_respects_limit_for_non_latin_text():
+    chunks = ai_service.split_into_chunks(["文" * 250], 100)
+
+    assert "".join(chunks) == "文" * 250
+    assert all(ai_service.estimate_tokens(chunk) <= 100 for chunk in chunks)
+
+
+def test_embedding_inputs_are_truncated_to_model_limit(monkeypatch):
+    monkeypatch.setattr(ai_service, "EMBEDDING_INPUT_MAX_TOKENS", 100)
+    monkeypatch.setattr(ai_service, "OPENAI_ASYNC", False)
+    sent = []
+
+    def embed_batch(batch_number, texts, cancel_event=None):
+        sent.extend(texts)
+        return [[1.0] for _ in texts]
+
+    monkeypatch.setattr(ai_service, "_embed_batch", embed_batch)
+
+    embeddings = ai_service._generate_embeddings(["a" * 1000, "文" * 1000, "corto"])
+
+    assert embeddings == [[1.0], [1.0], [1.0]]
+    assert sent[2] == "corto"
+    assert sent[0] == "a" * len(sent[0]) and len(sent[0]) < 1000
+    assert all(ai_service.estimate_tokens(text) <= 100 for text in sent)
+
+
+@pytest.mark.parametrize("text", ["", "a", "a" * 299, "文" * 99])
+def test_short_inputs_are_not_truncated(text):
+    assert ai_service._truncate_embedding_input(text) == text
+
+
+class FakeEmbeddings:
+    """API de embeddings que rechaza las solicitudes que incluyen un texto concreto."""
+
+    def __init__(self, invalid_text):
+        self.invalid_text = invalid_text
+        self.requests = []
+
+    def create(self, model, input, dimensions):
+        self.requests.append(list(input))
+        if self.invalid_text in input:
+            raise ValueError("Entrada inválida")
+        return SimpleNamespace(
+            data=[
+                SimpleNamespace(index=i, embedding=[float(len(text))])
+                for i, text in enumerate(input)
+            ],
+            usage=SimpleNamespace(total_tokens=len(input)),
+        )
+
+
+def test_failed_page_raises_instead_of_empty_vector(monkeypatch):
+    embeddings = FakeEmbeddings("inválido")
+    monkeypatch.setattr(ai_service, "client", SimpleNamespace(embeddings=embeddings))
+
+    with pytest.raises(ValueError):
+        ai_service._embed_batch(0, ["uno", "inválido", "tres"])
+
+    # El lote se reintenta página por página hasta aislar la entrada inválida
+    assert embeddings.requests == [["uno", "inválido", "tres"], ["uno"], ["inválido"]]
+
+
+def test_batch_without_failures_returns_embeddings(monkeypatch):
+    embeddings = FakeEmbeddings("inválido")
+    monkeypatch.setattr(ai_service, "client", SimpleNamespace(embeddings=embeddings))
+
+    assert ai_service._embed_batch(0, ["uno", "dos"]) == [[3.0], [3.0]]
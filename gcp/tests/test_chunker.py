@@ -0,0 +1,68 @@
+"""Pruebas de la fragmentación de páginas."""
+
+from chunker import chunk_page, chunk_pages
+from token_estimator import estimate_tokens
+
+SENTENCE = "Las anulaciones se solicitan desde la gestión externa. "
+
+
+def test_empty_pages_have_no_chunks():
+    assert chunk_page(0, "", 100, 10) == []
+    assert chunk_page(0, " \n\t ", 100, 10) == []
+    chunks = chunk_pages(["", SENTENCE, "   "], max_tokens=100, overlap_tokens=10)
+    assert [(chunk.page, chunk.chunk) for chunk in chunks] == [(1, 0)]
+
+
+def test_short_page_is_a_single_chunk():
+    chunks = chunk_page(3, SENTENCE, 100, 10)
+
+    assert len(chunks) == 1
+    assert chunks[0].page == 3
+    assert (chunks[0].char_start, chunks[0].char_end) == (0, len(SENTENCE))
+    assert chunks[0].text == SENTENCE
+
+
+def test_chunks_respect_token_limit_and_positions():
+    text = SENTENCE * 40
+    chunks = chunk_page(0, text, 50, 10)
+
+    assert len(chunks) > 1
+    assert [chunk.chunk for chunk in chunks] == list(range(len(chunks)))
+    assert chunks[0].char_start == 0
+    assert chunks[-1].char_end == len(text)
+    for chunk in chunks:
+        assert chunk.text == text[chunk.char_start : chunk.char_end]
+        assert estimate_tokens(chunk.text) <= 50
+
+
+def test_chunks_break_at_sentence_boundaries():
+    chunks = chunk_page(0, SENTENCE * 40, 50, 10)
+
+    for chunk in chunks[:-1]:
+        assert chunk.text.endswith(". ")
+
+
+def test_consecutive_chunks_overlap():
+    chunks = chunk_page(0, SENTENCE * 40, 50, 10)
+
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.char_start < previous.char_end
+        overlap = previous.text[current.char_start - previous.char_start :]
+        assert estimate_tokens(overlap) <= 10
+        # El solapamiento empieza en un límite de palabra
+        assert previous.text[current.char_start - previous.char_start - 1] == " "
+
+
+def test_no_overlap_when_disabled():
+    chunks = chunk_page(0, SENTENCE * 40, 50, 0)
+
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.char_start == previous.char_end
+
+
+def test_non_latin_chunks_respect_token_limit():
+    text = "文字" * 500
+    chunks = chunk_page(0, text, 100, 10)
+
+    assert "".join(chunk.text for chunk in chunk_page(0, text, 100, 0)) == text
+    assert all(estimate_tokens(chunk.text) <= 100 for chunk in chunks)
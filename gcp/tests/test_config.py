@@ -0,0 +1,63 @@
+"""Pruebas del circuit breaker de Redis de config."""
+
+import time
+
+import pytest
+from redis.exceptions import ConnectionError
+
+import config
+from config import CircuitBreaker, CircuitOpenError
+
+
+class FailingConnection:
+    """Conexión que falla siempre, para contar los intentos reales."""
+
+    def __init__(self):
+        self.attempts = 0
+
+    def connect(self):
+        self.attempts += 1
+        raise ConnectionError("Redis no disponible")
+
+
+class BreakerConnection(config._CircuitBreakerConnectionMixin, FailingConnection):
+    pass
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.2)
+    monkeypatch.setattr(config, "REDIS_CIRCUIT_BREAKER", breaker)
+    return breaker
+
+
+def test_open_circuit_fails_fast(breaker):
+    connection = BreakerConnection()
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            connection.connect()
+
+    with pytest.raises(CircuitOpenError):
+        connection.connect()
+    assert connection.attempts == 2
+
+
+def test_circuit_reopens_after_failed_probe(breaker):
+    connection = BreakerConnection()
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            connection.connect()
+
+    time.sleep(0.25)
+    with pytest.raises(ConnectionError):
+        connection.connect()
+    with pytest.raises(CircuitOpenError):
+        connection.connect()
+    assert connection.attempts == 3
+
+
+def test_success_closes_circuit(breaker):
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.check()
@@ -0,0 +1,184 @@
+"""Pruebas de la reindexación incremental y de las etapas concurrentes del pipeline."""
+
+import os
+import threading
+
+import fakeredis
+import pytest
+
+# El cliente de OpenAI se crea al importar ai_service y exige una clave
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import config
+import content_processor
+from content_processor import process_document_content, run_concurrent_stages
+from database_service import DocumentWriteSession
+from vector_search import get_chunk_key, get_page_key
+
+FILENAME = "a.pdf"
+PREVIOUS_PAGES = ["Página uno.", "Página dos.", "Página tres."]
+
+
+class FakeIndex:
+    """Índice en memoria: {clave: página}."""
+
+    def __init__(self, entries):
+        self.entries = dict(entries)
+        self.embedded = []
+        self.removed = []
+
+    def get_indexed_pages(self, index_name, filename):
+        return dict(self.entries)
+
+    def create_embeddings(self, texts, cancel_event=None):
+        self.embedded.extend(texts)
+        return [[1.0] for _ in texts]
+
+    def index_chunks(self, index_name, filename, chunks, embeddings):
+        keys = [get_chunk_key(filename, chunk.page, chunk.chunk) for chunk in chunks]
+        self.entries.update({key: chunk.page for key, chunk in zip(keys, chunks)})
+        return keys
+
+    def remove_pages(self, index_name, filename, page_numbers, indexed_pages=None):
+        self.removed.append(sorted(indexed_pages))
+        for key in indexed_pages:
+            self.entries.pop(key)
+        return len(indexed_pages)
+
+
+def make_index(monkeypatch, entries):
+    index = FakeIndex(entries)
+    for name in ("get_indexed_pages", "create_embeddings", "index_chunks", "remove_pages"):
+        monkeypatch.setattr(content_processor, name, getattr(index, name))
+    return index
+
+
+@pytest.fixture(params=[False, True], ids=["completo", "streaming"])
+def pipeline(request, monkeypatch):
+    """Configura el pipeline completo o en streaming, con OCR y LLM simulados."""
+    monkeypatch.setattr(config, "STREAMING_PIPELINE", request.param)
+    monkeypatch.setattr(config, "LLM_EXTRACTION_MODE", "combined")
+    monkeypatch.setattr(content_processor, "analyze_document", lambda pages: (["t"], ["q"]))
+    monkeypatch.setattr(content_processor, "analyze_text", lambda text: (["t"], ["q"]))
+    monkeypatch.setattr(content_processor, "reduce_analysis", lambda results: results[0])
+
+    def run(pages, previous_pages):
+        monkeypatch.setattr(
+            content_processor, "get_document_text", lambda *args, **kwargs: iter(pages)
+        )
+        session = DocumentWriteSession(fakeredis.FakeRedis(), FILENAME, document={})
+        process_document_content(
+            "evento", "bucket", FILENAME, "application/pdf", session,
+            previous_pages=previous_pages,
+        )
+        return session
+
+    return run
+
+
+def indexed_entries(pages):
+    return {get_chunk_key(FILENAME, page, 0): page for page in range(len(pages))}
+
+
+def test_only_changed_pages_are_reindexed(pipeline, monkeypatch):
+    index = make_index(monkeypatch, indexed_entries(PREVIOUS_PAGES))
+    new_pages = ["Página uno.", "Página dos, modificada.", "Página tres."]
+
+    pipeline(new_pages, PREVIOUS_PAGES)
+
+    assert index.embedded == ["Página dos, modificada."]
+    # La entrada de la página modificada se sobrescribe con la misma clave
+    assert index.removed == []
+    assert index.entries == indexed_entries(new_pages)
+
+
+def test_removed_pages_are_deleted_from_index(pipeline, monkeypatch):
+    index = make_index(monkeypatch, indexed_entries(PREVIOUS_PAGES))
+
+    session = pipeline(PREVIOUS_PAGES[:2], PREVIOUS_PAGES)
+
+    assert index.embedded == []
+    assert index.removed == [[get_chunk_key(FILENAME, 2, 0)]]
+    assert index.entries == indexed_entries(PREVIOUS_PAGES[:2])
+    assert session.document["page_count"] == 2
+
+
+def test_unchanged_pages_with_stale_entries_are_reindexed(pipeline, monkeypatch):
+    entries = indexed_entries(PREVIOUS_PAGES)
+    # Entrada de página completa anterior a la fragmentación
+    del entries[get_chunk_key(FILENAME, 0, 0)]
+    entries[get_page_key(FILENAME, 0)] = 0
+    index = make_index(monkeypatch, entries)
+
+    pipeline(PREVIOUS_PAGES, PREVIOUS_PAGES)
+
+    assert index.embedded == ["Página uno."]
+    assert index.removed == [[get_page_key(FILENAME, 0)]]
+    assert index.entries == indexed_entries(PREVIOUS_PAGES)
+
+
+def test_new_document_indexes_every_page(pipeline, monkeypatch):
+    index = make_index(monkeypatch, {})
+
+    pipeline(PREVIOUS_PAGES, None)
+
+    assert index.embedded == PREVIOUS_PAGES
+    assert index.entries == indexed_entries(PREVIOUS_PAGES)
+
+
+def test_failed_stage_cancels_the_others():
+    cancelled = threading.Event()
+
+    def analysis(cancel_event):
+        if cancel_event.wait(5):
+            cancelled.set()
+        return ["t"], ["q"]
+
+    def embeddings(cancel_event):
+        raise RuntimeError("OpenAI no disponible")
+
+    with pytest.raises(RuntimeError, match="OpenAI no disponible"):
+        run_concurrent_stages({"analysis": analysis, "embeddings": embeddings}, 2)
+    assert cancelled.wait(5)
+
+
+def test_stages_run_in_sequence_without_concurrency():
+    order = []
+
+    def stage(name):
+        def run(cancel_event):
+            order.append(name)
+            return name
+
+        return run
+
+    results = run_concurrent_stages({"a": stage("a"), "b": stage("b")}, 1)
+
+    assert results == {"a": "a", "b": "b"}
+    assert order == ["a", "b"]
+
+
+def test_failed_embeddings_leave_document_unchanged(monkeypatch):
+    monkeypatch.setattr(config, "STREAMING_PIPELINE", False)
+    monkeypatch.setattr(config, "LLM_EXTRACTION_MODE", "combined")
+    monkeypatch.setattr(content_processor, "analyze_document", lambda pages: (["t"], ["q"]))
+    index = make_index(monkeypatch, indexed_entries(PREVIOUS_PAGES))
+
+    def create_embeddings(texts, cancel_event=None):
+        raise RuntimeError("OpenAI no disponible")
+
+    monkeypatch.setattr(content_processor, "create_embeddings", create_embeddings)
+    monkeypatch.setattr(
+        content_processor, "get_document_text", lambda *args, **kwargs: iter(["Nueva."])
+    )
+    redis_client = fakeredis.FakeRedis()
+    session = DocumentWriteSession(redis_client, FILENAME, document={})
+
+    with pytest.raises(RuntimeError):
+        process_document_content(
+            "evento", "bucket", FILENAME, "application/pdf", session,
+            previous_pages=PREVIOUS_PAGES,
+        )
+
+    assert not redis_client.exists("document:a.pdf", "topics:a.pdf", "pages:a.pdf")
+    assert index.entries == indexed_entries(PREVIOUS_PAGES)
@@ -0,0 +1,143 @@
+"""Pruebas de la codificación y la lectura por bloques de páginas en database_service."""
+
+import base64
+import json
+import shutil
+import subprocess
+import time
+
+import fakeredis
+import pytest
+
+import config
+from database_service import (
+    COMPRESSION_MARKER,
+    DocumentWriteSession,
+    StoredPages,
+    decode_value,
+    encode_value,
+)
+from document_locks import LeaseLostError, document_lease
+
+PAGE_TEXT = "Página de prueba: ¿cómo anulo una transacción? " * 3
+
+# PAGE_TEXT comprimido por la API de recuperación (Node: marcador + zlib.deflateSync)
+NODE_ENCODED_PAGE = (
+    "AHpsMXicCzi8MD0zL1EhJVWhoKg0NSnRSuHQ/uTDm3PzFRLzSnPyFUrzEhVKihLzihOTkzMPb86zVwigixYAKCI/fA=="
+)
+
+
+class CountingRedis(fakeredis.FakeRedis):
+    """FakeRedis que registra los campos pedidos en cada HMGET."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hmget_calls = []
+
+    def hmget(self, name, keys, *args):
+        self.hmget_calls.append(list(keys))
+        return super().hmget(name, keys, *args)
+
+
+@pytest.fixture
+def redis_client():
+    client = CountingRedis()
+    client.hset(
+        "pages:docs-a.pdf",
+        mapping={str(i): encode_value(f"página {i}") for i in range(5)},
+    )
+    return client
+
+
+def test_stored_pages_reads_in_batches(redis_client):
+    pages = StoredPages(redis_client, "docs/a.pdf", 5, batch_size=2)
+
+    assert len(pages) == 5
+    assert list(pages) == [f"página {i}" for i in range(5)]
+    assert redis_client.hmget_calls == [["0", "1"], ["2", "3"], ["4"]]
+
+
+def test_stored_pages_keeps_batch_read_before_overwrite(redis_client):
+    pages = StoredPages(redis_client, "docs/a.pdf", 5, batch_size=2)
+
+    assert pages[0] == "página 0"
+    redis_client.hset("pages:docs-a.pdf", "1", encode_value("nueva"))
+
+    assert pages[1] == "página 1"
+    with pytest.raises(IndexError):
+        pages[5]
+
+
+def test_stored_pages_uses_legacy_document_pages(redis_client):
+    pages = StoredPages(
+        redis_client, "docs/a.pdf", 2, document={"pages": ["uno", "dos"]}
+    )
+
+    assert list(pages) == ["uno", "dos"]
+    assert redis_client.hmget_calls == []
+
+
+@pytest.fixture
+def compression(monkeypatch):
+    monkeypatch.setattr(config, "COMPRESSION_ENABLED", True)
+    monkeypatch.setattr(config, "COMPRESSION_MIN_BYTES", 0)
+
+
+def test_decodes_values_compressed_by_node():
+    assert decode_value(base64.b64decode(NODE_ENCODED_PAGE)) == PAGE_TEXT
+
+
+def test_encoded_value_round_trips(compression):
+    value = encode_value(PAGE_TEXT)
+
+    assert value.startswith(COMPRESSION_MARKER)
+    assert decode_value(value) == PAGE_TEXT
+    assert decode_value(PAGE_TEXT.encode("utf-8")) == PAGE_TEXT
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="Node no está instalado")
+def test_node_inflates_encoded_value(compression):
+    # Misma decodificación que RedisDocumentContentService.decodeValue
+    script = (
+        "const zlib = require('zlib');"
+        "const marker = Buffer.from('\\x00zl1', 'latin1');"
+        "const value = Buffer.from(process.argv[1], 'base64');"
+        "if (!value.subarray(0, marker.length).equals(marker)) process.exit(1);"
+        "process.stdout.write(zlib.inflateSync(value.subarray(marker.length)).toString('utf8'));"
+    )
+    value = base64.b64encode(encode_value(PAGE_TEXT)).decode("ascii")
+
+    result = subprocess.run(
+        ["node", "-e", script, value], capture_output=True, check=True
+    )
+
+    assert result.stdout.decode("utf-8") == PAGE_TEXT
+
+
+def test_session_flush_writes_in_one_transaction(lease_redis):
+    lease_redis.hset("pages:a.pdf", mapping={"0": "a", "1": "b", "2": "c"})
+    with document_lease(lease_redis, "a.pdf", ttl_seconds=5, wait_seconds=1):
+        session = DocumentWriteSession(lease_redis, "a.pdf", document={"is_new": True})
+        session.write_pages({0: "nuevo"})
+        session.set_page_count(1)
+        session.set_topics_and_questions(["tópico"], ["¿pregunta?"])
+        session.flush()
+
+    document = json.loads(lease_redis.get("document:a.pdf"))
+    assert document["page_count"] == 1
+    assert document["topics_ref"] == "topics:a.pdf"
+    assert lease_redis.hgetall("pages:a.pdf") == {b"0": b"nuevo"}
+    assert lease_redis.exists("topics:a.pdf", "questions:a.pdf") == 2
+
+
+def test_session_flush_aborts_when_lease_is_lost(lease_redis):
+    with pytest.raises(LeaseLostError):
+        with document_lease(lease_redis, "a.pdf", ttl_seconds=0.3, wait_seconds=1):
+            session = DocumentWriteSession(lease_redis, "a.pdf", document={"is_new": True})
+            session.set_topics_and_questions(["tópico"], ["¿pregunta?"])
+            # Otro proceso toma el lease tras su expiración
+            lease_redis.set("lock:a.pdf", "otro")
+            time.sleep(0.25)
+            session.flush()
+
+    assert not lease_redis.exists("document:a.pdf", "topics:a.pdf", "questions:a.pdf")
@@ -0,0 +1,60 @@
+"""Pruebas del lease en Redis de document_locks."""
+
+import time
+
+import pytest
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+import document_locks
+from document_locks import LeaseLostError, document_lease, ensure_lease
+
+
+@pytest.fixture
+def redis_client(lease_redis):
+    return lease_redis
+
+
+def test_lease_is_released(redis_client):
+    with document_lease(redis_client, "a.pdf", ttl_seconds=5, wait_seconds=1):
+        assert redis_client.exists("lock:a.pdf")
+        ensure_lease("a.pdf")
+    assert not redis_client.exists("lock:a.pdf")
+    assert "a.pdf" not in document_locks._held_leases
+
+
+def test_lease_wait_times_out(redis_client):
+    redis_client.set("lock:a.pdf", "otro", px=5000)
+    with pytest.raises(RuntimeError):
+        with document_lease(redis_client, "a.pdf", ttl_seconds=5, wait_seconds=0.1):
+            pass
+
+
+def test_lost_lease_aborts_writes(redis_client):
+    with pytest.raises(LeaseLostError):
+        with document_lease(redis_client, "a.pdf", ttl_seconds=0.3, wait_seconds=1):
+            # Otro proceso toma el lease tras su expiración
+            redis_client.set("lock:a.pdf", "otro")
+            time.sleep(0.25)
+            ensure_lease("a.pdf")
+    # El lease ajeno no se libera
+    assert redis_client.get("lock:a.pdf") == b"otro"
+
+
+def test_lost_lease_fails_event_on_exit(redis_client):
+    with pytest.raises(LeaseLostError):
+        with document_lease(redis_client, "a.pdf", ttl_seconds=0.3, wait_seconds=1):
+            redis_client.set("lock:a.pdf", "otro")
+            time.sleep(0.25)
+
+
+def test_lease_acquired_when_set_reply_is_lost(redis_client, monkeypatch):
+    original_set = redis_client.set
+
+    def set_then_time_out(*args, **kwargs):
+        original_set(*args, **kwargs)
+        raise RedisTimeoutError("Timeout reading from socket")
+
+    monkeypatch.setattr(redis_client, "set", set_then_time_out)
+    with document_lease(redis_client, "a.pdf", ttl_seconds=5, wait_seconds=0):
+        assert redis_client.exists("lock:a.pdf")
+    assert not redis_client.exists("lock:a.pdf")
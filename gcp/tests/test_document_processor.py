@@ -0,0 +1,48 @@
+"""Pruebas de la elección entre procesamiento en línea y por lotes."""
+
+import io
+
+import pytest
+from pypdf import PdfWriter
+
+import config
+import document_processor
+
+
+def make_pdf(page_count: int) -> bytes:
+    writer = PdfWriter()
+    for _ in range(page_count):
+        writer.add_blank_page(width=612, height=792)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def online_enabled(monkeypatch):
+    monkeypatch.setattr(config, "ONLINE_PROCESSING_ENABLED", True)
+
+
+def test_without_page_count_uses_batch():
+    assert not document_processor._use_online_processing(1024, None)
+    assert document_processor._use_online_processing(1024, 1)
+
+
+def test_long_pdf_page_count_goes_to_batch():
+    pages = document_processor._estimate_page_count(
+        "gs://bucket/largo.pdf", "application/pdf", make_pdf(config.ONLINE_PROCESSING_MAX_PAGES + 1)
+    )
+    assert pages == config.ONLINE_PROCESSING_MAX_PAGES + 1
+    assert not document_processor._use_online_processing(1024, pages)
+
+
+def test_short_pdf_page_count_goes_online(monkeypatch):
+    monkeypatch.setattr(document_processor, "_download", lambda input_file: make_pdf(2))
+    pages = document_processor._estimate_page_count("gs://bucket/corto.pdf", "application/pdf", None)
+    assert pages == 2
+    assert document_processor._use_online_processing(1024, pages)
+
+
+def test_single_page_images_go_online():
+    assert document_processor._estimate_page_count("gs://bucket/foto.png", "image/png", None) == 1
+    assert document_processor._estimate_page_count("gs://bucket/scan.tiff", "image/tiff", None) is None
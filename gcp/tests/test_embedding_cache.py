@@ -0,0 +1,106 @@
+"""Pruebas de la caché de embeddings en Redis."""
+
+import os
+
+import fakeredis
+import pytest
+
+# El cliente de OpenAI se crea al importar ai_service y exige una clave
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import ai_service
+import config
+import embedding_cache
+from embedding_cache import (
+    get_cache_key,
+    get_cache_stats,
+    get_cached_embeddings,
+    save_embeddings,
+)
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture(autouse=True)
+def reset_stats(monkeypatch):
+    monkeypatch.setattr(embedding_cache, "cache_stats", {"hits": 0, "misses": 0})
+
+
+def test_saved_embeddings_are_hits(redis_client):
+    save_embeddings(redis_client, ["uno", "dos"], [[0.5, 1.0], [2.0, 0.0]])
+
+    embeddings = get_cached_embeddings(redis_client, ["dos", "tres", "uno"])
+
+    assert embeddings == [[2.0, 0.0], None, [0.5, 1.0]]
+    assert embedding_cache.cache_stats == {"hits": 2, "misses": 1}
+    assert get_cache_stats(redis_client) == {"hits": 2, "misses": 1}
+
+
+def test_empty_vectors_are_not_saved(redis_client):
+    save_embeddings(redis_client, ["uno", "dos"], [[0.0, 0.0], [1.0, 0.0]])
+
+    assert not redis_client.exists(get_cache_key("uno"))
+    assert get_cached_embeddings(redis_client, ["uno", "dos"]) == [None, [1.0, 0.0]]
+
+
+def test_hits_refresh_ttl(redis_client, monkeypatch):
+    monkeypatch.setattr(config, "EMBEDDING_CACHE_TTL_SECONDS", 1000)
+    save_embeddings(redis_client, ["uno"], [[1.0]])
+    redis_client.expire(get_cache_key("uno"), 10)
+
+    get_cached_embeddings(redis_client, ["uno"])
+
+    assert redis_client.ttl(get_cache_key("uno")) > 10
+
+
+def test_misses_do_not_create_entries(redis_client):
+    get_cached_embeddings(redis_client, ["uno"])
+
+    assert not redis_client.exists(get_cache_key("uno"))
+
+
+@pytest.mark.parametrize(
+    "setting, value", [("EMBEDDING_MODEL", "otro-modelo"), ("EMBEDDING_DIMENSIONS", 256)]
+)
+def test_key_depends_on_model_and_dimensions(redis_client, monkeypatch, setting, value):
+    save_embeddings(redis_client, ["uno"], [[1.0]])
+    key = get_cache_key("uno")
+
+    monkeypatch.setattr(config, setting, value)
+
+    assert get_cache_key("uno") != key
+    assert get_cached_embeddings(redis_client, ["uno"]) == [None]
+
+
+def test_create_embeddings_only_generates_misses(redis_client, monkeypatch):
+    monkeypatch.setattr(ai_service, "EMBEDDING_CACHE_ENABLED", True)
+    monkeypatch.setattr(ai_service, "get_redis_client", lambda: redis_client)
+    generated = []
+
+    def generate_embeddings(pages, cancel_event=None):
+        generated.append(list(pages))
+        return [[float(len(page))] for page in pages]
+
+    monkeypatch.setattr(ai_service, "_generate_embeddings", generate_embeddings)
+    save_embeddings(redis_client, ["uno"], [[9.0]])
+
+    assert ai_service.create_embeddings(["uno", "cuatro"]) == [[9.0], [6.0]]
+    assert ai_service.create_embeddings(["uno", "cuatro"]) == [[9.0], [6.0]]
+    assert generated == [["cuatro"]]
+
+
+def test_create_embeddings_without_redis_generates_all(monkeypatch):
+    monkeypatch.setattr(ai_service, "EMBEDDING_CACHE_ENABLED", True)
+
+    def unavailable():
+        raise ConnectionError("Redis no disponible")
+
+    monkeypatch.setattr(ai_service, "get_redis_client", unavailable)
+    monkeypatch.setattr(
+        ai_service, "_generate_embeddings", lambda pages, cancel_event=None: [[1.0]] * len(pages)
+    )
+
+    assert ai_service.create_embeddings(["uno", "dos"]) == [[1.0], [1.0]]
@@ -0,0 +1,150 @@
+"""Pruebas del manejo de eventos de Cloud Storage en main."""
+
+import json
+import os
+
+import pytest
+from cloudevents.http import CloudEvent
+
+# El cliente de OpenAI se crea al importar ai_service y exige una clave
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import config
+import content_processor
+import main
+import vector_search
+
+FINALIZED = "google.cloud.storage.object.v1.finalized"
+
+
+def make_event(event_id, event_type=FINALIZED, metadata=None, generation="1"):
+    data = {
+        "id": f"bucket/a.pdf/{generation}",
+        "bucket": "bucket",
+        "name": "a.pdf",
+        "size": "100",
+        "md5Hash": f"hash-{generation}",
+        "generation": generation,
+        "contentType": "application/pdf",
+        "timeCreated": "2024-01-01T00:00:00+00:00",
+    }
+    if metadata is not None:
+        data["metadata"] = {"metadata": metadata}
+    return CloudEvent(
+        {"id": event_id, "type": event_type, "source": "//storage/bucket"}, data
+    )
+
+
+def get_stored_document(redis_client):
+    return json.loads(redis_client.get("document:a.pdf"))
+
+
+@pytest.fixture
+def redis_client(lease_redis, monkeypatch):
+    monkeypatch.setattr(config, "REDIS_CLIENT", lease_redis)
+    return lease_redis
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    """Sustituye el pipeline de contenido; la primera llamada puede fallar."""
+    calls = []
+    failures = []
+
+    def process_document_content(event_id, input_bucket, filename, mime_type, session, **kwargs):
+        calls.append(event_id)
+        if failures:
+            raise failures.pop(0)
+        session.set_pages(["texto"])
+        session.set_topics_and_questions(["tópico"], ["¿pregunta?"])
+        session.flush()
+
+    monkeypatch.setattr(content_processor, "process_document_content", process_document_content)
+    return calls, failures
+
+
+@pytest.fixture(autouse=True)
+def removed_datapoints(monkeypatch):
+    """Registra las eliminaciones del índice en lugar de consultarlo."""
+    removed = []
+    monkeypatch.setattr(
+        vector_search,
+        "remove_datapoints",
+        lambda index_name, filename, page_count: removed.append((filename, page_count)),
+    )
+    return removed
+
+
+def test_failed_event_is_reprocessed_on_redelivery(redis_client, processed):
+    calls, failures = processed
+    failures.append(RuntimeError("Document AI no disponible"))
+
+    with pytest.raises(RuntimeError):
+        main.on_cloud_event(make_event("evento-1"))
+    assert "page_count" not in get_stored_document(redis_client)
+
+    main.on_cloud_event(make_event("evento-1"))
+
+    assert len(calls) == 2
+    document = get_stored_document(redis_client)
+    assert document["page_count"] == 1
+    assert document["content_hash"] == "md5:hash-1"
+
+
+def test_processed_event_is_skipped_on_redelivery(redis_client, processed):
+    calls, _ = processed
+
+    main.on_cloud_event(make_event("evento-1"))
+    main.on_cloud_event(make_event("evento-1"))
+
+    assert len(calls) == 1
+
+
+def test_metadata_update_changes_metadata_without_reprocessing(redis_client, processed):
+    calls, _ = processed
+
+    main.on_cloud_event(make_event("evento-1", metadata="old"))
+    # metadataUpdated de la misma generación: mismo data.id, distinto ID de evento
+    main.on_cloud_event(
+        make_event(
+            "evento-2",
+            event_type="google.cloud.storage.object.v1.metadataUpdated",
+            metadata="new",
+        )
+    )
+
+    assert len(calls) == 1
+    document = get_stored_document(redis_client)
+    assert document["metadata"] == "new"
+    assert document["page_count"] == 1
+    assert "metadata_update_time" in document
+
+
+def test_failed_incremental_update_keeps_page_count(redis_client, processed, monkeypatch):
+    calls, failures = processed
+    monkeypatch.setattr(config, "INCREMENTAL_REINDEX", True)
+    monkeypatch.setattr(config, "STREAMING_PIPELINE", False)
+
+    main.on_cloud_event(make_event("evento-1"))
+    failures.append(RuntimeError("Document AI no disponible"))
+    with pytest.raises(RuntimeError):
+        main.on_cloud_event(make_event("evento-2", generation="2"))
+
+    # Las páginas y los datapoints anteriores siguen registrados
+    assert get_stored_document(redis_client)["page_count"] == 1
+
+
+def test_deletion_after_failed_creation_removes_datapoints(
+    redis_client, processed, removed_datapoints
+):
+    _, failures = processed
+
+    failures.append(RuntimeError("OpenAI no disponible"))
+    with pytest.raises(RuntimeError):
+        main.on_cloud_event(make_event("evento-1"))
+    main.on_cloud_event(
+        make_event("evento-2", event_type="google.cloud.storage.object.v1.deleted")
+    )
+
+    assert removed_datapoints == [("a.pdf", 0)]
+    assert not redis_client.exists("document:a.pdf")
@@ -0,0 +1,20 @@
+"""Pruebas de la clave de la caché de OCR."""
+
+import config
+from ocr_cache import get_cache_key
+
+
+def test_cache_key_includes_size_and_mime_type():
+    key = get_cache_key("crc32c:abc", 100, "application/pdf")
+    assert key == get_cache_key("crc32c:abc", 100, "application/pdf")
+    assert key != get_cache_key("crc32c:abc", 101, "application/pdf")
+    assert key != get_cache_key("crc32c:abc", 100, "text/plain")
+
+
+def test_cache_key_changes_with_extraction_settings(monkeypatch):
+    key = get_cache_key("md5:abc", 100, "application/pdf")
+    monkeypatch.setattr(config, "LOCAL_PAGE_MAX_CHARS", config.LOCAL_PAGE_MAX_CHARS + 1)
+    assert key != get_cache_key("md5:abc", 100, "application/pdf")
+    monkeypatch.undo()
+    monkeypatch.setattr(config, "LOCAL_EXTRACTION_ENABLED", not config.LOCAL_EXTRACTION_ENABLED)
+    assert key != get_cache_key("md5:abc", 100, "application/pdf")
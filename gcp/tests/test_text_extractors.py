@@ -0,0 +1,56 @@
+"""Pruebas del control de calidad de la extracción local."""
+
+import io
+
+from pypdf import PdfWriter
+
+import text_extractors
+from text_extractors import extract_pages, passes_quality_check
+
+PAGE_TEXT = "Texto de una página con capa de texto. " * 10
+
+
+def test_short_text_files_are_extracted_locally():
+    assert extract_pages(b"hola mundo", "text/plain") == ["hola mundo"]
+    assert extract_pages(b"<p>corto</p>", "text/html; charset=utf-8") == ["corto"]
+
+
+def test_pdf_with_image_only_page_is_rejected():
+    pages = [PAGE_TEXT] * 9 + [""]
+    assert not passes_quality_check(pages, paged=True)
+    assert passes_quality_check([PAGE_TEXT] * 10, paged=True)
+
+
+def test_pdf_chars_per_page_minimum():
+    assert not passes_quality_check(["corto"], paged=True)
+    assert passes_quality_check(["corto"], paged=False)
+
+
+def test_unreadable_text_is_rejected():
+    assert not passes_quality_check(["\x00\x01\x02\x03" * 50])
+
+
+def test_paged_extraction_stops_at_first_page_without_text(monkeypatch):
+    extracted = []
+
+    def extract_scanned(content):
+        for page in [PAGE_TEXT, "", PAGE_TEXT, PAGE_TEXT]:
+            extracted.append(page)
+            yield page
+
+    monkeypatch.setitem(text_extractors._extractors, "application/x-scanned", extract_scanned)
+    monkeypatch.setattr(text_extractors, "_paged_mime_types", {"application/x-scanned"})
+
+    assert extract_pages(b"", "application/x-scanned") is None
+    assert len(extracted) == 2
+
+
+def test_scanned_pdf_is_rejected():
+    writer = PdfWriter()
+    for _ in range(3):
+        writer.add_blank_page(width=612, height=792)
+    content = io.BytesIO()
+    writer.write(content)
+
+    assert extract_pages(content.getvalue(), "application/pdf") is None
+    assert text_extractors.count_pdf_pages(content.getvalue()) == 3
@@ -0,0 +1,113 @@
+"""Pruebas del registro de índices de vector_search."""
+
+from types import SimpleNamespace
+from unittest import mock
+
+import fakeredis
+import pytest
+from redis.commands.search.document import Document
+from redisvl.index import SearchIndex
+
+import vector_search
+
+INDEX_INFO = {
+    "num_docs": 0,
+    "attributes": [
+        [b"identifier", b"chunk", b"attribute", b"chunk", b"type", b"NUMERIC"],
+        [b"identifier", b"char_start", b"attribute", b"char_start", b"type", b"NUMERIC"],
+        [b"identifier", b"char_end", b"attribute", b"char_end", b"type", b"NUMERIC"],
+    ],
+}
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(vector_search, "get_redis_client", lambda: client)
+    monkeypatch.setattr(vector_search, "_index_registry", {})
+    return client
+
+
+def test_get_index_validates_once(redis_client):
+    with mock.patch.object(SearchIndex, "info", return_value=INDEX_INFO) as info, \
+            mock.patch.object(SearchIndex, "create") as create, \
+            mock.patch.object(
+                vector_search,
+                "create_index_if_not_exists",
+                wraps=vector_search.create_index_if_not_exists,
+            ) as create_if_missing:
+        first = vector_search.get_index("docs_index")
+        second = vector_search.get_index("docs_index")
+
+    assert first is second
+    assert first.client is redis_client
+    assert create_if_missing.call_count == 1
+    assert info.call_count == 1
+    create.assert_not_called()
+
+
+def test_get_index_creates_missing_index_once(redis_client):
+    with mock.patch.object(SearchIndex, "info", side_effect=Exception("Unknown index name")) as info, \
+            mock.patch.object(SearchIndex, "create") as create:
+        vector_search.get_index("docs_index")
+        vector_search.get_index("docs_index")
+
+    assert info.call_count == 1
+    assert create.call_count == 1
+
+
+class FakeSearchIndex:
+    """Índice que devuelve todas sus entradas, como una consulta TAG sin distinguir mayúsculas."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def search(self, query):
+        self.queries.append(query.query_string())
+        return SimpleNamespace(docs=self.docs, total=len(self.docs))
+
+
+def make_doc(key, filename, page):
+    return Document(key, payload=None, filename=filename, page=str(page))
+
+
+@pytest.fixture
+def search_index(monkeypatch):
+    index = FakeSearchIndex(
+        [
+            make_doc("docs:Report.pdf:0:0", "Report.pdf", 0),
+            make_doc("docs:report.pdf:0:0", "report.pdf", 0),
+            make_doc("docs:report.pdf:1:0", "report.pdf", 1),
+            make_doc("docs:a,report.pdf:2:0", "a,report.pdf", 2),
+        ]
+    )
+    monkeypatch.setattr(vector_search, "get_index", lambda index_name, refresh=False: index)
+    return index
+
+
+def test_get_indexed_pages_ignores_other_case(search_index):
+    pages = vector_search.get_indexed_pages("docs_index", "report.pdf")
+
+    assert pages == {"docs:report.pdf:0:0": 0, "docs:report.pdf:1:0": 1}
+    assert search_index.queries == ["@filename:{report\\.pdf}"]
+
+
+def test_get_indexed_pages_matches_filename_with_comma(search_index):
+    pages = vector_search.get_indexed_pages("docs_index", "a,report.pdf")
+
+    assert pages == {"docs:a,report.pdf:2:0": 2}
+    # La coma separa etiquetas: se consulta la parte más larga del nombre
+    assert search_index.queries == ["@filename:{report\\.pdf}"]
+
+
+def test_remove_datapoints_keeps_other_documents(search_index, redis_client, monkeypatch):
+    monkeypatch.setattr(vector_search, "ensure_lease", lambda filename: None)
+    search_index.prefix = "docs"
+    for doc in search_index.docs:
+        redis_client.hset(doc.id, "filename", doc.filename)
+
+    vector_search.remove_datapoints("docs_index", "Report.pdf", 1)
+
+    assert not redis_client.exists("docs:Report.pdf:0:0")
+    assert redis_client.exists("docs:report.pdf:0:0", "docs:a,report.pdf:2:0") == 2
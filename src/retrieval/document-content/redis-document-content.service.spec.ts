@@ -0,0 +1,48 @@
+import { deflateSync } from 'zlib';
+import { RedisDocumentContentService } from './redis-document-content.service';
+
+const PAGE_TEXT = 'Página de prueba: ¿cómo anulo una transacción? '.repeat(3);
+
+// PAGE_TEXT comprimido por el procesador de documentos (database_service.encode_value)
+const PYTHON_ENCODED_PAGE = Buffer.from(
+  'AHpsMXicCzi8MD0zL1EhJVWhoKg0NSnRSuHQ/uTDm3PzFRLzSnPyFUqBkiVFiXnFicnJmYc359krBNBFCwAoIj98',
+  'base64',
+);
+
+describe('RedisDocumentContentService', () => {
+  const createService = (pageValue: Buffer | null) => {
+    const redisClient = {
+      get: jest.fn().mockResolvedValue(JSON.stringify({ metadata: {} })),
+      hGet: jest.fn().mockResolvedValue(pageValue),
+    };
+    return new RedisDocumentContentService(redisClient);
+  };
+
+  it('should decode pages compressed by the document processor', async () => {
+    const service = createService(PYTHON_ENCODED_PAGE);
+
+    const result = await service.getDocumentText('a.pdf', 0);
+
+    expect(result.text).toBe(PAGE_TEXT);
+  });
+
+  it('should decode pages compressed with the same marker', async () => {
+    const value = Buffer.concat([
+      Buffer.from('\x00zl1', 'latin1'),
+      deflateSync(Buffer.from(PAGE_TEXT, 'utf8')),
+    ]);
+    const service = createService(value);
+
+    const result = await service.getDocumentText('a.pdf', 0);
+
+    expect(result.text).toBe(PAGE_TEXT);
+  });
+
+  it('should read uncompressed pages as plain text', async () => {
+    const service = createService(Buffer.from(PAGE_TEXT, 'utf8'));
+
+    const result = await service.getDocumentText('a.pdf', 0);
+
+    expect(result.text).toBe(PAGE_TEXT);
+  });
+});
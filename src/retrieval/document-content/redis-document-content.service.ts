@@ -1,6 +1,11 @@
 import { Inject, Injectable, Logger } from '@nestjs/common';
+import { commandOptions } from 'redis';
+import { inflateSync } from 'zlib';
 import { DocumentContentService } from './document-content-service.interface';
 
+// Prefijo de los valores comprimidos con zlib por el procesador de documentos
+const COMPRESSION_MARKER = Buffer.from('\x00zl1', 'latin1');
+
 @Injectable()
 export class RedisDocumentContentService implements DocumentContentService {
   private readonly logger = new Logger(RedisDocumentContentService.name);
@@ -25,15 +30,29 @@ export class RedisDocumentContentService implements DocumentContentService {
         `Obteniendo documento ${filename}:${pageNumber} desde Redis`,
       );
 
-      // Verificamos si existe la clave y la obtenemos en un solo paso
-      const jsonString = await this.redisClient.get(`document:${filename}`);
+      // El texto de cada página se guarda en el hash pages:{filename},
+      // separado de los metadatos del documento
+      const [jsonString, pageValue] = await Promise.all([
+        this.redisClient.get(`document:${filename}`),
+        this.redisClient.hGet(
+          commandOptions({ returnBuffers: true }),
+          `pages:${filename}`,
+          String(pageNumber),
+        ),
+      ]);
+      const pageText = this.decodeValue(pageValue);
 
       if (!jsonString) {
         this.logger.warn(`Documento ${filename} no encontrado`);
         return { text: '', metadata: {} };
       }
 
-      return this.extractDocumentContent(jsonString, filename, pageNumber);
+      return this.extractDocumentContent(
+        jsonString,
+        filename,
+        pageNumber,
+        pageText,
+      );
     } catch (error) {
       this.logger.error(
         `Error al obtener el documento ${filename} desde Redis: ${error.message}`,
@@ -44,16 +63,40 @@ export class RedisDocumentContentService implements DocumentContentService {
   }
 
   /**
-   * Método auxiliar para extraer el contenido del documento de una cadena JSON
+   * Método auxiliar para decodificar un valor de Redis, comprimido o no
+   */
+  private decodeValue(value: Buffer | null): string | null {
+    if (value == null) {
+      return null;
+    }
+    if (
+      value.subarray(0, COMPRESSION_MARKER.length).equals(COMPRESSION_MARKER)
+    ) {
+      return inflateSync(value.subarray(COMPRESSION_MARKER.length)).toString(
+        'utf8',
+      );
+    }
+    return value.toString('utf8');
+  }
+
+  /**
+   * Método auxiliar para extraer el contenido del documento de una cadena JSON.
+   * Si no se encontró la página en el hash de páginas, se busca en el campo
+   * `pages` de los documentos guardados con el formato anterior.
    */
   private extractDocumentContent(
     jsonString: string,
     filename: string,
     pageNumber: number,
+    pageText?: string | null,
   ): { text: string; metadata?: object } {
     try {
       const doc = JSON.parse(jsonString);
 
+      if (pageText != null) {
+        return { text: pageText, metadata: doc.metadata || {} };
+      }
+
       // Validar que el documento tenga la estructura esperada
       if (!Array.isArray(doc.pages)) {
         this.logger.warn(
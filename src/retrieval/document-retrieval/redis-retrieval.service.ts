@@ -65,8 +65,21 @@ export class RedisVectorRetrievalService implements DocumentRetrievalService {
         `Documentos encontrados: ${results.documents.length}, filtrados por umbral: ${filteredResults.length}`,
       );
 
+      // Cada página puede tener varios fragmentos en el índice; se conserva
+      // solo el fragmento con mejor score de cada página (los resultados ya
+      // vienen ordenados por score)
+      const seenPages = new Set<string>();
+      const uniqueResults = filteredResults.filter((doc) => {
+        const pageKey = `${doc.value.filename}:${doc.value.page}`;
+        if (seenPages.has(pageKey)) {
+          return false;
+        }
+        seenPages.add(pageKey);
+        return true;
+      });
+
       // Transformar los resultados al formato esperado
-      return filteredResults.map((doc) => {
+      return uniqueResults.map((doc) => {
         // Extraer información del documento
         const documentId = doc.id;
 